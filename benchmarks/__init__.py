@@ -0,0 +1,3 @@
+# SPDX-FileCopyrightText: 2024-present GraysonBellamy <grayson.bellamy@ul.org>
+#
+# SPDX-License-Identifier: MIT
@@ -0,0 +1,338 @@
+"""
+Generate synthetic instrument files of configurable size for benchmarking.
+
+Each writer produces a file in the same layout as the exports in
+`tests/test_files`, with the number of data rows (or HFM setpoints) scaled up
+or down. The values follow simple smooth curves with a little noise so that
+compression and parsing behave like real data.
+"""
+
+import io
+import struct
+import zipfile
+
+import numpy as np
+
+from labetl.netzsch_sta_ngb_parser import (
+    END_FIELD,
+    TABLE_SEPARATOR,
+    TYPE_PREFIX,
+    TYPE_SEPARATOR,
+)
+
+# The framing constants are regex patterns, so turn them back into raw bytes
+SEPARATOR = TABLE_SEPARATOR.decode("unicode_escape").encode("latin-1")
+FIELD_END = END_FIELD.decode("unicode_escape").encode("latin-1")
+PREFIX = TYPE_PREFIX.decode("unicode_escape").encode("latin-1")
+TYPE_SEP = TYPE_SEPARATOR.decode("unicode_escape").encode("latin-1")
+DATA_END = (
+    b"\x01\x00\x00\x00\x02\x00\x01\x00\x00\x00\x03\x00\x18\xfc\xff\xff\x03\x80\x01"
+)
+
+STA_HEADER = """#EXPORTTYPE:                 ,DATA ALL
+#FILE:                       ,SYNTHETIC_STA_N2_10K_240101_R1.ngb-ss3
+#FORMAT:                     ,NETZSCH5
+#FTYPE:                      ,ANSI
+#IDENTITY:                   ,SYNTHETIC
+#DECIMAL:                    ,POINT
+#SEPARATOR:                  ,COMMA
+#MTYPE:                      ,DSC/TG
+#INSTRUMENT:                 ,NETZSCH STA 449F3
+#PROJECT:                    ,Benchmark
+#DATE/TIME:                  ,1/1/2024 12:00:00 (UTC-5)
+#CORR. FILE:                 ,
+#TEMPCAL:                    ,30-01-2024 15:52
+#SENSITIVITY:                ,30-01-2024 15:52
+#LABORATORY:                 ,UL FSRI
+#OPERATOR:                   ,Benchmark
+#REMARK:                     ,Synthetic benchmark file
+#SAMPLE:                     ,SYNTHETIC
+#SAMPLE MASS /mg:            ,4.00
+#MATERIAL:                   ,Synthetic
+#REFERENCE:                  ,
+#REFERENCE MASS /mg:         ,0
+#TYPE OF CRUCIBLE:           ,PtRh20 85 µl, with lid
+#SAMPLE CRUCIBLE MASS /mg:   ,254.00
+#REFERENCE CRUCIBLE MASS /mg:,254.04
+#PURGE 1 MFC:                ,NITROGEN,250.0 ml/min
+#PROTECTIVE MFC:             ,NITROGEN,250.0 ml/min
+#DSC RANGE /µV:              ,5000
+#TG RANGE /mg:               ,35000
+#TAU-R:                      ,---
+#CORR. CODE:                 ,000
+#EXO:                        ,-1
+#RANGE:                      ,25°C....700°C/0.0....10.0K/min
+#SEGMENT:                    ,S1-2/2
+#SEG. 1:                     ,25°C/00:20/25°C
+#SEG. 2:                     ,25°C/10.0(K/min)/700°C
+
+##Temp./°C,Time/min,Mass/%,DSC/(mW/mg),DTG/(%/min),Sensit./(uV/mW),Segment
+"""
+
+MCC_HEADER = (
+    "Sample ID:\tC:\\MCC\\SYNTHETIC_MCC_30K_min_240101_R1.txt\n"
+    "Sample Weight (mg):\t4.64\n"
+    "Heating Rate (C/s):\t0.5\n"
+    "Combustor Temp (C):\t900\n"
+    "N2 Flow Rate (cc/min):\t80\n"
+    "O2 Flow Rate (cc/min):\t20\n"
+    "Calibration File:\tC:\\MCC\\Coeff.txt\n"
+    "T Correction Coefficients:\t0\t1.024463\t0\n"
+    "Time Shift (s):\t14\n"
+    "*\n"
+    "Time (s)\tTemperature (C)\tN2 flow rate (cc/min)\tO2 flow rate (cc/min)"
+    "\tFlow Rate (cc/min)\tOxygen (%)\tHRR (W/g)\tHeating rate (C/s)\n"
+)
+
+HFM_HEADER = """
+\tMonday, November 15, 2021, Time 15:16
+
+\tWintherm32v3 Version 3.32.115 Uni
+\tInstrument: F200s
+
+\tSample Name: SYNTHETIC_HFM_conductivity_240101_R1
+\tThickness: 8.67mm
+\tRear Left :\t8.59 mm\t Rear Right :\t8.53 mm
+\tFront Left:\t8.81 mm\t Front Right:\t8.76 mm
+\t\t[  ]
+\tThickness obtained    :  from instrument
+
+\tCalibration used   :  User Type
+\tCalibration File Id:\tNIST_1453_210824
+
+\tNumber of transducers per plate:\t1
+
+\tNumber of Setpoints: {setpoints}
+"""
+
+HFM_SETPOINT = """
+\tSetpoint duration: 38 min
+
+\tBlock Averages for setpoint {n} in SI units
+\tTupper\tTlower\tQupper\tQlower\tLambda\t
+\t [°C]\t [°C]\t [µV]\t [µV]\t [W/mK]\t
+{blocks}
+
+\tMonday, November 15, 2021, Time 15:54
+
+\tSetpoint No.\t{n}
+\t  Setpoint Upper:\t{upper:.2f}\t°C
+\t  Setpoint Lower:\t{lower:.2f}\t°C
+\t    Temperature Upper:\t{upper:.2f}\t°C
+\t    CalibFactor  Upper:\t0.025995
+\t    Results Upper:\t\t{k:.4f}\tW/mK
+\t    Temperature Lower:\t{lower:.2f}\t°C
+\t    CalibFactor  Lower:\t0.025277
+\t    Results Lower:\t\t{k:.4f}\tW/mK
+\t    Percent Difference:\t0.20%
+
+
+\t\tThermal Equilibrium Criteria:
+\t\tTemperature Equilibrium:\t0.20
+\t\tBetween Block HFM Equil.:\t49
+\t\tHFM Percent Change:\t0.00
+\t\tMin Number of Blocks:\t4
+\t\tCalculation Blocks:\t\t3
+"""
+
+
+def _curves(rows: int, seed: int = 0) -> dict[str, np.ndarray]:
+    """Smooth heating-run curves with noise, shared by the writers."""
+    rng = np.random.default_rng(seed)
+    time = np.arange(rows) * 0.1
+    temperature = 25.0 + 10.0 * time + rng.normal(0, 0.01, rows)
+    progress = 1.0 / (1.0 + np.exp(-(temperature - 350.0) / 25.0))
+    mass = 100.0 - 75.0 * progress + rng.normal(0, 0.005, rows)
+    return {
+        "time": time,
+        "temperature": temperature,
+        "mass": mass,
+        "dsc": np.gradient(progress) * 50.0 + rng.normal(0, 1e-3, rows),
+        "dtg": np.gradient(mass, time, edge_order=1),
+        "noise": rng.normal(0, 1.0, rows),
+    }
+
+
+def _format_rows(columns: list[np.ndarray], fmt: str, delimiter: str) -> str:
+    """Format columns as delimited text rows."""
+    buffer = io.StringIO()
+    np.savetxt(buffer, np.column_stack(columns), fmt=fmt, delimiter=delimiter)
+    return buffer.getvalue()
+
+
+def write_sta_csv(path: str, rows: int) -> None:
+    """Write a Netzsch STA CSV export with `#` metadata and a `##` header.
+
+    Args:
+        path (str): The path of the file to write.
+        rows (int): The number of data rows.
+    """
+    c = _curves(rows)
+    segment = np.where(c["time"] < 20.0, 1, 2)
+    data = _format_rows(
+        [
+            c["temperature"],
+            c["time"],
+            c["mass"],
+            c["dsc"],
+            c["dtg"],
+            np.full(rows, 1.02105),
+            segment,
+        ],
+        fmt=["%9.5f", "%9.5f", "%9.5f", "%.6e", "%12.5f", "%.5f", "%d"],
+        delimiter=",",
+    )
+    with open(path, "w", encoding="iso-8859-1", newline="\r\n") as f:
+        f.write(STA_HEADER)
+        f.write(data)
+
+
+def write_mcc_txt(path: str, rows: int) -> None:
+    """Write an FAA MCC text export with a `*` separated header.
+
+    Args:
+        path (str): The path of the file to write.
+        rows (int): The number of data rows.
+    """
+    c = _curves(rows)
+    data = _format_rows(
+        [
+            c["time"] * 5.0,
+            c["temperature"],
+            80.0 + c["noise"] * 0.01,
+            20.0 + c["noise"] * 0.005,
+            104.1 + c["noise"] * 0.01,
+            20.2 - c["dsc"],
+            c["dsc"] * 100.0,
+            0.5 + c["noise"] * 0.01,
+        ],
+        fmt="%.3f",
+        delimiter="\t",
+    )
+    with open(path, "w", encoding="ascii") as f:
+        f.write(MCC_HEADER)
+        f.write(data)
+
+
+def write_hfm_tst(path: str, setpoints: int) -> None:
+    """Write a Fox HFM thermal conductivity `.tst` file in UTF-16.
+
+    Args:
+        path (str): The path of the file to write.
+        setpoints (int): The number of setpoints.
+    """
+    rng = np.random.default_rng(0)
+    parts = [HFM_HEADER.format(setpoints=setpoints)]
+    for n in range(1, setpoints + 1):
+        upper = 5.0 + 30.0 * (n % 2 == 0)
+        blocks = "\n".join(
+            f"-se-\t{upper:6.2f}\t{upper + 20:6.2f}\t{v:6.0f}\t{-v:6.0f}\t 0.1495"
+            for v in rng.normal(13000, 10, 10)
+        )
+        parts.append(
+            HFM_SETPOINT.format(
+                n=n,
+                upper=upper,
+                lower=upper + 20.0,
+                k=0.15 + 0.001 * rng.normal(),
+                blocks=blocks,
+            )
+        )
+    parts.append(
+        "\n\tResults Table -- SI Units\n\n"
+        "\tMean Temp\tUpper Cond\tLower Cond\tAverage Cond\n"
+    )
+    parts.extend(
+        f"\t{15.0 + 30.0 * (n % 2 == 0):.2f}\t\t0.1500\t\t0.1500\t\t0.1500\n"
+        for n in range(1, setpoints + 1)
+    )
+    with open(path, "w", encoding="utf-16", newline="\r\n") as f:
+        f.write("".join(parts))
+
+
+def _ngb_field(category: bytes, field: bytes, dtype: bytes, value: bytes) -> bytes:
+    """Encode one metadata table for `Streams/stream_1.table`."""
+    return (
+        b"\x00\x00"
+        + SEPARATOR
+        + category
+        + b"\x00\x00"
+        + field
+        + b"\x00\x00"
+        + PREFIX
+        + dtype
+        + TYPE_SEP
+        + value
+        + FIELD_END
+    )
+
+
+def _ngb_string(text: str) -> bytes:
+    """Encode a string value with its length prefix."""
+    data = text.encode("utf-8")
+    return struct.pack("<i", len(data)) + data
+
+
+def _ngb_channel(channel: int, values: np.ndarray, per_table: int = 4096) -> bytes:
+    """Encode a channel as data tables followed by its header table."""
+    tables = []
+    for i in range(0, len(values), per_table):
+        chunk = values[i : i + per_table].astype("<f8").tobytes()
+        tables.append(
+            bytes([channel, 0x75])
+            + SEPARATOR
+            + PREFIX
+            + b"\x05\xa0\x01"
+            + struct.pack("<i", len(chunk) // 8)
+            + chunk
+            + DATA_END
+        )
+    tables.append(bytes([channel, 0x17]) + SEPARATOR + b"\x00" * 16)
+    return b"".join(tables)
+
+
+def write_ngb(path: str, rows: int) -> None:
+    """Write a Netzsch NGB archive with metadata and data streams.
+
+    The streams use the table separator and field framing that
+    `labetl.netzsch_sta_ngb_parser` splits on.
+
+    Args:
+        path (str): The path of the file to write.
+        rows (int): The number of data points per channel.
+    """
+    c = _curves(rows)
+    metadata = b"".join(
+        [
+            _ngb_field(b"\x75\x17", b"\x59\x10", b"\x1f", _ngb_string("STA449F3")),
+            _ngb_field(b"\x72\x17", b"\x35\x08", b"\x1f", _ngb_string("Benchmark")),
+            _ngb_field(
+                b"\x72\x17", b"\x3e\x08", b"\x03", struct.pack("<i", 1704110400)
+            ),
+            _ngb_field(b"\x30\x75", b"\x40\x08", b"\x1f", _ngb_string("SYNTHETIC")),
+            _ngb_field(b"\x30\x75", b"\x62\x09", b"\x1f", _ngb_string("Synthetic")),
+            _ngb_field(b"\x30\x75", b"\x9e\x0c", b"\x05", struct.pack("<d", 4.0)),
+        ]
+    )
+    channels = {
+        0x8D: c["time"] * 60.0,
+        0x8E: c["temperature"],
+        0x9C: c["dsc"],
+        0x9E: np.full(rows, 50.0) + c["noise"] * 0.01,
+        0x90: np.full(rows, 20.0) + c["noise"] * 0.01,
+        0x87: c["mass"] * 0.04,
+    }
+    data = b"".join(_ngb_channel(k, v) for k, v in channels.items())
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as z:
+        z.writestr("Streams/stream_1.table", metadata)
+        z.writestr("Streams/stream_2.table", data)
+
+
+# Format name -> (writer, file suffix, base size at 1x scale). The base sizes
+# are close to the fixtures in tests/test_files.
+FORMATS = {
+    "sta_csv": (write_sta_csv, ".csv", 5000),
+    "mcc_txt": (write_mcc_txt, ".txt", 2500),
+    "hfm_tst": (write_hfm_tst, ".tst", 6),
+    "ngb": (write_ngb, ".ngb-ss3", 8000),
+}
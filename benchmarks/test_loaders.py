@@ -0,0 +1,64 @@
+"""
+Benchmark every loader on synthetic files of increasing size.
+
+Run with:
+
+    pytest benchmarks/test_loaders.py --benchmark-columns=mean,max
+
+The scale factors default to 1, 10 and 100 times the size of the test
+fixtures and can be set with `LABETL_BENCH_SCALES=1,10`. Each benchmark stores
+the file size, the throughput in MB/s and the peak Python memory of one load
+in its `extra_info`, so regressions in speed or memory show up per format and
+scale in `--benchmark-json` output.
+"""
+
+import os
+import tracemalloc
+
+import pytest
+from labetl.loaders import load
+
+from benchmarks.synthetic import FORMATS
+
+SCALES = [int(s) for s in os.environ.get("LABETL_BENCH_SCALES", "1,10,100").split(",")]
+
+
+@pytest.fixture(scope="session")
+def synthetic_file(tmp_path_factory):
+    cache = {}
+
+    def make(name, scale):
+        if (name, scale) not in cache:
+            writer, suffix, base = FORMATS[name]
+            path = tmp_path_factory.mktemp("synthetic") / f"{name}_x{scale}{suffix}"
+            writer(str(path), base * scale)
+            cache[name, scale] = str(path)
+        return cache[name, scale]
+
+    return make
+
+
+def peak_memory(path):
+    tracemalloc.start()
+    try:
+        load(path)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize("scale", SCALES)
+@pytest.mark.parametrize("name", sorted(FORMATS))
+def test_load(benchmark, synthetic_file, name, scale):
+    path = synthetic_file(name, scale)
+    size = os.path.getsize(path)
+    benchmark.group = name
+    table = benchmark.pedantic(load, args=(path,), rounds=3, warmup_rounds=1)
+    assert table.num_rows > 0
+
+    # Without stats when run with --benchmark-disable, e.g. as a smoke test
+    if benchmark.stats is not None:
+        benchmark.extra_info["bytes"] = size
+        benchmark.extra_info["rows"] = table.num_rows
+        benchmark.extra_info["mb_per_s"] = size / 1e6 / benchmark.stats.stats.mean
+        benchmark.extra_info["peak_mb"] = peak_memory(path) / 1e6
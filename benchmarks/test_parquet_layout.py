@@ -0,0 +1,74 @@
+"""
+Compare the tuned dataset layout against the default Parquet settings.
+
+Run with:
+
+    pytest benchmarks/test_parquet_layout.py --benchmark-columns=mean,max
+
+The total size of each layout is stored in the benchmark's `extra_info`.
+"""
+
+import glob
+import os
+
+import pyarrow.parquet as pq
+import pytest
+from labetl.batch import find_files
+from labetl.dataset import write_dataset_file
+from labetl.loaders import load
+
+CORPUS = "tests/test_files"
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    return [
+        (os.path.splitext(os.path.basename(path))[0] + ".parquet", load(path))
+        for path, _ in find_files([CORPUS])
+    ]
+
+
+def write_default(tables, root):
+    for name, table in tables:
+        pq.write_table(table, os.path.join(root, name), compression="snappy")
+
+
+def write_tuned(tables, root):
+    for name, table in tables:
+        write_dataset_file(table, root, name)
+
+
+LAYOUTS = {"default": write_default, "dataset": write_tuned}
+
+
+@pytest.fixture(scope="module", params=sorted(LAYOUTS))
+def layout(request, corpus, tmp_path_factory):
+    root = tmp_path_factory.mktemp(request.param)
+    LAYOUTS[request.param](corpus, str(root))
+    files = sorted(glob.glob(os.path.join(root, "**", "*.parquet"), recursive=True))
+    return request.param, files
+
+
+def test_write(benchmark, corpus, tmp_path, layout):
+    name, _ = layout
+    benchmark.group = "write"
+    benchmark(LAYOUTS[name], corpus, str(tmp_path))
+
+
+def test_scan(benchmark, layout):
+    name, files = layout
+    benchmark.group = "scan"
+    benchmark.extra_info["bytes"] = sum(os.path.getsize(f) for f in files)
+    rows = benchmark(
+        lambda: sum(pq.read_table(f, partitioning=None).num_rows for f in files)
+    )
+    assert rows > 0
+
+
+def test_metadata_preserved(corpus, layout):
+    _, files = layout
+    for _, table in corpus:
+        name = table.schema.metadata[b"type"]
+        assert any(pq.read_schema(f).metadata[b"type"] == name for f in files)
+    for f in files:
+        assert b"file_metadata" in pq.read_schema(f).metadata
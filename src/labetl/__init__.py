@@ -1,3 +1,42 @@
 # SPDX-FileCopyrightText: 2024-present GraysonBellamy <grayson.bellamy@ul.org>
 #
 # SPDX-License-Identifier: MIT
+"""
+Convert laboratory instrument data files to PyArrow tables and Parquet.
+
+The public functions are loaded on first access, so `import labetl` does not
+import any parser or its dependencies.
+"""
+
+import importlib
+from typing import Any
+
+# Public name -> module defining it
+_API = {
+    "load": "labetl.loaders",
+    "read": "labetl.reader",
+    "get_loader": "labetl.loaders",
+    "load_sta_data": "labetl.netzsch_sta_parser",
+    "load_ngb_data": "labetl.netzsch_sta_ngb_parser",
+    "load_mcc_data": "labetl.faa_mcc_parser",
+    "load_cone_data": "labetl.deatak_cone_parser",
+    "load_hfm_data": "labetl.fox_hfm_parser",
+    "load_ftir_data": "labetl.bruker_ftir_parser",
+    "convert_file": "labetl.batch",
+    "convert_paths": "labetl.batch",
+    "set_metadata": "labetl.util",
+}
+
+__all__ = sorted(_API)
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _API:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_API[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_API))
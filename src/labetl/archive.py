@@ -0,0 +1,163 @@
+"""
+Load instrument files directly from zip and tar archives.
+
+Instrument exports are often shipped as archives. Rather than extracting them
+to a temporary directory, the members are read into memory one at a time and
+handed to the loaders as bytes, see `labetl.util.read_source`. Tar archives
+are read in streaming mode, so compressed tarballs are decompressed once, in a
+single pass, and the archive itself can be a pipe or a network stream. Zip
+archives need random access to their central directory, so they are read from
+a seekable file.
+
+Archives nested in archives are opened in the same way. NGB files are zip
+containers themselves, but they are recognized by their extension and handed
+to their loader whole.
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import tarfile
+import zipfile
+from typing import IO, TYPE_CHECKING, Callable, Iterator
+
+from labetl.loaders import find_loader_name, get_loader
+from labetl.util import NamedBytes, read_source, source_name
+
+if TYPE_CHECKING:
+    import polars as pl
+    import pyarrow as pa
+
+ARCHIVE_SUFFIXES = (
+    ".zip",
+    ".tar",
+    ".tar.gz",
+    ".tgz",
+    ".tar.bz2",
+    ".tbz2",
+    ".tar.xz",
+    ".txz",
+)
+
+
+def is_archive(name: str) -> bool:
+    """Check whether a file name has the extension of a supported archive."""
+    return name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _member_name(archive: str | None, member: str) -> str:
+    """Join the name of an archive and of one of its members."""
+    return f"{archive}/{member}" if archive else member
+
+
+def _iter_zip(
+    file: str | IO[bytes], name: str | None, recursive: bool
+) -> Iterator[NamedBytes]:
+    with zipfile.ZipFile(file) as z:
+        for info in z.infolist():
+            if info.is_dir():
+                continue
+            yield from _iter_member(
+                info.filename, lambda info=info: z.read(info), name, recursive
+            )
+
+
+def _iter_tar(
+    file: str | IO[bytes], name: str | None, recursive: bool
+) -> Iterator[NamedBytes]:
+    if isinstance(file, str):
+        tar = tarfile.open(file, mode="r|*")
+    else:
+        tar = tarfile.open(fileobj=file, mode="r|*")
+    with tar:
+        for info in tar:
+            if not info.isfile():
+                continue
+            yield from _iter_member(
+                info.name,
+                lambda info=info: tar.extractfile(info).read(),
+                name,
+                recursive,
+            )
+
+
+def _iter_member(
+    member: str, read: Callable[[], bytes], archive: str | None, recursive: bool
+) -> Iterator[NamedBytes]:
+    """Yield a member if it has a loader, or the members of a nested archive.
+
+    The member is only read if it is yielded or opened, so other files in the
+    archive are skipped without decompressing them into memory.
+    """
+    name = _member_name(archive, member)
+    if find_loader_name(member) is not None:
+        yield NamedBytes(read(), name)
+    elif recursive and is_archive(member):
+        yield from iter_archive(NamedBytes(read(), name), recursive)
+
+
+def iter_archive(
+    archive: str | os.PathLike[str] | bytes | IO[bytes], recursive: bool = True
+) -> Iterator[NamedBytes]:
+    """Iterate over the instrument files in a zip or tar archive.
+
+    Args:
+        archive (str | os.PathLike[str] | bytes | IO[bytes]): The path to the
+            archive, its bytes, or a binary file object. Tar file objects are
+            read sequentially, so they do not need to be seekable.
+        recursive (bool): Whether to also iterate over archives in the archive.
+
+    Yields:
+        NamedBytes: The bytes of each file that has a loader, named with the
+            path of the archive and the path of the file within it, e.g.
+            "exports.zip/STA/run.csv".
+    """
+    if isinstance(archive, (str, os.PathLike)):
+        path = os.fspath(archive)
+        if zipfile.is_zipfile(path):
+            yield from _iter_zip(path, path, recursive)
+        else:
+            yield from _iter_tar(path, path, recursive)
+        return
+    if isinstance(archive, (bytes, bytearray, memoryview)):
+        data = read_source(archive)
+        name = getattr(data, "name", None)
+        archive = io.BytesIO(data)
+    else:
+        name = getattr(archive, "name", None)
+    name = name if isinstance(name, str) else None
+    if archive.seekable():
+        start = archive.tell()
+        is_zip = zipfile.is_zipfile(archive)
+        archive.seek(start)
+        if is_zip:
+            yield from _iter_zip(archive, name, recursive)
+            return
+    # Streams can only be tarballs, which are read without buffering them whole
+    yield from _iter_tar(archive, name, recursive)
+
+
+def load_archive(
+    archive: str | os.PathLike[str] | bytes | IO[bytes],
+    backend: str = "arrow",
+    recursive: bool = True,
+) -> Iterator[tuple[str, pa.Table | pl.DataFrame]]:
+    """Load the instrument files in a zip or tar archive.
+
+    Each file is dispatched to its loader by its extension and loaded from
+    memory, so the "file_hash" metadata is the hash of the archived bytes.
+
+    Args:
+        archive (str | os.PathLike[str] | bytes | IO[bytes]): See
+            `iter_archive`.
+        backend (str): "arrow" for pyarrow.Tables with metadata, or "polars"
+            for Polars DataFrames, see `labetl.loaders.load`.
+        recursive (bool): Whether to also load the files of nested archives.
+
+    Yields:
+        tuple[str, pyarrow.Table | polars.DataFrame]: The name of each file,
+            see `iter_archive`, and its table.
+    """
+    for member in iter_archive(archive, recursive):
+        yield member.name, get_loader(source_name(member))(member, backend=backend)
@@ -0,0 +1,562 @@
+"""
+Batch conversion of instrument files to Parquet using a process pool.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, TextIO
+
+from labetl.ipc import IPC_SUFFIX
+from labetl.lazy import lazy_import
+from labetl.loaders import find_loader_name, get_loader, parser_version
+from labetl.manifest import Manifest
+from labetl.profiling import Profile, profile as profile_stages, stage
+from labetl.util import atomic_path
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+    from labetl.metrics import Metrics
+
+# Only the worker processes need pyarrow, not the process dispatching the files
+pq = lazy_import("pyarrow.parquet")
+
+
+def find_files(sources: Iterable[str]) -> Iterator[tuple[str, str]]:
+    """Walk the sources and yield every file that has a loader.
+
+    Args:
+        sources (Iterable[str]): Files or directories to search.
+
+    Yields:
+        tuple[str, str]: The path to the file and the root it was found under.
+    """
+    for source in sources:
+        if os.path.isfile(source):
+            if find_loader_name(source):
+                yield source, os.path.dirname(source)
+            continue
+        for dirpath, dirnames, filenames in os.walk(source):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                if find_loader_name(path):
+                    yield path, source
+
+
+def plan_outputs(
+    files: Iterable[tuple[str, str]], out_dir: str, suffix: str = ".parquet"
+) -> list[tuple[str, str]]:
+    """Map each source file to its output path, mirroring the source tree.
+
+    The output is named after the stem of the source file. If two sources in
+    the same directory share a stem (e.g. an NGB file and its CSV export), the
+    full file name is kept instead so that neither output is overwritten.
+
+    Args:
+        files (Iterable[tuple[str, str]]): Pairs of source path and root.
+        out_dir (str): The directory to write the outputs in.
+        suffix (str): The file extension of the outputs.
+
+    Returns:
+        list[tuple[str, str]]: Pairs of source path and output path.
+    """
+    planned = []
+    for path, root in files:
+        rel = os.path.relpath(path, root)
+        planned.append((path, os.path.join(out_dir, os.path.splitext(rel)[0])))
+
+    counts: dict[str, int] = {}
+    for _, stem in planned:
+        counts[stem] = counts.get(stem, 0) + 1
+
+    outputs = []
+    for path, stem in planned:
+        if counts[stem] > 1:
+            stem += os.path.splitext(path)[1]
+        outputs.append((path, stem + suffix))
+    return outputs
+
+
+def convert_file(
+    path: str,
+    output: str,
+    dataset: dict[str, Any] | None = None,
+    manifest: str | None = None,
+    profile: bool = False,
+    derived: dict[str, Any] | None = None,
+    schema: dict[str, Any] | None = None,
+    pyramid: Iterable[int] | None = None,
+    ipc: dict[str, Any] | None = None,
+    validate: bool = False,
+    units: dict[str, Any] | None = None,
+    profile_memory: bool = False,
+) -> dict[str, Any]:
+    """Convert a single instrument file to Parquet.
+
+    The output is written to a temporary file and renamed into place, so a
+    Parquet file at `output` is always complete.
+
+    Args:
+        path (str): The path to the instrument file.
+        output (str): The path of the Parquet file to write.
+        dataset (dict[str, Any] | None): If given, the file is instead written
+            into the hive-partitioned dataset rooted at the "root" option
+            (default: the directory of `output`), under its path relative to
+            the root within its partition, passing the other options to
+            `write_dataset_file`.
+        manifest (str | None): The path to a `Manifest` database in which the
+            conversion is recorded.
+        profile (bool): Whether to record the time of each stage of the
+            loader under the "profile" key of the record.
+        derived (dict[str, Any] | None): If given, smoothed derivative
+            channels are added to STA tables, passing these options to
+            `labetl.derived.add_derived`.
+        schema (dict[str, Any] | None): If given, the table is conformed to the
+            canonical schema of its type before it is written, passing these
+            options to `labetl.schema.conform`.
+        pyramid (Iterable[int] | None): If given, also write a sidecar with
+            the table downsampled by each of these factors, see
+            `labetl.pyramid.write_pyramid`.
+        ipc (dict[str, Any] | None): If given, write an Arrow IPC file instead
+            of Parquet, passing these options to `labetl.ipc.write_ipc`.
+        validate (bool): Whether to check the table against the physical rules
+            of its type and store the violations in its metadata, see
+            `labetl.validation.add_validation`. Their number is recorded under
+            the "violations" key of the record.
+        units (dict[str, Any] | None): If given, the columns are converted to
+            the units of a unit system before the table is conformed, passing
+            these options to `labetl.units.normalize_units`.
+        profile_memory (bool): Whether the profile also records the peak
+            memory of each stage, which slows the loader down.
+
+    Returns:
+        dict[str, Any]: A record of the conversion with the source path, output
+            path, file size and modification time, file hash, parser name and
+            version, duration, status and error message, if any. Failed
+            records also have structured "error_info", see `set_error`.
+    """
+    start = time.perf_counter()
+    result = new_record(
+        path,
+        output,
+        {
+            "dataset": dataset,
+            "derived": derived,
+            "schema": schema,
+            "pyramid": pyramid,
+            "ipc": ipc,
+            "validate": validate,
+            "units": units,
+        },
+    )
+    stages: Profile | None = None
+    context = profile_stages(memory=profile_memory) if profile else nullcontext()
+    try:
+        with context as stages:
+            table = get_loader(path)(path)
+            result["file_hash"] = _file_hash(table)
+            if derived is not None:
+                from labetl.derived import add_derived
+
+                with stage("derive"):
+                    table = add_derived(table, **derived)
+            if units is not None:
+                from labetl.units import normalize_units
+
+                with stage("normalize_units"):
+                    table = normalize_units(table, **units)
+            # Validate the values as written, so the units of the report are
+            # those of the columns it is stored with
+            if validate:
+                from labetl.validation import add_validation
+
+                with stage("validate"):
+                    table = add_validation(table)
+                report = json.loads(table.schema.metadata[b"validation"])
+                result["violations"] = len(report["violations"])
+            if schema is not None:
+                from labetl.schema import conform
+
+                with stage("conform"):
+                    table = conform(table, **schema)
+            with stage("write_parquet"):
+                if dataset is not None:
+                    from labetl.dataset import write_dataset_file
+
+                    options = dict(dataset)
+                    root = options.pop("root", os.path.dirname(output))
+                    result["output"] = write_dataset_file(
+                        table, root, os.path.relpath(output, root), **options
+                    )
+                elif ipc is not None:
+                    from labetl.ipc import write_ipc
+
+                    write_ipc(table, output, **ipc)
+                else:
+                    with atomic_path(output) as tmp_path:
+                        pq.write_table(table, tmp_path, compression="snappy")
+            if pyramid is not None:
+                from labetl.pyramid import write_pyramid
+
+                with stage("write_pyramid"):
+                    write_pyramid(table, result["output"], pyramid)
+    except Exception as e:
+        kind = "memory" if isinstance(e, MemoryError) else "exception"
+        set_error(result, kind, e, traceback.format_exc())
+    result["duration"] = time.perf_counter() - start
+    if stages is not None:
+        result["profile"] = stages.to_dict()
+    if manifest is not None:
+        _open_manifest(manifest).record(result)
+    return result
+
+
+# Options of `convert_file` that do not change what it writes
+RUN_OPTIONS = ("manifest", "profile", "profile_memory")
+
+
+def options_hash(options: dict[str, Any]) -> str:
+    """Hash the options of `convert_file` that change its output.
+
+    Options that are off (None or False) are left out, so adding an option
+    does not change the hash of conversions that do not use it.
+
+    Args:
+        options (dict[str, Any]): Keyword arguments of `convert_file`.
+
+    Returns:
+        str: A hex digest, stored in the manifest with each conversion.
+    """
+    relevant = {
+        key: value
+        for key, value in options.items()
+        if key not in RUN_OPTIONS and value is not None and value is not False
+    }
+    encoded = json.dumps(relevant, sort_keys=True, default=list).encode("utf-8")
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+def new_record(
+    path: str, output: str, options: dict[str, Any] | None = None
+) -> dict[str, Any]:
+    """Start the conversion record of a file, see `convert_file`.
+
+    A file that was removed or moved since it was planned gets a failed
+    record without size and modification time, rather than an exception that
+    would abort the whole batch.
+
+    Args:
+        path (str): The path to the instrument file.
+        output (str): The output path planned for the file.
+        options (dict[str, Any] | None): Keyword arguments of `convert_file`,
+            whose hash is recorded so the manifest can tell when they change.
+    """
+    parser, version = parser_version(path) or (None, None)
+    record = {
+        "path": path,
+        "output": output,
+        "target": output,
+        "options_hash": options_hash(options or {}),
+        "size": None,
+        "mtime_ns": None,
+        "file_hash": None,
+        "parser": parser,
+        "parser_version": version,
+        "status": "ok",
+        "error": None,
+    }
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        set_error(record, "exception", e)
+    else:
+        record["size"], record["mtime_ns"] = stat.st_size, stat.st_mtime_ns
+    return record
+
+
+def set_error(
+    record: dict[str, Any],
+    kind: str,
+    error: BaseException,
+    trace: str | None = None,
+    **info: Any,
+) -> None:
+    """Mark a conversion record as failed.
+
+    Besides the "error" message, the record gets structured "error_info" with
+    the kind of failure, the exception type and message, the traceback if any
+    and any additional fields.
+
+    Args:
+        record (dict[str, Any]): The conversion record.
+        kind (str): "exception", "memory" (out of memory), "timeout" or
+            "crashed" (the worker process died).
+        error (BaseException): The exception describing the failure.
+        trace (str | None): The formatted traceback of the exception.
+        **info (Any): Additional fields, e.g. the exit code of the worker.
+    """
+    record["status"] = "error"
+    record["error"] = f"{type(error).__name__}: {error}"
+    record["error_info"] = {
+        "kind": kind,
+        "type": type(error).__name__,
+        "message": str(error),
+        "traceback": trace,
+        **info,
+    }
+
+
+def _file_hash(table: pa.Table) -> str | None:
+    """Get the hash of the source file that the loader stored in the metadata."""
+    metadata = table.schema.metadata or {}
+    file_meta = json.loads(metadata.get(b"file_metadata", b"{}"))
+    return file_meta.get("file_hash", {}).get("hash")
+
+
+# One connection per manifest and process, reused across the files it converts
+_manifests: dict[str, Manifest] = {}
+
+
+def _open_manifest(path: str) -> Manifest:
+    """Get this process's connection to a manifest database."""
+    if path not in _manifests:
+        _manifests[path] = Manifest(path)
+    return _manifests[path]
+
+
+def _convert_chunk(
+    chunk: list[tuple[str, str]], options: dict[str, Any]
+) -> list[dict[str, Any]]:
+    """Convert a chunk of files inside a worker process."""
+    return [convert_file(path, output, **options) for path, output in chunk]
+
+
+def _chunked(
+    items: list[tuple[str, str]], size: int
+) -> Iterator[list[tuple[str, str]]]:
+    """Split a list into chunks of at most `size` items."""
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def _report_progress(
+    done: int, total: int, nbytes: int, start: float, stream: TextIO, end: str = ""
+) -> None:
+    """Write a single-line progress and throughput summary."""
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    stream.write(
+        f"\r{done}/{total} files | {done / elapsed:.1f} files/s | "
+        f"{nbytes / elapsed / 1e6:.2f} MB/s | {elapsed:.1f} s{end}"
+    )
+    stream.flush()
+
+
+def convert_paths(
+    sources: Iterable[str],
+    out_dir: str,
+    jobs: int | None = None,
+    chunksize: int = 8,
+    progress: bool = True,
+    stream: TextIO = sys.stderr,
+    dataset: dict[str, Any] | None = None,
+    manifest: str | None = None,
+    force: bool = False,
+    retry_failed: bool = False,
+    profile: bool = False,
+    profile_memory: bool = False,
+    metrics: Metrics | None = None,
+    derived: dict[str, Any] | None = None,
+    schema: dict[str, Any] | None = None,
+    pyramid: Iterable[int] | None = None,
+    ipc: dict[str, Any] | None = None,
+    validate: bool = False,
+    units: dict[str, Any] | None = None,
+    timeout: float | None = None,
+    memory_limit: int | None = None,
+    quarantine: str | None = None,
+    quarantine_mode: str = "symlink",
+) -> list[dict[str, Any]]:
+    """Convert all supported files found in the sources to Parquet.
+
+    Files are grouped into chunks which are dispatched to a pool of worker
+    processes. Only a bounded number of chunks is in flight at once so that
+    very large backfills do not queue every task up front.
+
+    Args:
+        sources (Iterable[str]): Files or directories to convert.
+        out_dir (str): The directory to write the Parquet files in.
+        jobs (int | None): The number of worker processes. Defaults to the
+            number of CPUs. With 1 job files are converted in this process.
+        chunksize (int): The number of files sent to a worker per task.
+        progress (bool): Whether to print a live progress summary.
+        stream (TextIO): The stream to print the progress summary to.
+        dataset (dict[str, Any] | None): If given, write the files into a
+            hive-partitioned dataset rooted at `out_dir`, mirroring the source
+            tree within each partition, see `labetl.dataset.write_dataset_file`.
+        manifest (str | None): The path to a `Manifest` database. Files whose
+            size, modification time, parser version, planned output and
+            conversion options are unchanged since they were recorded are
+            skipped, and every conversion is recorded.
+        force (bool): Convert every file even if the manifest says it is
+            current.
+        retry_failed (bool): Convert files that failed in a previous run even
+            if they are unchanged.
+        profile (bool): Whether to profile the stages of each conversion, see
+            `labetl.profiling.hot_stages` to aggregate them.
+        profile_memory (bool): Whether the profile also measures the peak
+            memory of each stage with `tracemalloc`, which slows the loaders
+            down.
+        metrics (Metrics | None): Metrics updated with each record as soon as
+            it is returned by a worker.
+        derived (dict[str, Any] | None): If given, add smoothed derivative
+            channels to STA tables, see `labetl.derived.add_derived`.
+        schema (dict[str, Any] | None): If given, conform each table to the
+            canonical schema of its type, see `labetl.schema.conform`.
+        pyramid (Iterable[int] | None): If given, write a sidecar of
+            downsampled levels next to each Parquet output, see
+            `labetl.pyramid`.
+        ipc (dict[str, Any] | None): If given, write Arrow IPC (.arrow) files
+            instead of Parquet, see `labetl.ipc.write_ipc`.
+        validate (bool): Whether to validate each table and store the
+            violations in its metadata, see `labetl.validation`.
+        units (dict[str, Any] | None): If given, convert each table to the
+            units of a unit system, see `labetl.units.normalize_units`.
+        timeout (float | None): If given, convert each file in a supervised
+            worker process that is killed if the file takes longer than this
+            many seconds, see `labetl.supervisor`.
+        memory_limit (int | None): If given, convert each file in a supervised
+            worker process whose address space is capped at this many bytes.
+        quarantine (str | None): A folder to move or symlink the files that
+            fail to, mirroring the output directory structure, see
+            `labetl.supervisor.quarantine_file`.
+        quarantine_mode (str): "symlink" or "move".
+
+    Returns:
+        list[dict[str, Any]]: One conversion record per file, see `convert_file`.
+            Files skipped because of the manifest have the status "skipped".
+    """
+    if quarantine is not None:
+        from labetl.supervisor import quarantine_file
+    if dataset is not None and ipc is not None:
+        raise ValueError("A dataset is written as Parquet, not Arrow IPC")
+    if pyramid is not None and ipc is not None:
+        raise ValueError("Pyramids are only written for Parquet outputs")
+    suffix = ".parquet" if ipc is None else IPC_SUFFIX
+    tasks = plan_outputs(find_files(sources), out_dir, suffix)
+    if dataset is not None:
+        # Keep the subdirectories of the sources within the partitions, so that
+        # files of the same name in different directories do not collide
+        dataset = {**dataset, "root": out_dir}
+    options = {
+        "dataset": dataset,
+        "manifest": manifest,
+        "profile": profile,
+        "profile_memory": profile_memory,
+        "derived": derived,
+        "schema": schema,
+        "pyramid": pyramid,
+        "ipc": ipc,
+        "validate": validate,
+        "units": units,
+    }
+    skipped = []
+    if manifest is not None and not force:
+        tasks, skipped = _skip_current(tasks, manifest, retry_failed, options)
+    if metrics is not None:
+        for record in skipped:
+            metrics.observe(record)
+    jobs = jobs or os.cpu_count() or 1
+    chunksize = max(chunksize, 1)
+    total = len(tasks)
+    results: list[dict[str, Any]] = []
+    nbytes = 0
+    start = time.perf_counter()
+
+    def collect(chunk_results: list[dict[str, Any]]) -> None:
+        nonlocal nbytes
+        if quarantine is not None:
+            for r in chunk_results:
+                if r["status"] == "error":
+                    subdir = os.path.relpath(os.path.dirname(r["output"]), out_dir)
+                    r["quarantine"] = quarantine_file(
+                        r, quarantine, subdir, quarantine_mode
+                    )
+        results.extend(chunk_results)
+        nbytes += sum(r["size"] or 0 for r in chunk_results)
+        if metrics is not None:
+            for r in chunk_results:
+                metrics.observe(r, manifest=manifest is not None and not force)
+        if progress:
+            _report_progress(len(results), total, nbytes, start, stream)
+
+    if timeout is not None or memory_limit is not None:
+        from labetl.supervisor import convert_supervised
+
+        for result in convert_supervised(tasks, options, jobs, timeout, memory_limit):
+            collect([result])
+    elif jobs == 1:
+        for chunk in _chunked(tasks, chunksize):
+            collect(_convert_chunk(chunk, options))
+    else:
+        chunks = _chunked(tasks, chunksize)
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            pending = set()
+            for chunk in chunks:
+                pending.add(executor.submit(_convert_chunk, chunk, options))
+                if len(pending) >= 2 * jobs:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        collect(future.result())
+            for future in wait(pending).done:
+                collect(future.result())
+
+    if progress:
+        _report_progress(len(results), total, nbytes, start, stream, end="\n")
+        if skipped:
+            stream.write(f"Skipped {len(skipped)} unchanged files.\n")
+
+    return skipped + results
+
+
+def _skip_current(
+    tasks: list[tuple[str, str]],
+    manifest: str,
+    retry_failed: bool,
+    options: dict[str, Any],
+) -> tuple[list[tuple[str, str]], list[dict[str, Any]]]:
+    """Split the tasks into files to convert and files the manifest has current."""
+    todo = []
+    skipped = []
+    digest = options_hash(options)
+    with Manifest(manifest) as db:
+        for path, output in tasks:
+            try:
+                stat = os.stat(path)
+            except OSError:  # removed since it was found, recorded as failed
+                todo.append((path, output))
+                continue
+            parser, version = parser_version(path)  # type: ignore[misc]
+            entry = db.current_entry(
+                path,
+                stat.st_size,
+                stat.st_mtime_ns,
+                parser,
+                version,
+                output,
+                digest,
+                retry_failed,
+            )
+            if entry is None:
+                todo.append((path, output))
+            else:
+                skipped.append({**entry, "path": path, "status": "skipped"})
+    return todo, skipped
@@ -1,24 +1,83 @@
-from typing import Any
-
-import numpy as np
-import pyarrow as pa
-import pyarrow.parquet as pq
-from brukeropus import read_opus
-from brukeropus.file import OPUSFile, get_param_label
-
-from labetl.util import get_hash, set_metadata
+from __future__ import annotations
+
+import os
+import tempfile
+from typing import TYPE_CHECKING, Any
+
+from labetl.lazy import lazy_import
+from labetl.profiling import profiled, stage
+from labetl.util import (
+    add_column_stats,
+    check_backend,
+    get_hash,
+    read_source,
+    set_metadata,
+    source_name,
+    to_backend,
+)
+
+if TYPE_CHECKING:
+    import polars as pl
+    from brukeropus.file import OPUSFile
+
+    from labetl.util import Source
+
+np = lazy_import("numpy")
+pa = lazy_import("pyarrow")
+pq = lazy_import("pyarrow.parquet")
+brukeropus = lazy_import("brukeropus")
+brukeropus_file = lazy_import("brukeropus.file")
+
+
+def read_opus_bytes(data: bytes, name: str | None = None) -> OPUSFile:
+    """Parse an OPUS file from its bytes.
+
+    `brukeropus.read_opus` only reads from a path, so the bytes are written to
+    a temporary file and parsed through it. Only the public API is used, as
+    the internals of `OPUSFile` change between brukeropus releases. The bytes
+    are kept in the "bytes" attribute, as in the debug mode of `OPUSFile`, to
+    hash them.
 
+    Args:
+        data (bytes): The contents of the OPUS file.
+        name (str | None): The name of the file, stored as its "filepath".
 
-def load_ftir_data(file_path: str) -> pa.Table:
+    Returns:
+        OPUSFile: The parsed file, which is falsy if the bytes are not an OPUS
+            file.
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, os.path.basename(name or "") or "upload.0")
+        with open(path, "wb") as f:
+            f.write(data)
+        file = brukeropus.read_opus(path)
+    file.filepath = name
+    file.name = name
+    file.bytes = data
+    return file
+
+
+def load_ftir_data(
+    file_path: Source, backend: str = "arrow"
+) -> pa.Table | pl.DataFrame:
     """Loads FTIR data from an OPUS file and returns it as a pa.Table.
 
     Args:
-        file_path (str): The path to the OPUS file.
+        file_path (Source): The path to the OPUS file, or its bytes or a
+            binary file object, see `labetl.util.read_source`.
+        backend (str): "arrow" for a pyarrow.Table with metadata, or "polars"
+            for a Polars DataFrame sharing its buffers, see `to_backend`.
 
     Returns:
         pa.Table: The FTIR data as a pa.Table with included metadata.
     """
-    opus_file = read_opus(file_path)
+    check_backend(backend)
+    file_path = read_source(file_path)
+    with stage("read_data", file_path):
+        if isinstance(file_path, bytes):
+            opus_file = read_opus_bytes(file_path, source_name(file_path))
+        else:
+            opus_file = brukeropus.read_opus(file_path)
     if bool(opus_file):
         # Get FTIR data as a pa.Table
         table = get_ftir_data(opus_file)
@@ -43,11 +102,13 @@ def load_ftir_data(file_path: str) -> pa.Table:
             col_meta=col_meta,
             tbl_meta={"file_metadata": tbl_meta, "type": "FTIR"},
         )
-        return table
+        table = add_column_stats(table)
+        return to_backend(table, backend)
     else:
         raise ValueError("Not a valid OPUS file")
 
 
+@profiled("build_table")
 def get_ftir_data(file: OPUSFile) -> pa.Table:
     """Retrieves FTIR data from the given OPUSFile object and returns it as a pa.Table.
 
@@ -95,6 +156,7 @@ def get_ftir_data(file: OPUSFile) -> pa.Table:
     raise ValueError("No valid data keys found in the OPUS file")
 
 
+@profiled("read_metadata")
 def get_ftir_meta(file: OPUSFile) -> dict[Any, Any]:
     """
     Retrieves the metadata from the given OPUSFile object and returns it as a dictionary.
@@ -109,11 +171,11 @@ def get_ftir_meta(file: OPUSFile) -> dict[Any, Any]:
     meta = {}
 
     # Get file hash
-    hash = get_hash(file.filepath)
+    hash = get_hash(getattr(file, "bytes", None) or file.filepath)
 
     # Extract parameters with formatted keys
     def format_key(key):
-        return get_param_label(key).lower().replace(" ", "_")
+        return brukeropus_file.get_param_label(key).lower().replace(" ", "_")
 
     params = {format_key(key): value for key, value in file.params.items()}
     rf_params = {format_key(key): value for key, value in file.rf_params.items()}
@@ -130,7 +192,7 @@ def get_ftir_meta(file: OPUSFile) -> dict[Any, Any]:
             "parameters": params,
             "reference_parameters": rf_params,
             "file_hash": {
-                "file": file.filepath.split("/")[-1],
+                "file": source_name(file.filepath) if file.filepath else None,
                 "method": "BLAKE2b",
                 "hash": hash,
             },
@@ -0,0 +1,175 @@
+"""
+In-process LRU cache of loaded tables, for notebooks and API servers.
+
+Services that load the same source files over and over can keep the parsed
+tables in memory instead of parsing them for every request. The cache is off
+by default: `enable_cache` installs a process-wide `TableCache` that
+`labetl.load` then consults for files given by path.
+
+Entries are keyed by the absolute path, the loader and its options, and are
+only reused while the size and modification time of the file are unchanged,
+so a file that is rewritten is parsed again. The cache holds at most
+`max_bytes` of table buffers (`Table.nbytes`), evicting the least recently
+used tables first. Concurrent requests for a table that is being loaded wait
+for that load rather than parsing the file again (single flight).
+
+Arrow tables are immutable, so the cached tables are shared between callers
+and threads without copying.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Any, Callable
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+DEFAULT_MAX_BYTES = 1 << 30
+
+Key = tuple[str, Callable[..., "pa.Table"], tuple[tuple[str, Any], ...]]
+
+
+class TableCache:
+    """A thread-safe LRU cache of tables with a budget in bytes.
+
+    Args:
+        max_bytes (int): The maximum total `nbytes` of the cached tables.
+            Tables larger than this are returned without being cached.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> ((size, mtime_ns), table), least recently used first
+        self._entries: OrderedDict[Key, tuple[tuple[int, int], pa.Table]] = (
+            OrderedDict()
+        )
+        # (key, (size, mtime_ns)) -> the result of the load in progress
+        self._loading: dict[tuple[Key, tuple[int, int]], Future] = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def load(
+        self, path: str, loader: Callable[..., pa.Table], **options: Any
+    ) -> pa.Table:
+        """Get the table of a file, loading it on a miss.
+
+        Args:
+            path (str): The path to the file.
+            loader (Callable[..., pyarrow.Table]): The loader, called as
+                `loader(path, **options)` on a miss.
+            **options: Options of the loader, part of the key. They must be
+                hashable.
+
+        Returns:
+            pyarrow.Table: The cached or newly loaded table.
+        """
+        stat = os.stat(path)
+        state = (stat.st_size, stat.st_mtime_ns)
+        key = (
+            os.path.abspath(path),
+            loader,
+            tuple(sorted(options.items())),
+        )
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == state:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            flight = self._loading.get((key, state))
+            leader = flight is None
+            if leader:
+                flight = self._loading[(key, state)] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return flight.result()
+
+        try:
+            table = loader(path, **options)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[(key, state)]
+            flight.set_exception(e)
+            raise
+        with self._lock:
+            del self._loading[(key, state)]
+            self._store(key, state, table)
+        flight.set_result(table)
+        return table
+
+    def _store(self, key: Key, state: tuple[int, int], table: pa.Table) -> None:
+        """Insert a table, replacing older versions and evicting others."""
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.nbytes -= previous[1].nbytes
+        if table.nbytes > self.max_bytes:
+            return
+        self._entries[key] = (state, table)
+        self.nbytes += table.nbytes
+        while self.nbytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop all cached tables, keeping the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self) -> dict[str, int]:
+        """Get the counters and the current size of the cache.
+
+        Returns:
+            dict[str, int]: The "hits", "misses", requests that waited for a
+                load in progress ("coalesced"), "evictions", the number of
+                "entries" and their "nbytes", and "max_bytes".
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "nbytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_cache: TableCache | None = None
+
+
+def enable_cache(max_bytes: int = DEFAULT_MAX_BYTES) -> TableCache:
+    """Install a process-wide cache that `labetl.load` uses for paths.
+
+    Args:
+        max_bytes (int): The budget of the cache, see `TableCache`.
+
+    Returns:
+        TableCache: The installed cache, e.g. to read its `stats`.
+    """
+    global _cache
+    _cache = TableCache(max_bytes)
+    return _cache
+
+
+def disable_cache() -> None:
+    """Remove the process-wide cache, releasing its tables."""
+    global _cache
+    _cache = None
+
+
+def get_cache() -> TableCache | None:
+    """Get the process-wide cache, or None if it is not enabled."""
+    return _cache
@@ -0,0 +1,416 @@
+"""
+Catalog of converted Parquet files built from their footers alone.
+
+Every loader stores the metadata of the source file as JSON in the schema
+metadata of its table, which Parquet keeps in the file footer. The catalog
+reads just the footers, in parallel, and flattens the commonly queried keys
+into one row per file so that questions such as "all STA runs in N2 at
+10 K/min for Douglas Fir" are a filter over a single small table:
+
+    catalog = update_catalog("catalog.parquet", ["parquet/"])
+    find_runs(catalog, type="STA", atmosphere="N2", heating_rate=10.0)
+
+The statistics the loaders store in the metadata of each column (see
+`labetl.util.column_stats`) are kept too, so range questions such as "runs
+where the temperature exceeded 800 °C" prune whole files without reading them:
+
+    find_runs_in_range(catalog, "temperature", low=800)
+"""
+
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Iterable
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from dateutil.parser import parse
+
+from labetl.util import atomic_path
+
+# Bump whenever the extraction of a column changes, so that existing catalogs
+# are rebuilt instead of keeping stale rows for unchanged files.
+CATALOG_VERSION = 2
+
+COLUMN_STATS = pa.struct(
+    [
+        pa.field("min", pa.float64()),
+        pa.field("max", pa.float64()),
+        pa.field("mean", pa.float64()),
+        pa.field("count", pa.int64()),
+        pa.field("null_count", pa.int64()),
+    ]
+)
+
+CATALOG_SCHEMA = pa.schema(
+    [
+        pa.field("path", pa.string()),
+        pa.field("size", pa.int64()),
+        pa.field("mtime_ns", pa.int64()),
+        pa.field("type", pa.string()),
+        pa.field("source_file", pa.string()),
+        pa.field("file_hash", pa.string()),
+        pa.field("sample_name", pa.string()),
+        pa.field("sample_id", pa.string()),
+        pa.field("material", pa.string()),
+        pa.field("operator", pa.string()),
+        pa.field("laboratory", pa.string()),
+        pa.field("instrument", pa.string()),
+        pa.field("project", pa.string()),
+        pa.field("date_performed", pa.timestamp("us", tz="UTC")),
+        pa.field("atmosphere", pa.string()),
+        pa.field("heating_rate", pa.float64(), metadata={"unit": "K/min"}),
+        pa.field("heating_rates", pa.list_(pa.float64()), metadata={"unit": "K/min"}),
+        pa.field("sample_mass", pa.float64(), metadata={"unit": "mg"}),
+        pa.field("num_rows", pa.int64()),
+        pa.field("columns", pa.list_(pa.string())),
+        pa.field("column_stats", pa.map_(pa.string(), COLUMN_STATS)),
+    ],
+    metadata={"catalog_version": str(CATALOG_VERSION)},
+)
+
+# Purge gases as written by the Netzsch software -> chemical formula
+GASES = {
+    "NITROGEN": "N2",
+    "OXYGEN": "O2",
+    "AIR": "Air",
+    "ARGON": "Ar",
+    "HELIUM": "He",
+    "CARBON DIOXIDE": "CO2",
+}
+
+# Atmosphere token of the lab's file naming convention, e.g. "_STA_N2_10K_"
+ATMOSPHERE_IN_NAME = re.compile(r"_(N2|O2|Air|Ar|He|CO2)_", re.IGNORECASE)
+
+
+def _first(meta: dict[str, Any], *keys: str) -> Any:
+    """Get the first of the keys that has a non-empty value."""
+    for key in keys:
+        value = meta.get(key)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _text(value: Any) -> str | None:
+    """Get a string value, or None for missing and structured values."""
+    if isinstance(value, str):
+        return value.strip() or None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return None
+
+
+def _number(value: Any) -> float | None:
+    """Get a number from a plain value or a {"value": ..., "unit": ...} dict."""
+    if isinstance(value, dict):
+        value = value.get("value")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+
+def _date(value: Any) -> datetime | None:
+    """Parse a date performed into an aware datetime in UTC."""
+    if isinstance(value, dict):
+        value = value.get("date")
+    if not isinstance(value, str):
+        return None
+    try:
+        date = parse(value)
+    except (ValueError, OverflowError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.astimezone(timezone.utc)
+
+
+def _heating_rates(meta: dict[str, Any]) -> list[float]:
+    """Get the distinct non-zero heating rates of the temperature program in K/min."""
+    rates = []
+    # Netzsch CSV exports: "seg._N": {"heating_rate": {"value": 10.0, ...}}
+    for key, segment in meta.items():
+        if key.startswith("seg.") and isinstance(segment, dict):
+            rates.append(_number(segment.get("heating_rate")))
+    # Netzsch NGB files: "temperature_program": {"step_N": {"heating_rate": 10.0}}
+    program = meta.get("temperature_program")
+    if isinstance(program, dict):
+        for step in program.values():
+            if isinstance(step, dict):
+                rates.append(_number(step.get("heating_rate")))
+    # MCC files store a single heating rate in °C/s
+    rate = meta.get("heating_rate")
+    if isinstance(rate, dict) and rate.get("unit") in ("°C/s", "K/s"):
+        rate = _number(rate) * 60.0 if _number(rate) is not None else None
+    rates.append(_number(rate))
+    return sorted({round(r, 6) for r in rates if r})
+
+
+def _atmosphere(meta: dict[str, Any], name: str | None) -> str | None:
+    """Get the purge gas of the run as a chemical formula where known.
+
+    NGB files do not store the gases, so for those the atmosphere is taken from
+    the file name if it follows the lab's naming convention.
+    """
+    for key in ("purge_1_mfc", "purge_2_mfc", "protective_mfc"):
+        mfc = meta.get(key)
+        if isinstance(mfc, dict) and isinstance(mfc.get("gas"), str):
+            gas = mfc["gas"].strip().upper()
+            if gas:
+                return GASES.get(gas, gas)
+    match = ATMOSPHERE_IN_NAME.search(name or "")
+    if match:
+        gas = match.group(1).upper()
+        return {"AIR": "Air", "AR": "Ar", "HE": "He"}.get(gas, gas)
+    return None
+
+
+def _column_stats(schema: pa.Schema) -> list[tuple[str, dict[str, Any]]]:
+    """Get the statistics stored in the metadata of each column."""
+    stats = []
+    for field in schema:
+        value = (field.metadata or {}).get(b"stats")
+        if value is None:
+            continue
+        try:
+            stats.append((field.name, json.loads(value)))
+        except ValueError:
+            continue
+    return stats
+
+
+def catalog_row(path: str, metadata: pq.FileMetaData) -> dict[str, Any]:
+    """Flatten the footer of one Parquet file into a catalog row.
+
+    Args:
+        path (str): The path of the Parquet file.
+        metadata (pyarrow.parquet.FileMetaData): The footer of the file.
+
+    Returns:
+        dict[str, Any]: The row with the fields of `CATALOG_SCHEMA`, except
+            the file size and modification time.
+    """
+    schema = metadata.schema.to_arrow_schema()
+    table_meta = schema.metadata or {}
+    try:
+        meta = json.loads(table_meta.get(b"file_metadata", b"{}"))
+    except ValueError:
+        meta = {}
+    file_hash = meta.get("file_hash") if isinstance(meta.get("file_hash"), dict) else {}
+    rates = _heating_rates(meta)
+    return {
+        "path": path,
+        "type": table_meta.get(b"type", b"").decode("utf-8") or None,
+        "source_file": _text(file_hash.get("file")),
+        "file_hash": _text(file_hash.get("hash")),
+        "sample_name": _text(
+            _first(meta, "sample_name", "sample", "sample_id", "test_id")
+        ),
+        "sample_id": _text(_first(meta, "sample_id", "test_id")),
+        "material": _text(meta.get("material")),
+        "operator": _text(meta.get("operator")),
+        "laboratory": _text(_first(meta, "laboratory", "lab")),
+        "instrument": _text(meta.get("instrument")),
+        "project": _text(meta.get("project")),
+        # The FTIR parser stores the date under "data_performed"
+        "date_performed": _date(_first(meta, "date_performed", "data_performed")),
+        "atmosphere": _atmosphere(meta, _text(file_hash.get("file"))),
+        "heating_rate": max(rates) if rates else None,
+        "heating_rates": rates,
+        "sample_mass": _number(_first(meta, "sample_mass", "sample_weight")),
+        "num_rows": metadata.num_rows,
+        "columns": schema.names,
+        "column_stats": _column_stats(schema),
+    }
+
+
+def find_parquet_files(roots: Iterable[str]) -> dict[str, tuple[int, int]]:
+    """Find the Parquet files under the roots.
+
+    Hidden files, such as the temporary files of writes in progress, are
+    skipped.
+
+    Args:
+        roots (Iterable[str]): Parquet files or directories to search.
+
+    Returns:
+        dict[str, tuple[int, int]]: The size and modification time (ns) of each
+            file, keyed by absolute path.
+    """
+    found = {}
+    stack = []
+    for root in roots:
+        if os.path.isfile(root):
+            stat = os.stat(root)
+            found[os.path.abspath(root)] = (stat.st_size, stat.st_mtime_ns)
+        else:
+            stack.append(root)
+    while stack:
+        for entry in os.scandir(stack.pop()):
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif entry.name.endswith(".parquet") and entry.is_file():
+                stat = entry.stat()
+                found[os.path.abspath(entry.path)] = (stat.st_size, stat.st_mtime_ns)
+    return found
+
+
+def _read_row(path: str, state: tuple[int, int]) -> dict[str, Any] | None:
+    """Read the catalog row of a file, or None if it is not a readable Parquet file."""
+    try:
+        row = catalog_row(path, pq.read_metadata(path))
+    except (OSError, pa.ArrowException):
+        return None
+    row["size"], row["mtime_ns"] = state
+    return row
+
+
+def build_catalog(
+    files: dict[str, tuple[int, int]], max_workers: int | None = None
+) -> pa.Table:
+    """Read the footers of the files in parallel into a catalog table.
+
+    Args:
+        files (dict[str, tuple[int, int]]): The size and modification time of
+            each file keyed by path, see `find_parquet_files`.
+        max_workers (int | None): The number of threads reading footers.
+            Footer reads are dominated by I/O latency on network shares, so
+            this defaults to 32.
+
+    Returns:
+        pyarrow.Table: One row per readable file with `CATALOG_SCHEMA`.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers or 32) as executor:
+        rows = executor.map(_read_row, files, files.values())
+        rows = [row for row in rows if row is not None]
+    return pa.Table.from_pylist(rows, schema=CATALOG_SCHEMA)
+
+
+def update_catalog(
+    catalog: str,
+    roots: Iterable[str],
+    max_workers: int | None = None,
+) -> pa.Table:
+    """Bring a catalog file up to date with the Parquet files under the roots.
+
+    Only files that are new, or whose size or modification time changed, have
+    their footers read. Rows of files that no longer exist are dropped, and
+    the whole catalog is rebuilt if it was written by an older
+    `CATALOG_VERSION`. The catalog is written atomically, so concurrent
+    readers see either the old or the new catalog.
+
+    Args:
+        catalog (str): The path of the catalog Parquet file, created if missing.
+        roots (Iterable[str]): Parquet files or directories to catalog.
+        max_workers (int | None): The number of threads reading footers.
+
+    Returns:
+        pyarrow.Table: The updated catalog.
+    """
+    files = find_parquet_files(roots)
+    files.pop(os.path.abspath(catalog), None)
+
+    previous = None
+    if os.path.exists(catalog):
+        version = (pq.read_schema(catalog).metadata or {}).get(b"catalog_version")
+        if version == str(CATALOG_VERSION).encode():
+            previous = read_catalog(catalog)
+    keep = []
+    if previous is not None:
+        known = zip(
+            previous["path"].to_pylist(),
+            previous["size"].to_pylist(),
+            previous["mtime_ns"].to_pylist(),
+        )
+        for i, (path, size, mtime_ns) in enumerate(known):
+            if files.get(path) == (size, mtime_ns):
+                keep.append(i)
+                del files[path]
+
+    changed = build_catalog(files, max_workers)
+    if previous is not None:
+        changed = pa.concat_tables([previous.take(keep), changed])
+    result = changed.sort_by("path")
+
+    with atomic_path(catalog) as tmp_path:
+        pq.write_table(result, tmp_path, compression="zstd")
+    return result
+
+
+def read_catalog(catalog: str) -> pa.Table:
+    """Read a catalog written by `update_catalog`.
+
+    Args:
+        catalog (str): The path of the catalog Parquet file.
+
+    Returns:
+        pyarrow.Table: The catalog.
+    """
+    return pq.read_table(catalog, schema=CATALOG_SCHEMA)
+
+
+def find_runs(catalog: pa.Table, **criteria: Any) -> pa.Table:
+    """Select the catalog rows matching every criterion.
+
+    Strings are compared case-insensitively. A heating rate matches runs whose
+    temperature program contains that rate.
+
+    Args:
+        catalog (pyarrow.Table): The catalog, see `read_catalog`.
+        **criteria: Column names and the value they must equal.
+
+    Returns:
+        pyarrow.Table: The matching rows.
+    """
+    mask = None
+    for column, value in criteria.items():
+        if column not in CATALOG_SCHEMA.names:
+            raise ValueError(f"Unknown catalog column: {column}")
+        if column in ("heating_rate", "heating_rates"):
+            flat = pc.list_flatten(catalog["heating_rates"])
+            parents = pc.list_parent_indices(catalog["heating_rates"])
+            hits = pc.unique(pc.filter(parents, pc.equal(flat, float(value))))
+            match = pc.is_in(pa.array(range(catalog.num_rows)), hits)
+        elif isinstance(value, str):
+            match = pc.equal(pc.utf8_lower(catalog[column]), value.lower())
+        else:
+            match = pc.equal(catalog[column], value)
+        match = pc.fill_null(match, False)
+        mask = match if mask is None else pc.and_(mask, match)
+    return catalog if mask is None else catalog.filter(mask)
+
+
+def find_runs_in_range(
+    catalog: pa.Table,
+    column: str,
+    low: float | None = None,
+    high: float | None = None,
+) -> pa.Table:
+    """Select the catalog rows of runs with values of a column in a range.
+
+    Only the statistics in the catalog are compared, so runs are kept if their
+    minimum and maximum overlap the range, e.g. `low=800` keeps the runs whose
+    maximum is at least 800. Runs without statistics for the column are
+    dropped.
+
+    Args:
+        catalog (pyarrow.Table): The catalog, see `read_catalog`.
+        column (str): The name of the data column, e.g. "temperature".
+        low (float | None): The lower bound of the range, if any.
+        high (float | None): The upper bound of the range, if any.
+
+    Returns:
+        pyarrow.Table: The matching rows.
+    """
+    stats = pc.map_lookup(catalog["column_stats"], column, "first")
+    match = pc.is_valid(stats)
+    if low is not None:
+        match = pc.and_(match, pc.greater_equal(pc.struct_field(stats, "max"), low))
+    if high is not None:
+        match = pc.and_(match, pc.less_equal(pc.struct_field(stats, "min"), high))
+    return catalog.filter(pc.fill_null(match, False))
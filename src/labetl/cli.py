@@ -0,0 +1,618 @@
+"""
+Command-line interface for labetl.
+"""
+
+import argparse
+import sys
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser for the `labetl` command."""
+    parser = argparse.ArgumentParser(
+        prog="labetl",
+        description="Convert laboratory instrument data files to Parquet.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert = subparsers.add_parser(
+        "convert", help="Convert instrument files or directories to Parquet."
+    )
+    convert.add_argument(
+        "sources", nargs="+", metavar="SRC", help="Files or directories to convert."
+    )
+    convert.add_argument(
+        "--out", "-o", required=True, metavar="DIR", help="Output directory."
+    )
+    convert.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Number of worker processes (default: number of CPUs).",
+    )
+    convert.add_argument(
+        "--chunksize",
+        type=int,
+        default=8,
+        metavar="N",
+        help="Number of files sent to a worker per task (default: 8).",
+    )
+    convert.add_argument(
+        "--quiet", "-q", action="store_true", help="Do not print progress."
+    )
+    convert.add_argument(
+        "--dataset",
+        action="store_true",
+        help="Write a hive-partitioned dataset by type, year, month and material.",
+    )
+    convert.add_argument(
+        "--row-group-size",
+        type=int,
+        default=64 * 1024,
+        metavar="N",
+        help="Maximum rows per row group in dataset mode (default: 65536).",
+    )
+    convert.add_argument(
+        "--zstd-level",
+        type=int,
+        default=9,
+        metavar="N",
+        help="Zstd compression level in dataset mode (default: 9).",
+    )
+    convert.add_argument(
+        "--manifest",
+        metavar="PATH",
+        help="SQLite manifest used to skip files converted by a previous run.",
+    )
+    convert.add_argument(
+        "--force",
+        action="store_true",
+        help="Convert all files, even those the manifest has as unchanged.",
+    )
+    convert.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="Convert files that failed in a previous run even if unchanged.",
+    )
+    convert.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print the time spent in each loader stage.",
+    )
+    convert.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="Also measure the peak memory of each loader stage, which slows "
+        "conversions down (implies --profile).",
+    )
+    convert.add_argument(
+        "--profile-out",
+        metavar="PATH",
+        help="Write the stage profile of each file as JSON lines (implies --profile).",
+    )
+    convert.add_argument(
+        "--derive",
+        nargs="?",
+        type=int,
+        const=15,
+        metavar="WINDOW",
+        help="Add Savitzky-Golay smoothed DTG and d(DSC)/dT channels to STA tables, "
+        "fitted over WINDOW points (default: 15).",
+    )
+    convert.add_argument(
+        "--validate",
+        action="store_true",
+        help="Check each table for physically implausible data (time going "
+        "backwards, out-of-range values, temperature spikes, dropped channels) "
+        "and store the violations in its metadata.",
+    )
+    convert.add_argument(
+        "--units",
+        choices=("si", "lab"),
+        metavar="SYSTEM",
+        help="Convert the columns to the units of a unit system: si (K, s, kg, "
+        "...) or lab (°C, s, mg, ...).",
+    )
+    convert.add_argument(
+        "--conform",
+        action="store_true",
+        help="Conform each table to the canonical columns and types of its type.",
+    )
+    convert.add_argument(
+        "--precision",
+        choices=("float64", "float32"),
+        default="float64",
+        help="Type of the sensor channels with --conform (default: float64).",
+    )
+    convert.add_argument(
+        "--time-precision",
+        choices=("float64", "float32"),
+        default="float64",
+        help="Type of the time channel with --conform (default: float64).",
+    )
+    convert.add_argument(
+        "--temperature-precision",
+        choices=("float64", "float32"),
+        default="float64",
+        help="Type of the temperature channels with --conform (default: float64).",
+    )
+    convert.add_argument(
+        "--pyramid",
+        nargs="?",
+        const="4,16,64",
+        metavar="FACTORS",
+        help="Also write a sidecar of levels downsampled by these comma-separated "
+        "factors for plotting (default: 4,16,64).",
+    )
+    convert.add_argument(
+        "--ipc",
+        nargs="?",
+        const="none",
+        choices=("none", "lz4", "zstd"),
+        metavar="COMPRESSION",
+        help="Write Arrow IPC (.arrow) files for memory-mapped reads instead of "
+        "Parquet, uncompressed by default or compressed with lz4 or zstd.",
+    )
+    convert.add_argument(
+        "--timeout",
+        type=float,
+        metavar="S",
+        help="Convert each file in a supervised worker and abort it after S seconds.",
+    )
+    convert.add_argument(
+        "--memory-limit",
+        type=int,
+        metavar="MB",
+        help="Convert each file in a supervised worker with at most MB "
+        "megabytes of address space.",
+    )
+    convert.add_argument(
+        "--quarantine",
+        metavar="DIR",
+        help="Symlink files that fail to DIR with their error record.",
+    )
+    convert.add_argument(
+        "--quarantine-mode",
+        choices=("symlink", "move"),
+        default="symlink",
+        help="Symlink failed files to the quarantine or move them there "
+        "(default: symlink).",
+    )
+    add_metrics_arguments(convert)
+
+    watch = subparsers.add_parser(
+        "watch", help="Watch drop folders and convert files as they arrive."
+    )
+    watch.add_argument(
+        "folders", nargs="+", metavar="DIR", help="Folders to watch recursively."
+    )
+    watch.add_argument(
+        "--out", "-o", required=True, metavar="DIR", help="Output directory."
+    )
+    watch.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Number of worker processes (default: number of CPUs).",
+    )
+    watch.add_argument(
+        "--interval",
+        type=float,
+        default=1.0,
+        metavar="S",
+        help="Seconds between scans of the folders (default: 1).",
+    )
+    watch.add_argument(
+        "--settle",
+        type=float,
+        default=2.0,
+        metavar="S",
+        help="Seconds a file must be unchanged before conversion (default: 2).",
+    )
+    add_metrics_arguments(watch)
+
+    catalog = subparsers.add_parser(
+        "catalog", help="Build or update a metadata catalog of Parquet files."
+    )
+    catalog.add_argument(
+        "roots", nargs="+", metavar="DIR", help="Parquet files or directories."
+    )
+    catalog.add_argument(
+        "--out",
+        "-o",
+        required=True,
+        metavar="PATH",
+        help="Catalog Parquet file, updated incrementally if it exists.",
+    )
+    catalog.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Number of threads reading footers (default: 32).",
+    )
+
+    aggregate = subparsers.add_parser(
+        "aggregate", help="Average the replicate runs (R1, R2, ...) of each sample."
+    )
+    aggregate.add_argument(
+        "roots", nargs="+", metavar="DIR", help="Parquet files or directories."
+    )
+    aggregate.add_argument(
+        "--out", "-o", required=True, metavar="PATH", help="Output Parquet file."
+    )
+    aggregate.add_argument(
+        "--x",
+        default="temperature",
+        help="Column to interpolate the replicates on (default: temperature).",
+    )
+    aggregate.add_argument(
+        "--columns",
+        metavar="COLS",
+        help="Comma-separated columns to average (default: all shared floats).",
+    )
+    aggregate.add_argument(
+        "--points",
+        type=int,
+        default=500,
+        metavar="N",
+        help="Number of grid points per group (default: 500).",
+    )
+    aggregate.add_argument(
+        "--min-replicates",
+        type=int,
+        default=2,
+        metavar="N",
+        help="Leave out groups with fewer replicates (default: 2).",
+    )
+
+    summary = subparsers.add_parser(
+        "mcc-summary",
+        help="Summarize converted MCC runs (pHRR, THR, HRC), one row per run.",
+    )
+    summary.add_argument(
+        "roots", nargs="+", metavar="DIR", help="Parquet files or directories."
+    )
+    summary.add_argument(
+        "--out", "-o", required=True, metavar="PATH", help="Output Parquet file."
+    )
+    summary.add_argument(
+        "--jobs", "-j", type=int, default=None, help="Number of reader threads."
+    )
+
+    follow = subparsers.add_parser(
+        "follow",
+        help="Convert an STA or MCC export incrementally while it is written.",
+    )
+    follow.add_argument("path", metavar="FILE", help="STA (.csv) or MCC (.txt) file.")
+    follow.add_argument(
+        "--out", "-o", required=True, metavar="PATH", help="Output Parquet file."
+    )
+    follow.add_argument(
+        "--interval",
+        type=float,
+        default=1.0,
+        metavar="S",
+        help="Seconds between polls of the file (default: 1).",
+    )
+    follow.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=None,
+        metavar="S",
+        help="Stop once the file has not grown for S seconds "
+        "(default: until interrupted).",
+    )
+
+    normalize = subparsers.add_parser(
+        "normalize",
+        help="Convert the columns of converted files to the units of a unit system.",
+    )
+    normalize.add_argument(
+        "roots", nargs="+", metavar="DIR", help="Parquet files or directories."
+    )
+    normalize.add_argument(
+        "--out", "-o", required=True, metavar="DIR", help="Output directory."
+    )
+    normalize.add_argument(
+        "--system",
+        choices=("si", "lab"),
+        default="si",
+        help="si (K, s, kg, ...) or lab (°C, s, mg, ...) (default: si).",
+    )
+    normalize.add_argument(
+        "--threads", type=int, default=None, help="Number of files converted at once."
+    )
+
+    serve = subparsers.add_parser(
+        "serve", help="Serve conversions of uploaded files over HTTP."
+    )
+    serve.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Address to listen on (default: 127.0.0.1).",
+    )
+    serve.add_argument(
+        "--port", type=int, default=8080, help="Port to listen on (default: 8080)."
+    )
+    serve.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Number of worker processes (default: number of CPUs).",
+    )
+    serve.add_argument(
+        "--max-pending",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Conversions queued or running before uploads are refused with "
+        "503 (default: twice the workers).",
+    )
+    serve.add_argument(
+        "--max-upload",
+        type=int,
+        default=1024,
+        metavar="MB",
+        help="Largest accepted upload in MB (default: 1024).",
+    )
+
+    return parser
+
+
+def add_metrics_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the options exporting Prometheus metrics to a subcommand."""
+    parser.add_argument(
+        "--metrics-file",
+        metavar="PATH",
+        help="Write Prometheus metrics to a node exporter textfile (.prom).",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        metavar="PORT",
+        help="Serve Prometheus metrics at http://127.0.0.1:PORT/metrics.",
+    )
+
+
+def start_metrics(args: argparse.Namespace):
+    """Create the metrics of a run if any metrics option was given."""
+    if args.metrics_file is None and args.metrics_port is None:
+        return None
+    from labetl.metrics import Metrics
+
+    metrics = Metrics()
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+    return metrics
+
+
+def convert(args: argparse.Namespace) -> int:
+    """Run the `convert` subcommand."""
+    from labetl.batch import convert_paths
+
+    metrics = start_metrics(args)
+    results = convert_paths(
+        args.sources,
+        args.out,
+        jobs=args.jobs,
+        chunksize=args.chunksize,
+        progress=not args.quiet,
+        dataset={
+            "row_group_size": args.row_group_size,
+            "compression_level": args.zstd_level,
+        }
+        if args.dataset
+        else None,
+        manifest=args.manifest,
+        force=args.force,
+        retry_failed=args.retry_failed,
+        profile=args.profile or args.profile_memory or bool(args.profile_out),
+        profile_memory=args.profile_memory,
+        metrics=metrics,
+        derived={"window": args.derive} if args.derive else None,
+        schema={
+            "precision": args.precision,
+            "time_precision": args.time_precision,
+            "temperature_precision": args.temperature_precision,
+        }
+        if args.conform
+        else None,
+        pyramid=[int(f) for f in args.pyramid.split(",")] if args.pyramid else None,
+        ipc={"compression": args.ipc} if args.ipc else None,
+        validate=args.validate,
+        units={"system": args.units} if args.units else None,
+        timeout=args.timeout,
+        memory_limit=args.memory_limit * 2**20 if args.memory_limit else None,
+        quarantine=args.quarantine,
+        quarantine_mode=args.quarantine_mode,
+    )
+    if metrics is not None and args.metrics_file:
+        metrics.write_textfile(args.metrics_file)
+    if args.profile_out:
+        import json
+
+        with open(args.profile_out, "w") as f:
+            for r in results:
+                if "profile" in r:
+                    record = {k: r[k] for k in ("path", "parser", "duration")}
+                    f.write(json.dumps({**record, **r["profile"]}) + "\n")
+    if args.profile or args.profile_memory:
+        from labetl.profiling import format_hot_stages, hot_stages
+
+        print(format_hot_stages(hot_stages(results)), file=sys.stderr)
+    failed = [r for r in results if r["status"] == "error"]
+    for r in failed:
+        print(f"{r['path']}: {r['error']}", file=sys.stderr)
+    for r in results:
+        if r.get("violations"):
+            print(
+                f"{r['path']}: {r['violations']} validation rules violated",
+                file=sys.stderr,
+            )
+    converted = sum(r["status"] == "ok" for r in results)
+    print(f"Converted {converted} of {len(results)} files.", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def watch(args: argparse.Namespace) -> int:
+    """Run the `watch` subcommand."""
+    import asyncio
+
+    from labetl.watch import FolderWatcher, print_result
+
+    metrics = start_metrics(args)
+
+    def on_result(result):
+        print_result(result)
+        if metrics is not None:
+            metrics.observe(result)
+            if args.metrics_file:
+                metrics.write_textfile(args.metrics_file)
+
+    watcher = FolderWatcher(
+        args.folders,
+        args.out,
+        jobs=args.jobs,
+        interval=args.interval,
+        settle=args.settle,
+        on_result=on_result,
+    )
+    try:
+        asyncio.run(watcher.run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def catalog(args: argparse.Namespace) -> int:
+    """Run the `catalog` subcommand."""
+    from labetl.catalog import update_catalog
+
+    table = update_catalog(args.out, args.roots, max_workers=args.threads)
+    print(f"Cataloged {table.num_rows} files in {args.out}.", file=sys.stderr)
+    return 0
+
+
+def aggregate(args: argparse.Namespace) -> int:
+    """Run the `aggregate` subcommand."""
+    import pyarrow.parquet as pq
+
+    from labetl.catalog import find_parquet_files
+    from labetl.replicates import aggregate_files
+    from labetl.util import atomic_path
+
+    table = aggregate_files(
+        find_parquet_files(args.roots),
+        x=args.x,
+        columns=args.columns.split(",") if args.columns else None,
+        points=args.points,
+        min_replicates=args.min_replicates,
+    )
+    with atomic_path(args.out) as tmp_path:
+        pq.write_table(table, tmp_path, compression="zstd")
+    groups = table.column("group").unique()
+    print(f"Aggregated {len(groups)} replicate groups in {args.out}.", file=sys.stderr)
+    return 0
+
+
+def mcc_summary(args: argparse.Namespace) -> int:
+    """Run the `mcc-summary` subcommand."""
+    import pyarrow.parquet as pq
+
+    from labetl.mcc_summary import summarize_mcc_files
+    from labetl.util import atomic_path
+
+    table = summarize_mcc_files(args.roots, jobs=args.jobs)
+    with atomic_path(args.out) as tmp_path:
+        pq.write_table(table, tmp_path, compression="zstd")
+    print(f"Summarized {table.num_rows} MCC runs in {args.out}.", file=sys.stderr)
+    return 0
+
+
+def follow(args: argparse.Namespace) -> int:
+    """Run the `follow` subcommand."""
+    import signal
+    import threading
+
+    from labetl.follow import follow_to_parquet
+
+    def on_batch(batch):
+        print(f"{args.path}: +{batch.num_rows} rows", file=sys.stderr)
+
+    # Ctrl-C stops following and keeps the rows read so far
+    stop = threading.Event()
+    handler = signal.signal(signal.SIGINT, lambda *_: stop.set())
+    try:
+        rows = follow_to_parquet(
+            args.path,
+            args.out,
+            interval=args.interval,
+            idle_timeout=args.idle_timeout,
+            stop=stop,
+            on_batch=on_batch,
+        )
+    finally:
+        signal.signal(signal.SIGINT, handler)
+    print(f"Wrote {rows} rows to {args.out}.", file=sys.stderr)
+    return 0
+
+
+def normalize(args: argparse.Namespace) -> int:
+    """Run the `normalize` subcommand."""
+    from labetl.units import normalize_dataset
+
+    outputs = normalize_dataset(
+        args.roots, args.out, system=args.system, max_workers=args.threads
+    )
+    print(f"Normalized {len(outputs)} files into {args.out}.", file=sys.stderr)
+    return 0
+
+
+def serve(args: argparse.Namespace) -> int:
+    """Run the `serve` subcommand."""
+    import asyncio
+
+    from labetl.server import ConversionServer
+
+    server = ConversionServer(
+        args.host,
+        args.port,
+        jobs=args.jobs,
+        max_pending=args.max_pending,
+        max_upload=args.max_upload * 1024 * 1024,
+    )
+    print(
+        f"Serving conversions on http://{args.host}:{args.port}/convert",
+        file=sys.stderr,
+    )
+    try:
+        asyncio.run(server.run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Entry point for the `labetl` console script."""
+    args = build_parser().parse_args(argv)
+    commands = {
+        "convert": convert,
+        "watch": watch,
+        "catalog": catalog,
+        "aggregate": aggregate,
+        "mcc-summary": mcc_summary,
+        "follow": follow,
+        "normalize": normalize,
+        "serve": serve,
+    }
+    return commands[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
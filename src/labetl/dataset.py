@@ -0,0 +1,185 @@
+"""
+Write converted tables into a hive-partitioned Parquet dataset.
+
+Files are laid out as::
+
+    root/type=STA/year=2024/month=02/material=Douglas%20Fir/<name>.parquet
+
+so that dataset readers (see `open_dataset`) can prune whole directories on
+instrument type, date performed and material.
+"""
+
+import json
+import os
+from urllib.parse import quote
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from dateutil.parser import parse
+
+from labetl.util import atomic_path
+
+DEFAULT_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+PARTITION_KEYS = ("type", "year", "month", "material")
+PARTITION_SCHEMA = pa.schema(
+    [
+        pa.field("type", pa.string()),
+        pa.field("year", pa.int16()),
+        pa.field("month", pa.int8()),
+        pa.field("material", pa.string()),
+    ]
+)
+
+
+def partition_values(table: pa.Table) -> dict[str, str]:
+    """Get the hive partition values of a table from its metadata.
+
+    Args:
+        table (pyarrow.Table): A table returned by one of the loaders.
+
+    Returns:
+        dict[str, str]: The partition values keyed by partition name. Missing
+            values are set to the hive default partition.
+    """
+    metadata = table.schema.metadata or {}
+    file_meta = json.loads(metadata.get(b"file_metadata", b"{}"))
+    values = dict.fromkeys(PARTITION_KEYS, DEFAULT_PARTITION)
+
+    if b"type" in metadata:
+        values["type"] = metadata[b"type"].decode("utf-8")
+
+    # The FTIR parser stores the date under "data_performed"
+    date = file_meta.get("date_performed", file_meta.get("data_performed"))
+    if isinstance(date, dict):
+        date = date.get("date")
+    if isinstance(date, str):
+        try:
+            performed = parse(date)
+            values["year"] = f"{performed.year:04d}"
+            values["month"] = f"{performed.month:02d}"
+        except (ValueError, OverflowError):
+            pass
+
+    material = file_meta.get("material")
+    if isinstance(material, str) and material.strip():
+        values["material"] = material.strip()
+
+    return values
+
+
+def partition_path(root: str, values: dict[str, str]) -> str:
+    """Build the directory of a partition, URI-encoding each value.
+
+    Args:
+        root (str): The root directory of the dataset.
+        values (dict[str, str]): The partition values keyed by partition name.
+
+    Returns:
+        str: The directory of the partition.
+    """
+    parts = [f"{key}={quote(values[key], safe='')}" for key in PARTITION_KEYS]
+    return os.path.join(root, *parts)
+
+
+def column_encodings(
+    table: pa.Table, max_dictionary_ratio: float = 0.5
+) -> tuple[dict[str, str], list[str]]:
+    """Choose the Parquet encoding of each column.
+
+    - Floating point sensor channels use BYTE_STREAM_SPLIT, which groups the
+      bytes of each value so that the compressor sees the slowly varying
+      exponent and high mantissa bytes together.
+    - Monotonically increasing integer columns use DELTA_BINARY_PACKED.
+      Parquet only supports delta encoding for integers, so float time
+      channels are stored with BYTE_STREAM_SPLIT like the other floats.
+    - String columns with few distinct values are dictionary encoded.
+
+    Args:
+        table (pyarrow.Table): The table to be written.
+        max_dictionary_ratio (float): The largest ratio of distinct values to
+            rows for which a string column is dictionary encoded.
+
+    Returns:
+        tuple[dict[str, str], list[str]]: The `column_encoding` and
+            `use_dictionary` arguments for `pyarrow.parquet.write_table`.
+    """
+    encodings = {}
+    dictionary = []
+    for field in table.schema:
+        column = table.column(field.name)
+        if pa.types.is_floating(field.type):
+            encodings[field.name] = "BYTE_STREAM_SPLIT"
+        elif pa.types.is_integer(field.type):
+            if len(column) > 1 and column.null_count == 0:
+                diffs = pc.pairwise_diff(column.combine_chunks())
+                if pc.min(diffs.slice(1)).as_py() >= 0:
+                    encodings[field.name] = "DELTA_BINARY_PACKED"
+                    continue
+            dictionary.append(field.name)
+        elif pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+            distinct = pc.count_distinct(column).as_py()
+            if distinct <= max(1, len(column) * max_dictionary_ratio):
+                dictionary.append(field.name)
+    return encodings, dictionary
+
+
+def write_dataset_file(
+    table: pa.Table,
+    root: str,
+    name: str,
+    row_group_size: int | None = 64 * 1024,
+    compression_level: int = 9,
+    max_dictionary_ratio: float = 0.5,
+) -> str:
+    """Write a table into its partition of a hive-partitioned dataset.
+
+    The table and column metadata (including `file_metadata`) is written to the
+    Parquet footer unchanged. Column statistics and the page index are enabled
+    so readers can skip row groups and pages.
+
+    Args:
+        table (pyarrow.Table): A table returned by one of the loaders.
+        root (str): The root directory of the dataset.
+        name (str): The path of the file within its partition, e.g. its name.
+        row_group_size (int | None): The maximum number of rows per row group.
+        compression_level (int): The zstd compression level.
+        max_dictionary_ratio (float): See `column_encodings`.
+
+    Returns:
+        str: The path of the written file.
+    """
+    path = os.path.join(partition_path(root, partition_values(table)), name)
+    encodings, dictionary = column_encodings(table, max_dictionary_ratio)
+    with atomic_path(path) as tmp_path:
+        pq.write_table(
+            table,
+            tmp_path,
+            row_group_size=row_group_size,
+            compression="zstd",
+            compression_level=compression_level,
+            use_dictionary=dictionary,
+            column_encoding=encodings,
+            write_statistics=True,
+            write_page_index=True,
+        )
+    return path
+
+
+def open_dataset(root: str) -> ds.Dataset:
+    """Open a dataset written by `write_dataset_file`.
+
+    The partition schema is given explicitly so that partitions which only
+    contain default (null) values do not break type inference.
+
+    Args:
+        root (str): The root directory of the dataset.
+
+    Returns:
+        pyarrow.dataset.Dataset: The dataset with partition columns.
+    """
+    partitioning = ds.HivePartitioning(
+        PARTITION_SCHEMA, null_fallback=DEFAULT_PARTITION
+    )
+    return ds.dataset(root, format="parquet", partitioning=partitioning)
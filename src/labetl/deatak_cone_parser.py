@@ -1,21 +1,49 @@
-from typing import Any
+from __future__ import annotations
 
-import polars as pl
-import pyarrow as pa
-import pyarrow.parquet as pq
+import io
+from typing import TYPE_CHECKING, Any
 
-from labetl.util import get_hash, set_metadata
+from labetl.lazy import lazy_import
+from labetl.profiling import profiled, stage
+from labetl.util import (
+    add_column_stats,
+    check_backend,
+    get_hash,
+    read_source,
+    set_metadata,
+    source_name,
+)
 
+if TYPE_CHECKING:
+    from labetl.util import Source
 
-def load_cone_data(path: str) -> pa.Table:
+pa = lazy_import("pyarrow")
+pq = lazy_import("pyarrow.parquet")
+pl = lazy_import("polars")
+
+
+def _excel_source(path: str | bytes) -> str | io.BytesIO:
+    """Get a source that `polars.read_excel` accepts for a path or bytes."""
+    return io.BytesIO(path) if isinstance(path, bytes) else path
+
+
+def load_cone_data(path: Source, backend: str = "arrow") -> pa.Table | pl.DataFrame:
     """Load a Cone file and store metadata in the pyarrow table.
 
+    The data is read with Polars, so the "polars" backend returns that frame
+    directly, without the units and metadata.
+
     Args:
-        path (str): The path to the Cone file.
+        path (Source): The path to the Cone file, or its bytes or a binary
+            file object, see `labetl.util.read_source`.
+        backend (str): "arrow" for a pyarrow.Table with metadata, or "polars"
+            for the Polars DataFrame the data was read into.
 
     Returns:
         pyarrow.Table: The table with the data from the Cone file and metadata.
     """
+    check_backend(backend)
+    path = read_source(path)
     mapping = {
         "Stack TC": "stack_temperature",
         "Smoke TC": "smoke_temperature",
@@ -28,15 +56,15 @@ def load_cone_data(path: str) -> pa.Table:
 
     # Read Excel data using Polars
     try:
-        df = pl.read_excel(
-            path, engine="calamine", sheet_id=2, read_options={"skip_rows": 4}
-        )
+        with stage("read_data", path):
+            df = pl.read_excel(
+                _excel_source(path),
+                engine="calamine",
+                sheet_id=2,
+                read_options={"skip_rows": 4},
+            )
     except Exception as e:
-        raise ValueError(f"Error reading Excel file at {path}: {str(e)}")
-
-    # Get units and metadata
-    units = get_cone_units(path)
-    meta = get_cone_metadata(path)
+        raise ValueError(f"Error reading Excel file at {source_name(path)}: {str(e)}")
 
     # Drop 'Names' column if it exists
     if "Names" in df.columns:
@@ -49,7 +77,14 @@ def load_cone_data(path: str) -> pa.Table:
         {col: mapping.get(col, col).lower().replace(" ", "_") for col in df.columns}
     )
 
-    # Convert Polars DataFrame to PyArrow Table
+    if backend == "polars":
+        return df
+
+    # Get units and metadata
+    units = get_cone_units(path)
+    meta = get_cone_metadata(path)
+
+    # Hand the Polars buffers over to a PyArrow Table without copying
     table = df.to_arrow()
 
     # Add metadata to the PyArrow Table
@@ -57,14 +92,15 @@ def load_cone_data(path: str) -> pa.Table:
         table, col_meta=units, tbl_meta={"file_metadata": meta, "type": "Cone"}
     )
 
-    return table_meta
+    return add_column_stats(table_meta)
 
 
-def get_cone_units(path: str) -> dict:
+@profiled("read_units")
+def get_cone_units(path: str | bytes) -> dict:
     """Get the units from a Cone file using Polars.
 
     Args:
-        path (str): The path to the Cone file.
+        path (str | bytes): The path to the Cone file, or its bytes.
 
     Returns:
         dict: A dictionary with the units of the columns.
@@ -83,14 +119,14 @@ def get_cone_units(path: str) -> dict:
     try:
         # Read Excel file using Polars
         units = pl.read_excel(
-            path,
+            _excel_source(path),
             engine="calamine",
             sheet_id=2,
             read_options={"n_rows": 1, "skip_rows": 3},
         )
         units_dict = units.to_dicts()[0]
     except Exception as e:
-        raise ValueError(f"Error reading Excel file at {path}: {str(e)}")
+        raise ValueError(f"Error reading Excel file at {source_name(path)}: {str(e)}")
 
     # Process units dictionary
     if "Names" in units_dict:
@@ -107,11 +143,12 @@ def get_cone_units(path: str) -> dict:
     return units_result
 
 
-def get_cone_metadata(path: str) -> dict:
+@profiled("read_metadata")
+def get_cone_metadata(path: str | bytes) -> dict:
     """Get the metadata from a Cone file.
 
     Args:
-        path (str): The path to the Cone file.
+        path (str | bytes): The path to the Cone file, or its bytes.
 
     Returns:
         dict: A dictionary with the metadata of the file.
@@ -130,10 +167,13 @@ def get_cone_metadata(path: str) -> dict:
     # Read Excel file using Polars
     try:
         meta = pl.read_excel(
-            path, engine="calamine", sheet_id=1, read_options={"header_row": None}
+            _excel_source(path),
+            engine="calamine",
+            sheet_id=1,
+            read_options={"header_row": None},
         )
     except Exception as e:
-        raise ValueError(f"Error reading Excel file at {path}: {str(e)}")
+        raise ValueError(f"Error reading Excel file at {source_name(path)}: {str(e)}")
 
     meta_dict: dict[str, Any] = {}
 
@@ -167,7 +207,7 @@ def get_cone_metadata(path: str) -> dict:
 
     # Add hash to metadata
     meta_dict["file_hash"] = {
-        "file": path.split("/")[-1],
+        "file": source_name(path),
         "method": "BLAKE2b",
         "hash": file_hash,
     }
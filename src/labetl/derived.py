@@ -0,0 +1,248 @@
+"""
+Smoothed derivative channels of STA tables.
+
+The mass-loss rate (DTG) and the derivative of the DSC signal amplify the
+noise of the raw channels when computed as finite differences. Here they are
+computed with a Savitzky–Golay filter instead: a polynomial is fitted by least
+squares to the points in a window around each point, and the derivative of the
+polynomial at the point is taken.
+
+The classic filter is a single convolution, which assumes uniform sampling.
+STA runs are not uniformly sampled (the acquisition rate changes between the
+steps of the temperature program), so the polynomial is fitted to the actual
+time offsets of each window. The fits are vectorized over chunks of windows:
+the windows are strided views of the channels, and the small normal equations
+of all windows of a chunk are solved in one batched `np.linalg.solve` call.
+Points of another segment of the temperature program get no weight, so the
+fits do not smear across the jump in heating rate at a segment boundary, and
+windows shrink at the ends of the run and of each segment.
+"""
+
+import json
+
+import numpy as np
+import pyarrow as pa
+from numpy.lib.stride_tricks import sliding_window_view
+
+from labetl.util import column_stats, set_metadata
+
+DEFAULT_WINDOW = 15
+DEFAULT_ORDER = 2
+
+# Determinant below which the normal equations of a window are singular, e.g.
+# when a window has fewer points than coefficients. Offsets are scaled to
+# [-1, 1], so the determinant does not depend on the units of x.
+SINGULAR = 1e-12
+
+
+def smooth_derivative(
+    x: np.ndarray,
+    ys: list[np.ndarray],
+    window: int = DEFAULT_WINDOW,
+    order: int = DEFAULT_ORDER,
+    segments: np.ndarray | None = None,
+    chunk_size: int = 2**14,
+) -> list[np.ndarray]:
+    """Compute the smoothed first derivatives of channels with respect to x.
+
+    Args:
+        x (numpy.ndarray): The sampling points, e.g. time. They do not need to
+            be uniformly spaced.
+        ys (list[numpy.ndarray]): The channels to differentiate.
+        window (int): The odd number of points of each window.
+        order (int): The order of the fitted polynomials.
+        segments (numpy.ndarray | None): The segment of each point. Windows
+            only use points of the same segment.
+        chunk_size (int): The number of windows fitted at once, which bounds
+            the memory of the intermediate arrays.
+
+    Returns:
+        list[numpy.ndarray]: The derivative of each channel, NaN where a
+            window has too few valid points to fit the polynomial.
+    """
+    if window % 2 == 0 or window <= order:
+        raise ValueError(
+            f"The window must be odd and longer than the order, got {window}"
+        )
+    x = np.asarray(x, dtype=np.float64)
+    ys = [np.asarray(y, dtype=np.float64) for y in ys]
+    n = len(x)
+    half = window // 2
+    if segments is None:
+        segments = np.zeros(n)
+    segments = np.asarray(segments, dtype=np.float64)
+
+    def windows(values: np.ndarray) -> np.ndarray:
+        return sliding_window_view(np.pad(values, half, constant_values=np.nan), window)
+
+    x_windows = windows(x)
+    segment_windows = windows(segments)
+    y_windows = [windows(y) for y in ys]
+    results = [np.full(n, np.nan) for _ in ys]
+    exponents = np.arange(2 * order + 1)
+    hankel = exponents[: order + 1, None] + exponents[None, : order + 1]
+
+    def normal_equations(
+        weight: np.ndarray, powers: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Get the normal equations of each window and whether they are singular."""
+        normal = np.einsum("mw,mwk->mk", weight, powers)[:, hankel]
+        singular = ~(np.abs(np.linalg.det(normal)) > SINGULAR)
+        normal[singular] = np.eye(order + 1)
+        return normal, singular
+
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        offsets = x_windows[start:stop] - x[start:stop, None]
+        valid = (segment_windows[start:stop] == segments[start:stop, None]) & ~np.isnan(
+            offsets
+        )
+        offsets = np.where(valid, offsets, 0.0)
+        scale = np.abs(offsets).max(axis=1)
+        scale[scale == 0] = 1.0
+        offsets /= scale[:, None]
+        powers = np.empty(offsets.shape + exponents.shape)
+        powers[..., 0] = 1.0
+        for k in exponents[1:]:
+            np.multiply(powers[..., k - 1], offsets, out=powers[..., k])
+        shared = None
+        for y_window, result in zip(y_windows, results):
+            values = y_window[start:stop]
+            weight = valid & ~np.isnan(values)
+            rhs = np.einsum(
+                "mw,mwk->mk", np.where(weight, values, 0.0), powers[..., : order + 1]
+            )
+            if np.array_equal(weight, valid):
+                # Channels without NaN share the normal equations of the chunk
+                if shared is None:
+                    shared = normal_equations(valid.astype(np.float64), powers)
+                normal, singular = shared
+            else:
+                normal, singular = normal_equations(weight.astype(np.float64), powers)
+            coefficients = np.linalg.solve(normal, rhs[..., None])[..., 0]
+            coefficients[singular] = np.nan
+            result[start:stop] = coefficients[:, 1] / scale
+    return results
+
+
+def segment_ids(table: pa.Table) -> np.ndarray | None:
+    """Get the segment of the temperature program of each row of an STA table.
+
+    The segments are read from the "segment" column of Proteus exports, or
+    derived from the durations of the steps of the temperature program in the
+    metadata of NGB files.
+
+    Args:
+        table (pyarrow.Table): An STA table.
+
+    Returns:
+        numpy.ndarray | None: The segment of each row, or None if the table
+            has no segment information.
+    """
+    if "segment" in table.column_names:
+        column = table.column("segment").fill_null(-1)
+        return column.to_numpy().astype(np.float64)
+    metadata = (table.schema.metadata or {}).get(b"file_metadata")
+    program = json.loads(metadata).get("temperature_program") if metadata else None
+    if not program or "time" not in table.column_names:
+        return None
+    steps = sorted(program.items(), key=lambda item: int(item[0].rsplit("_", 1)[1]))
+    durations = np.array([step.get("time", 0.0) for _, step in steps])
+    ends = np.cumsum(durations)[durations > 0]
+    # The end of the last step is the end of the run, not a boundary
+    time = table.column("time").to_numpy().astype(np.float64)
+    return np.searchsorted(ends[:-1], time, side="right").astype(np.float64)
+
+
+def _unit(table: pa.Table, name: str) -> str | None:
+    """Get the unit of a column from its metadata."""
+    metadata = table.schema.field(name).metadata or {}
+    unit = metadata.get(b"unit")
+    return unit.decode() if unit and unit != b"null" else None
+
+
+def add_derived(
+    table: pa.Table,
+    window: int = DEFAULT_WINDOW,
+    order: int = DEFAULT_ORDER,
+    min_heating_rate: float = 0.1,
+) -> pa.Table:
+    """Add smoothed derivative channels to an STA table.
+
+    Adds "dtg_smoothed", the derivative of the mass ("mass", or "sample_mass"
+    for NGB files) with respect to time, and "ddsc_smoothed", the derivative
+    of the DSC signal with respect to temperature. The latter is computed as
+    the ratio of the time derivatives of the DSC signal and the temperature,
+    and is NaN where the heating rate is below `min_heating_rate`, e.g. in
+    isothermal segments. Tables of other types are returned unchanged.
+
+    Args:
+        table (pyarrow.Table): The table returned by an STA loader.
+        window (int): The number of points of each window, see
+            `smooth_derivative`.
+        order (int): The order of the fitted polynomials.
+        min_heating_rate (float): The heating rate, in temperature units per
+            time unit, below which d(DSC)/dT is undefined.
+
+    Returns:
+        pyarrow.Table: The table with the derived channels appended. Their
+            units are derived from the units of the source channels, and the
+            filter parameters are stored in the "derived" table metadata.
+    """
+    metadata = table.schema.metadata or {}
+    names = table.column_names
+    if metadata.get(b"type") != b"STA" or "time" not in names:
+        return table
+    mass = next((name for name in ("mass", "sample_mass") if name in names), None)
+    sources = [name for name in (mass, "dsc", "temperature") if name in names]
+    if not sources:
+        return table
+    derivatives = dict(
+        zip(
+            sources,
+            smooth_derivative(
+                table.column("time").to_numpy(),
+                [table.column(name).to_numpy() for name in sources],
+                window,
+                order,
+                segment_ids(table),
+            ),
+        )
+    )
+
+    columns = []
+    time_unit = _unit(table, "time")
+    if mass is not None:
+        columns.append(
+            ("dtg_smoothed", derivatives[mass], _unit(table, mass), time_unit)
+        )
+    if "dsc" in derivatives and "temperature" in derivatives:
+        rate = derivatives["temperature"]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ddsc = np.where(
+                np.abs(rate) >= min_heating_rate, derivatives["dsc"] / rate, np.nan
+            )
+        columns.append(
+            ("ddsc_smoothed", ddsc, _unit(table, "dsc"), _unit(table, "temperature"))
+        )
+
+    for name, values, numerator, denominator in columns:
+        unit = f"{numerator}/{denominator}" if numerator and denominator else None
+        field = pa.field(name, pa.float64(), metadata={"unit": unit} if unit else None)
+        table = table.append_column(field, pa.array(values))
+    # Describe the new channels like the loaders describe theirs, so that the
+    # catalog can prune files on their ranges too
+    names = [name for name, *_ in columns]
+    stats = column_stats(table.select(names))
+    table = set_metadata(
+        table, col_meta={name: {"stats": s} for name, s in stats.items()}
+    )
+    derived = {
+        "method": "savitzky-golay",
+        "window": window,
+        "order": order,
+        "columns": names,
+    }
+    return table.replace_schema_metadata(
+        {**table.schema.metadata, b"derived": json.dumps(derived)}
+    )
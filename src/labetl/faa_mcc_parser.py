@@ -1,23 +1,50 @@
+from __future__ import annotations
+
 import csv
 import json
-
-import pyarrow as pa
-import pyarrow.parquet as pq
-from dateutil.parser import parse
-from pyarrow import csv as pacsv
-
-from labetl.util import detect_encoding, get_hash, set_metadata
-
-
-def load_mcc_data(path: str) -> pa.Table:
+from typing import TYPE_CHECKING
+
+from labetl.lazy import lazy_import
+from labetl.profiling import profiled, stage
+from labetl.util import (
+    add_column_stats,
+    check_backend,
+    detect_encoding,
+    get_hash,
+    input_stream,
+    open_text,
+    read_source,
+    set_metadata,
+    source_name,
+    to_backend,
+)
+
+if TYPE_CHECKING:
+    import polars as pl
+
+    from labetl.util import Source
+
+pa = lazy_import("pyarrow")
+pq = lazy_import("pyarrow.parquet")
+pacsv = lazy_import("pyarrow.csv")
+dateutil_parser = lazy_import("dateutil.parser")
+
+
+def load_mcc_data(path: Source, backend: str = "arrow") -> pa.Table | pl.DataFrame:
     """Load an MCC file into a pyarrow.Table with metadata.
 
     Args:
-        path (str): Path to the MCC file.
+        path (Source): Path to the MCC file, or its bytes or a binary file
+            object, see `labetl.util.read_source`.
+        backend (str): "arrow" for a pyarrow.Table with metadata, or "polars"
+            for a Polars DataFrame sharing its buffers, see `to_backend`.
 
     Returns:
         pyarrow.Table: Table containing data and metadata from the MCC file.
     """
+    check_backend(backend)
+    path = read_source(path)
+
     # Determine file encoding using python-magic
     encoding = detect_encoding(path)
 
@@ -32,7 +59,10 @@ def load_mcc_data(path: str) -> pa.Table:
     parse_opts = pacsv.ParseOptions(delimiter=delimiter)
 
     # Read CSV data into an Arrow Table
-    table = pacsv.read_csv(path, read_options=read_opts, parse_options=parse_opts)
+    with stage("read_data", path):
+        table = pacsv.read_csv(
+            input_stream(path), read_options=read_opts, parse_options=parse_opts
+        )
 
     # Define column metadata
     col_meta = {col: {"unit": unit} for col, unit in zip(cols, units)}
@@ -44,18 +74,20 @@ def load_mcc_data(path: str) -> pa.Table:
     table = set_metadata(
         table, col_meta=col_meta, tbl_meta={"file_metadata": tbl_meta, "type": "MCC"}
     )
+    table = add_column_stats(table)
 
-    return table
+    return to_backend(table, backend)
 
 
+@profiled("read_metadata")
 def get_mcc_metadata(
-    path: str, encoding: str, header_end: int
+    path: str | bytes, encoding: str, header_end: int
 ) -> dict[str, str | float | dict[str, str | float]]:
     """
     Get the metadata of an MCC file.
 
     Args:
-        path (str): The path to the MCC file.
+        path (str | bytes): The path to the MCC file, or its bytes.
         encoding (str): The encoding of the file.
         header_end (int): The index of the last line of the header in the file.
 
@@ -68,7 +100,7 @@ def get_mcc_metadata(
     file_hash = get_hash(path)
 
     # Read file and extract metadata
-    with open(path, "r", encoding=encoding) as file:
+    with open_text(path, encoding) as file:
         lines = file.readlines()
         for i, line in enumerate(lines):
             if i > header_end - 1:
@@ -87,7 +119,7 @@ def get_mcc_metadata(
                     meta_val = float(value)
                 except ValueError:
                     try:
-                        meta_val = {"date": parse(value).isoformat()}
+                        meta_val = {"date": dateutil_parser.parse(value).isoformat()}
                     except ValueError:
                         meta_val = value
 
@@ -123,12 +155,12 @@ def get_mcc_metadata(
                 "combustor_temp": "combustor_temperature",
                 "calibration_file": "temperature_calibration",
             }
-            key = key_mapping.get(key, key)
-            metadata[key.strip(" _")] = meta_val
+            key = key.strip(" _")
+            metadata[key_mapping.get(key, key)] = meta_val
 
     # Add file hash to metadata
     metadata["file_hash"] = {
-        "file": path.split("/")[-1],
+        "file": source_name(path),
         "method": "BLAKE2b",
         "hash": file_hash,
     }
@@ -136,12 +168,13 @@ def get_mcc_metadata(
     return metadata
 
 
-def find_mcc_header(path: str, encoding: str) -> tuple[int, list[str], str]:
+@profiled("find_header")
+def find_mcc_header(path: str | bytes, encoding: str) -> tuple[int, list[str], str]:
     """
     Find the header of the MCC file.
 
     Args:
-        path (str): The path to the MCC file.
+        path (str | bytes): The path to the MCC file, or its bytes.
         encoding (str): The encoding of the file.
 
     Returns:
@@ -149,7 +182,7 @@ def find_mcc_header(path: str, encoding: str) -> tuple[int, list[str], str]:
             the header itself, and the delimiter used in the file.
     """
     try:
-        with open(path, "r", encoding=encoding) as file:
+        with open_text(path, encoding) as file:
             sample = file.read()
             delimiter = csv.Sniffer().sniff(sample).delimiter
             file.seek(0)
@@ -0,0 +1,249 @@
+"""
+Follow STA and MCC text exports while the instrument is still writing them.
+
+Long runs are exported progressively, one line per sample. `FileFollower`
+parses the header once it has been written, remembering the byte offset where
+the data starts, and from then on each `poll` seeks to the end of the last
+complete line it parsed and reads only the bytes appended since. The new rows
+are parsed into a RecordBatch with the column types of the first rows, so a
+poll costs time proportional to the new data, not to the size of the file.
+A line is only parsed once its newline has been written, so a row that is
+being written during a poll is picked up by the next one.
+
+`follow` streams the batches of a file until it stops growing, and
+`follow_to_parquet` writes each of them as a row group of a Parquet file and
+hands it to an optional subscriber, e.g. to update a live dashboard.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Callable, Iterator
+
+from labetl.faa_mcc_parser import find_mcc_header, get_mcc_metadata, split_mcc_header
+from labetl.lazy import lazy_import
+from labetl.netzsch_sta_parser import (
+    find_sta_header,
+    get_sta_metadata,
+    split_sta_header,
+)
+from labetl.util import NamedBytes, atomic_path, detect_encoding, set_metadata
+
+pa = lazy_import("pyarrow")
+pacsv = lazy_import("pyarrow.csv")
+pq = lazy_import("pyarrow.parquet")
+
+# File suffix -> (type, find_header, split_header, get_metadata, number of
+# lines from the line returned by find_header to the first data line)
+FORMATS: dict[str, tuple[str, Callable, Callable, Callable, int]] = {
+    ".csv": ("STA", find_sta_header, split_sta_header, get_sta_metadata, 1),
+    ".txt": ("MCC", find_mcc_header, split_mcc_header, get_mcc_metadata, 2),
+}
+
+# Bytes from the start of the file searched for the header
+HEADER_LIMIT = 2**20
+
+
+class FileFollower:
+    """Incrementally parse the rows appended to a growing STA or MCC export.
+
+    Args:
+        path (str): The path to the STA (.csv) or MCC (.txt) export.
+        header_limit (int): The number of bytes at the start of the file in
+            which the header is searched.
+    """
+
+    def __init__(self, path: str, header_limit: int = HEADER_LIMIT):
+        suffix = os.path.splitext(path)[1].lower()
+        if suffix not in FORMATS:
+            raise ValueError(f"Cannot follow {path}: not an STA or MCC text export")
+        self.path = path
+        self.header_limit = header_limit
+        self.type, self._find_header, self._split_header, self._get_metadata, skip = (
+            FORMATS[suffix]
+        )
+        self._skip = skip
+        # Byte offset of the first line that has not been parsed yet, set once
+        # the header has been read
+        self.offset: int | None = None
+        self.num_rows = 0
+        self.schema: pa.Schema | None = None
+        self._encoding: str | None = None
+        self._delimiter: str | None = None
+        self._columns: list[str] = []
+        self._units: list[str | None] = []
+        self._metadata: dict[str, Any] = {}
+
+    def _read_header(self) -> bool:
+        """Parse the header if it has been written, and set the data offset."""
+        with open(self.path, "rb") as file:
+            head = file.read(self.header_limit)
+        head = head[: head.rfind(b"\n") + 1]
+        if not head:
+            return False
+        encoding = detect_encoding(head)
+        if encoding in ("utf-16le", "utf-16be", "utf-32le", "utf-32be", "binary"):
+            raise ValueError(f"Cannot follow {self.path}: {encoding} encoding")
+        head = NamedBytes(head, self.path)
+        try:
+            i, header, delimiter = self._find_header(head, encoding)
+        except (ValueError, RuntimeError):
+            return False  # the header has not been written yet
+        # The byte offset of the first data line
+        offset = 0
+        for _ in range(i + self._skip):
+            offset = head.find(b"\n", offset) + 1
+            if offset == 0:
+                return False
+        if offset == len(head):
+            # Wait for a data line, without which the delimiter is ambiguous
+            return False
+        self._columns, self._units = self._split_header(header)
+        self._metadata = self._get_metadata(head, encoding, i)
+        # The hash of the export is only known once the run is complete
+        self._metadata["file_hash"]["hash"] = None
+        self._encoding = encoding
+        self._delimiter = delimiter
+        self.offset = offset
+        return True
+
+    def _parse(self, data: bytes) -> pa.RecordBatch:
+        """Parse complete lines with the column names and types of the file."""
+        table = pacsv.read_csv(
+            pa.BufferReader(data),
+            read_options=pacsv.ReadOptions(
+                encoding=self._encoding, column_names=self._columns
+            ),
+            parse_options=pacsv.ParseOptions(delimiter=self._delimiter),
+            convert_options=pacsv.ConvertOptions(
+                column_types=None if self.schema is None else self.schema
+            ),
+        )
+        if self.schema is None:
+            # Columns that are still empty would otherwise be locked to null
+            fields = [
+                field.with_type(pa.float64()) if pa.types.is_null(field.type) else field
+                for field in table.schema
+            ]
+            table = table.cast(pa.schema(fields))
+            col_meta = {
+                col: {"unit": unit} for col, unit in zip(self._columns, self._units)
+            }
+            tbl_meta = {"file_metadata": self._metadata, "type": self.type}
+            self.schema = set_metadata(
+                table.slice(0, 0), col_meta=col_meta, tbl_meta=tbl_meta
+            ).schema
+        return pa.RecordBatch.from_arrays(
+            [column.combine_chunks() for column in table.columns], schema=self.schema
+        )
+
+    def poll(self) -> pa.RecordBatch | None:
+        """Parse the complete lines appended since the last poll.
+
+        Returns:
+            pyarrow.RecordBatch | None: The new rows, with the units and
+                metadata of the file in the schema, or None if there are no
+                new complete lines (or the header is not complete yet).
+
+        Raises:
+            ValueError: If the file shrank, e.g. because it was replaced.
+        """
+        if self.offset is None and not self._read_header():
+            return None
+        with open(self.path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size < self.offset:
+                raise ValueError(f"{self.path} was truncated while following it")
+            file.seek(self.offset)
+            data = file.read(size - self.offset)
+        end = data.rfind(b"\n") + 1
+        if not data[:end].strip():
+            self.offset += end
+            return None
+        batch = self._parse(data[:end])
+        self.offset += end
+        self.num_rows += batch.num_rows
+        return batch
+
+
+def follow(
+    path: str,
+    interval: float = 1.0,
+    idle_timeout: float | None = None,
+    stop: threading.Event | None = None,
+) -> Iterator[pa.RecordBatch]:
+    """Stream the rows appended to an STA or MCC export as they are written.
+
+    Args:
+        path (str): The path to the export.
+        interval (float): Seconds between polls.
+        idle_timeout (float | None): Stop once the file has not grown for this
+            many seconds, e.g. at the end of the run. Follow until `stop` is
+            set if None.
+        stop (threading.Event | None): Set to stop following.
+
+    Yields:
+        pyarrow.RecordBatch: The new rows of each poll that found some, see
+            `FileFollower.poll`.
+    """
+    follower = FileFollower(path)
+    stop = stop or threading.Event()
+    last_change = time.monotonic()
+    while True:
+        batch = follower.poll()
+        now = time.monotonic()
+        if batch is not None:
+            last_change = now
+            yield batch
+        elif idle_timeout is not None and now - last_change >= idle_timeout:
+            return
+        if stop.wait(interval):
+            return
+
+
+def follow_to_parquet(
+    path: str,
+    out: str,
+    interval: float = 1.0,
+    idle_timeout: float | None = None,
+    stop: threading.Event | None = None,
+    on_batch: Callable[[pa.RecordBatch], None] | None = None,
+) -> int:
+    """Follow an export and append each batch of new rows as a row group.
+
+    The Parquet file is written to a temporary name and renamed into place
+    once following stops, see `labetl.util.atomic_path`.
+
+    Args:
+        path (str): The path to the export.
+        out (str): The path of the Parquet file.
+        interval (float): Seconds between polls.
+        idle_timeout (float | None): See `follow`.
+        stop (threading.Event | None): See `follow`.
+        on_batch (Callable | None): Called with each batch, e.g. to stream it
+            to a dashboard.
+
+    Returns:
+        int: The number of rows written.
+    """
+    rows = 0
+    writer = None
+    with atomic_path(out) as tmp_path:
+        try:
+            for batch in follow(path, interval, idle_timeout, stop):
+                if writer is None:
+                    writer = pq.ParquetWriter(
+                        tmp_path, batch.schema, compression="zstd"
+                    )
+                writer.write_batch(batch)
+                rows += batch.num_rows
+                if on_batch is not None:
+                    on_batch(batch)
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is None:
+            raise ValueError(f"No rows were read from {path}")
+    return rows
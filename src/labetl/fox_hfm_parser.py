@@ -1,20 +1,37 @@
+from __future__ import annotations
+
 import re
 from datetime import datetime as dt
 from typing import Any
 
-import numpy as np
-import pyarrow as pa
-import pyarrow.parquet as pq
-
-from labetl.util import detect_encoding, get_hash, set_metadata
-
-
-def load_hfm_data(path):
+from labetl.lazy import lazy_import
+from labetl.profiling import profiled
+from labetl.util import (
+    add_column_stats,
+    check_backend,
+    detect_encoding,
+    get_hash,
+    open_text,
+    read_source,
+    set_metadata,
+    source_name,
+    to_backend,
+)
+
+np = lazy_import("numpy")
+pa = lazy_import("pyarrow")
+pq = lazy_import("pyarrow.parquet")
+
+
+def load_hfm_data(path, backend="arrow"):
+    check_backend(backend)
+    path = read_source(path)
     encoding = detect_encoding(path)
     metadata = get_hfm_metadata(path, encoding)
     data = extract_hfm_data(metadata)
     table = set_metadata(data, tbl_meta={"file_metadata": metadata, "type": "HFM"})
-    return table
+    table = add_column_stats(table)
+    return to_backend(table, backend)
 
 
 def parse_date(line: str) -> str | None:
@@ -33,7 +50,8 @@ def extract_value_and_unit(sub_line: str) -> dict[str, float | str]:
     return {"value": value, "unit": unit}
 
 
-def get_hfm_metadata(path: str, encoding: str = "utf-16le"):
+@profiled("read_metadata")
+def get_hfm_metadata(path: str | bytes, encoding: str = "utf-16le"):
     """Extract metadata from a HFM file."""
     type = "conductivity"  # assume it's thermal conductivity unless we find otherwise
     metadata: dict[str, str | float | dict[str, str | float]] = {}
@@ -41,7 +59,7 @@ def get_hfm_metadata(path: str, encoding: str = "utf-16le"):
     # Get file hash
     hash = get_hash(path)
 
-    with open(path, "r", encoding=encoding) as c:
+    with open_text(path, encoding) as c:
         lines = c.readlines()
 
         for i, line in enumerate(lines):
@@ -397,13 +415,14 @@ def get_hfm_metadata(path: str, encoding: str = "utf-16le"):
                         )
     metadata.update({"type": type})
     metadata["file_hash"] = {
-        "file": path.split("/")[-1],
+        "file": source_name(path),
         "method": "BLAKE2b",
         "hash": hash,
     }
     return metadata
 
 
+@profiled("build_table")
 def extract_hfm_data(meta: dict[Any, Any]) -> pa.Table:
     """Extract HFM data and return it as a PyArrow Table with metadata.
 
@@ -440,10 +459,10 @@ def extract_hfm_data(meta: dict[Any, Any]) -> pa.Table:
             data.append([setpoint, upper_temp, lower_temp, upper_cond, lower_cond])
             units = [upper_temp_unit, lower_temp_unit, upper_cond_unit, lower_cond_unit]
         col_units = {
-            "upper_temperature": {"units": units[0]},
-            "lower_temperature": {"units": units[1]},
-            "upper_thermal_conductivity": {"units": units[2]},
-            "lower_thermal_conductivity": {"units": units[3]},
+            "upper_temperature": {"unit": units[0]},
+            "lower_temperature": {"unit": units[1]},
+            "upper_thermal_conductivity": {"unit": units[2]},
+            "lower_thermal_conductivity": {"unit": units[3]},
         }
     elif meta["type"] == "volumetric_heat_capacity":
         schema = pa.schema(
@@ -462,8 +481,8 @@ def extract_hfm_data(meta: dict[Any, Any]) -> pa.Table:
             data.append([setpoint, average_temp, specific_heat])
             units = [average_temp_unit, specific_heat_unit]
         col_units = {
-            "average_temperature": {"units": units[0]},
-            "volumetric_heat_capacity": {"units": units[1]},
+            "average_temperature": {"unit": units[0]},
+            "volumetric_heat_capacity": {"unit": units[1]},
         }
 
     # Transpose data to match schema
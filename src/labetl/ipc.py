@@ -0,0 +1,75 @@
+"""
+Arrow IPC (Feather v2) output for hot data that is read repeatedly.
+
+Reading a Parquet file decompresses and decodes every page into new buffers.
+An uncompressed Arrow IPC file already holds the column buffers in their
+in-memory layout, so `read_ipc` memory maps it and the returned table points
+into the page cache: loading a run costs no copy, and processes reading the
+same run share its memory. LZ4 or zstd compressed files are smaller on disk
+but their buffers are decompressed on read.
+
+The table and column metadata, including `file_metadata`, is stored in the
+IPC schema unchanged.
+"""
+
+from __future__ import annotations
+
+from labetl.lazy import lazy_import
+from labetl.util import atomic_path
+
+# Imported on first use, as the batch dispatcher only needs the file suffix
+pa = lazy_import("pyarrow")
+ipc = lazy_import("pyarrow.ipc")
+
+IPC_SUFFIX = ".arrow"
+COMPRESSIONS = ("none", "lz4", "zstd")
+
+
+def write_ipc(table: pa.Table, path: str, compression: str = "none") -> str:
+    """Write a table to an Arrow IPC file.
+
+    The file is written to a temporary name and renamed into place.
+
+    Args:
+        table (pyarrow.Table): A table returned by one of the loaders.
+        path (str): The path of the IPC file to write.
+        compression (str): "none" for a file that can be read without copying,
+            or "lz4" or "zstd" to compress the buffers.
+
+    Returns:
+        str: The path of the written file.
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(
+            f"Unknown compression {compression!r}, expected one of {COMPRESSIONS}"
+        )
+    options = ipc.IpcWriteOptions(
+        compression=None if compression == "none" else compression
+    )
+    with atomic_path(path) as tmp_path:
+        with ipc.new_file(tmp_path, table.schema, options=options) as writer:
+            writer.write_table(table)
+    return path
+
+
+def read_ipc(
+    path: str, columns: list[str] | None = None, memory_map: bool = True
+) -> pa.Table:
+    """Read an Arrow IPC file, memory mapped by default.
+
+    Args:
+        path (str): The path of the IPC file.
+        columns (list[str] | None): The columns to read. Defaults to all.
+        memory_map (bool): Whether to memory map the file. The buffers of an
+            uncompressed file then point into the mapping instead of being
+            read into memory, and stay valid as long as the table is alive.
+
+    Returns:
+        pyarrow.Table: The table with its metadata.
+    """
+    source = pa.memory_map(path) if memory_map else pa.OSFile(path)
+    with source, ipc.open_file(source) as reader:
+        table = reader.read_all()
+    if columns is not None:
+        table = table.select(columns)
+    return table
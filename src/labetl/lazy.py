@@ -0,0 +1,49 @@
+"""
+Deferred imports of heavy dependencies.
+
+Most of the import time of `labetl` is spent in its dependencies (pyarrow,
+polars, numpy, python-magic, brukeropus, ...), while a given process usually
+only needs the ones of a single parser. Modules bind their dependencies with
+`lazy_import` instead of a top-level import, so each dependency is imported on
+the first attribute access:
+
+    pl = lazy_import("polars")  # nothing is imported yet
+    pl.DataFrame()  # polars is imported here
+"""
+
+import importlib
+import sys
+import types
+from typing import Any
+
+
+class LazyModule(types.ModuleType):
+    """Placeholder for a module that is imported on first attribute access.
+
+    Resolved attributes are cached on the placeholder, so after the first
+    access of an attribute it costs the same as on the real module.
+    """
+
+    def __getattr__(self, attr: str) -> Any:
+        module = importlib.import_module(self.__name__)
+        value = getattr(module, attr)
+        setattr(self, attr, value)
+        return value
+
+    def __dir__(self) -> list[str]:
+        return dir(importlib.import_module(self.__name__))
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """Get a module that is imported on first attribute access.
+
+    Args:
+        name (str): The absolute name of the module, e.g. "pyarrow.csv".
+
+    Returns:
+        types.ModuleType: The module itself if it is already imported,
+            otherwise a placeholder that imports it when first used.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name)
@@ -0,0 +1,117 @@
+"""
+Registry mapping instrument file types to the loader that parses them.
+"""
+
+from __future__ import annotations
+
+import importlib
+import os
+import re
+from typing import TYPE_CHECKING, Callable
+
+from labetl.cache import get_cache
+from labetl.util import read_source, source_name, to_backend
+
+if TYPE_CHECKING:
+    import polars as pl
+    import pyarrow as pa
+
+    from labetl.util import Source
+
+# File suffix -> (module, function). Loaders are imported on first use so that
+# dispatching a file only pays for the dependencies of its own parser.
+LOADERS: dict[str, tuple[str, str]] = {
+    ".csv": ("labetl.netzsch_sta_parser", "load_sta_data"),
+    ".ngb-ss3": ("labetl.netzsch_sta_ngb_parser", "load_ngb_data"),
+    ".ngb-bs3": ("labetl.netzsch_sta_ngb_parser", "load_ngb_data"),
+    ".txt": ("labetl.faa_mcc_parser", "load_mcc_data"),
+    ".xlsm": ("labetl.deatak_cone_parser", "load_cone_data"),
+    ".tst": ("labetl.fox_hfm_parser", "load_hfm_data"),
+    ".0": ("labetl.bruker_ftir_parser", "load_ftir_data"),
+}
+
+# Bump a parser's version whenever a change affects its output, so that
+# incremental batch runs re-convert the files it has already converted.
+PARSER_VERSIONS: dict[str, int] = {
+    "load_sta_data": 2,
+    "load_ngb_data": 4,
+    "load_mcc_data": 3,
+    "load_cone_data": 2,
+    "load_hfm_data": 3,
+    "load_ftir_data": 2,
+}
+
+# Bruker OPUS files use a numeric extension that increments with each save
+OPUS_SUFFIX = re.compile(r"\.\d+$")
+
+
+def find_loader_name(path: str) -> tuple[str, str] | None:
+    """Find the (module, function) pair of the loader for a file.
+
+    Args:
+        path (str): The path to the instrument file.
+
+    Returns:
+        tuple[str, str] | None: The module and function name of the loader, or
+            None if the file type is not supported.
+    """
+    suffix = os.path.splitext(path)[1].lower()
+    if OPUS_SUFFIX.match(suffix):
+        suffix = ".0"
+    return LOADERS.get(suffix)
+
+
+def parser_version(path: str) -> tuple[str, int] | None:
+    """Get the name and version of the parser for a file.
+
+    Args:
+        path (str): The path to the instrument file.
+
+    Returns:
+        tuple[str, int] | None: The loader function name and its version, or
+            None if the file type is not supported.
+    """
+    name = find_loader_name(path)
+    if name is None:
+        return None
+    return name[1], PARSER_VERSIONS[name[1]]
+
+
+def get_loader(path: str) -> Callable[..., pa.Table]:
+    """Get the loader function for a file based on its extension.
+
+    Args:
+        path (str): The path to the instrument file.
+
+    Returns:
+        Callable[..., pyarrow.Table]: The function that loads the file.
+    """
+    name = find_loader_name(path)
+    if name is None:
+        raise ValueError(f"No loader available for file: {path}")
+    module, function = name
+    return getattr(importlib.import_module(module), function)
+
+
+def load(path: Source, backend: str = "arrow") -> pa.Table | pl.DataFrame:
+    """Load any supported instrument file into a PyArrow table with metadata.
+
+    Args:
+        path (Source): The path to the instrument file, or a binary file object
+            or `labetl.util.NamedBytes` whose name has the file extension.
+        backend (str): "arrow" for a pyarrow.Table with metadata, or "polars"
+            for a Polars DataFrame that shares the buffers of the data.
+
+    Returns:
+        pyarrow.Table | polars.DataFrame: The table with the data and metadata
+            from the file. If a cache is enabled, see `labetl.cache`, tables of
+            paths are served from it and shared between callers.
+    """
+    path = read_source(path)
+    name = source_name(path)
+    if name is None:
+        raise ValueError("Cannot find the loader for bytes without a file name")
+    cache = get_cache()
+    if cache is not None and isinstance(path, str):
+        return to_backend(cache.load(path, get_loader(name)), backend)
+    return get_loader(name)(path, backend=backend)
@@ -0,0 +1,175 @@
+"""
+SQLite manifest of converted files for incremental batch runs.
+"""
+
+import os
+import sqlite3
+from datetime import datetime, timezone
+from typing import Any
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    file_hash TEXT,
+    parser TEXT,
+    parser_version INTEGER,
+    output TEXT,
+    target TEXT,
+    options_hash TEXT,
+    duration REAL,
+    status TEXT NOT NULL,
+    error TEXT,
+    updated_at TEXT NOT NULL
+)
+"""
+
+COLUMNS = (
+    "path",
+    "size",
+    "mtime_ns",
+    "file_hash",
+    "parser",
+    "parser_version",
+    "output",
+    "target",
+    "options_hash",
+    "duration",
+    "status",
+    "error",
+    "updated_at",
+)
+
+
+class Manifest:
+    """Record of every source file a batch run has converted.
+
+    Each source file is keyed by its absolute path, so looking up whether a file
+    changed since its last conversion is a single primary-key query. The
+    database uses write-ahead logging and a busy timeout so that several worker
+    processes can each open their own `Manifest` and record results
+    concurrently.
+
+    Args:
+        path (str): The path to the SQLite database, created if missing.
+        timeout (float): Seconds to wait for a lock held by another writer.
+    """
+
+    def __init__(self, path: str, timeout: float = 60.0):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(SCHEMA)
+        # Add the columns that databases written by older versions lack
+        existing = {
+            row[1] for row in self.connection.execute("PRAGMA table_info(files)")
+        }
+        for column in ("target", "options_hash"):
+            if column not in existing:
+                self.connection.execute(f"ALTER TABLE files ADD COLUMN {column} TEXT")
+
+    def __enter__(self) -> "Manifest":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self.connection.close()
+
+    def get(self, path: str) -> dict[str, Any] | None:
+        """Get the manifest entry of a source file.
+
+        Args:
+            path (str): The path to the source file.
+
+        Returns:
+            dict[str, Any] | None: The entry, or None if the file was never
+                converted.
+        """
+        row = self.connection.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM files WHERE path = ?",
+            (os.path.abspath(path),),
+        ).fetchone()
+        return dict(zip(COLUMNS, row)) if row else None
+
+    def current_entry(
+        self,
+        path: str,
+        size: int,
+        mtime_ns: int,
+        parser: str,
+        parser_version: int,
+        target: str,
+        options_hash: str,
+        retry_failed: bool = False,
+    ) -> dict[str, Any] | None:
+        """Get the manifest entry of a source file if the file can be skipped.
+
+        A file is current if its size and modification time are unchanged since
+        it was last converted, it was converted by the same parser version to
+        the same planned output with the same options, and its output still
+        exists.
+
+        Args:
+            path (str): The path to the source file.
+            size (int): The current size of the file in bytes.
+            mtime_ns (int): The current modification time of the file in ns.
+            parser (str): The name of the parser for the file.
+            parser_version (int): The current version of the parser.
+            target (str): The output path planned for the file.
+            options_hash (str): The hash of the conversion options, see
+                `labetl.batch.options_hash`.
+            retry_failed (bool): Whether files that previously failed to convert
+                are considered out of date.
+
+        Returns:
+            dict[str, Any] | None: The entry if the file does not need to be
+                converted again, otherwise None.
+        """
+        entry = self.get(path)
+        if entry is None:
+            return None
+        if (entry["size"], entry["mtime_ns"]) != (size, mtime_ns):
+            return None
+        if (entry["parser"], entry["parser_version"]) != (parser, parser_version):
+            return None
+        if (entry["target"], entry["options_hash"]) != (
+            os.path.abspath(target),
+            options_hash,
+        ):
+            return None
+        if entry["status"] != "ok":
+            return None if retry_failed else entry
+        if not entry["output"] or not os.path.exists(entry["output"]):
+            return None
+        return entry
+
+    def record(self, entry: dict[str, Any]) -> None:
+        """Insert or replace the manifest entry of a source file.
+
+        Files that were removed before they could be converted have no size
+        and are not recorded, as there is nothing to compare on the next run.
+
+        Args:
+            entry (dict[str, Any]): The entry with the keys in `COLUMNS`.
+                `updated_at` defaults to the current time.
+        """
+        if entry.get("size") is None:
+            return
+        entry = {
+            **entry,
+            "path": os.path.abspath(entry["path"]),
+            "output": entry.get("output") and os.path.abspath(entry["output"]),
+            "target": entry.get("target") and os.path.abspath(entry["target"]),
+            "updated_at": entry.get("updated_at")
+            or datetime.now(timezone.utc).isoformat(),
+        }
+        self.connection.execute(
+            f"INSERT OR REPLACE INTO files ({', '.join(COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(COLUMNS))})",
+            tuple(entry.get(column) for column in COLUMNS),
+        )
@@ -0,0 +1,191 @@
+"""
+Summarize MCC runs into one row of scalar properties per run.
+
+For each run the peak heat release rate (pHRR), the temperature and time of
+the peak, the total heat release (THR, the integral of the HRR over time) and
+the heat release capacity (HRC, the pHRR divided by the heating rate) are
+computed, following ASTM D7309.
+
+Rather than looping over runs, the time, temperature and HRR columns of all
+runs are concatenated into flat arrays. The trapezoids of the integral are
+computed for all rows at once, with those spanning two runs zeroed, and are
+summed per run with `np.add.reduceat`; the peaks are found with
+`np.maximum.reduceat` in the same way.
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterable
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from labetl.catalog import find_parquet_files
+
+COLUMNS = ("time", "temperature", "hrr")
+
+SUMMARY_SCHEMA = pa.schema(
+    [
+        pa.field("run", pa.string()),
+        pa.field("path", pa.string()),
+        pa.field("sample_mass", pa.float64(), metadata={"unit": "mg"}),
+        pa.field("heating_rate", pa.float64(), metadata={"unit": "K/s"}),
+        pa.field("phrr", pa.float64(), metadata={"unit": "W/g"}),
+        pa.field("peak_temperature", pa.float64(), metadata={"unit": "°C"}),
+        pa.field("peak_time", pa.float64(), metadata={"unit": "s"}),
+        pa.field("thr", pa.float64(), metadata={"unit": "kJ/g"}),
+        pa.field("hrc", pa.float64(), metadata={"unit": "J/(g·K)"}),
+        pa.field("heat_release", pa.float64(), metadata={"unit": "J"}),
+        pa.field("num_rows", pa.int64()),
+    ]
+)
+
+
+def _value(meta: dict[str, Any], key: str) -> float | None:
+    """Get a number from the metadata, unwrapping {"value": ..., "unit": ...}."""
+    value = meta.get(key)
+    if isinstance(value, dict):
+        value = value.get("value")
+    return float(value) if isinstance(value, (int, float)) else None
+
+
+def _run_info(table: pa.Table, path: str | None) -> dict[str, Any]:
+    """Get the name, sample mass and nominal heating rate of a run."""
+    metadata = table.schema.metadata or {}
+    meta = json.loads(metadata.get(b"file_metadata", b"{}"))
+    name = (meta.get("file_hash") or {}).get("file") or path or ""
+    heating_rate = _value(meta, "heating_rate")
+    if heating_rate is None and "heating_rate" in table.column_names:
+        heating_rate = float(np.nanmedian(table.column("heating_rate").to_numpy()))
+    return {
+        "run": os.path.splitext(os.path.basename(name))[0],
+        "path": path,
+        "sample_mass": _value(meta, "sample_mass"),
+        "heating_rate": heating_rate,
+    }
+
+
+def _specific_hrr(table: pa.Table, sample_mass: float | None) -> np.ndarray:
+    """Get the HRR of a run in W/g, normalizing by the sample mass if in W."""
+    hrr = table.column("hrr").to_numpy().astype(np.float64)
+    unit = (table.schema.field("hrr").metadata or {}).get(b"unit")
+    if unit == b"W":
+        hrr = hrr / (sample_mass / 1000 if sample_mass else np.nan)
+    elif unit == b"mW":
+        hrr = hrr / (sample_mass if sample_mass else np.nan)
+    return hrr
+
+
+def summarize_mcc(
+    tables: Iterable[pa.Table], paths: Iterable[str | None] | None = None
+) -> pa.Table:
+    """Compute the pHRR, THR and HRC of MCC runs.
+
+    Args:
+        tables (Iterable[pyarrow.Table]): Tables returned by `load_mcc_data`,
+            or read from converted files, with at least the "time",
+            "temperature" and "hrr" columns.
+        paths (Iterable[str | None] | None): The path of each table, stored in
+            the summary.
+
+    Returns:
+        pyarrow.Table: One row per run with the columns of `SUMMARY_SCHEMA`.
+            The HRR is normalized by the "sample_mass" of the metadata (mg)
+            if it is not already specific (W/g), and "heat_release" is the
+            THR of the whole sample.
+    """
+    tables = list(tables)
+    paths = [None] * len(tables) if paths is None else list(paths)
+    infos = [_run_info(table, path) for table, path in zip(tables, paths)]
+    sizes = np.array([table.num_rows for table in tables], dtype=np.int64)
+    rows = {
+        field.name: [info.get(field.name) for info in infos] for field in SUMMARY_SCHEMA
+    }
+    rows["num_rows"] = sizes.tolist()
+
+    # Runs without rows have no peak, and would break the reduceat offsets
+    present = np.flatnonzero(sizes)
+    for name in ("phrr", "peak_temperature", "peak_time", "thr"):
+        rows[name] = [None] * len(tables)
+    if len(present):
+        starts = np.concatenate([[0], np.cumsum(sizes[present])[:-1]])
+        run = np.repeat(np.arange(len(present)), sizes[present])
+        time = np.concatenate(
+            [tables[i].column("time").to_numpy().astype(np.float64) for i in present]
+        )
+        temperature = np.concatenate(
+            [
+                tables[i].column("temperature").to_numpy().astype(np.float64)
+                for i in present
+            ]
+        )
+        hrr = np.concatenate(
+            [_specific_hrr(tables[i], infos[i]["sample_mass"]) for i in present]
+        )
+
+        # Trapezoidal rule over all rows, dropping the trapezoids between runs
+        areas = np.zeros_like(hrr)
+        areas[1:] = 0.5 * (hrr[1:] + hrr[:-1]) * np.diff(time)
+        areas[starts] = 0.0
+        thr = np.add.reduceat(np.nan_to_num(areas), starts) / 1000
+
+        # The first row of each run at the maximum of the run
+        ranked = np.where(np.isnan(hrr), -np.inf, hrr)
+        phrr = np.maximum.reduceat(ranked, starts)
+        peaks = np.flatnonzero(ranked == phrr[run])
+        peaks = peaks[np.unique(run[peaks], return_index=True)[1]]
+        phrr = np.where(np.isfinite(phrr), phrr, np.nan)
+        for name, values in (
+            ("phrr", phrr),
+            ("peak_temperature", temperature[peaks]),
+            ("peak_time", time[peaks]),
+            ("thr", thr),
+        ):
+            column = np.full(len(tables), np.nan)
+            column[present] = values
+            rows[name] = column.tolist()
+
+    phrr = np.array(rows["phrr"], dtype=np.float64)
+    thr = np.array(rows["thr"], dtype=np.float64)
+    heating_rate = np.array(rows["heating_rate"], dtype=np.float64)
+    sample_mass = np.array(rows["sample_mass"], dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rows["hrc"] = (phrr / heating_rate).tolist()
+    rows["heat_release"] = (thr * sample_mass).tolist()
+    return pa.Table.from_pydict(
+        {name: pa.array(values, from_pandas=True) for name, values in rows.items()},
+        schema=SUMMARY_SCHEMA,
+    )
+
+
+def _read_mcc(path: str) -> pa.Table | None:
+    """Read the columns needed for the summary from a converted MCC file."""
+    # Read as a single file, without partitioning from hive directory names
+    file = pq.ParquetFile(path)
+    schema = file.schema_arrow
+    metadata = schema.metadata or {}
+    if metadata.get(b"type") != b"MCC" or not set(COLUMNS) <= set(schema.names):
+        return None
+    columns = [*COLUMNS, *(["heating_rate"] if "heating_rate" in schema.names else [])]
+    return file.read(columns=columns)
+
+
+def summarize_mcc_files(roots: Iterable[str], jobs: int | None = None) -> pa.Table:
+    """Summarize the converted MCC files under the roots.
+
+    Args:
+        roots (Iterable[str]): Parquet files or directories to search, e.g. the
+            output directory of a conversion or a hive-partitioned dataset.
+            Files of other instrument types are skipped.
+        jobs (int | None): The number of threads reading files.
+
+    Returns:
+        pyarrow.Table: See `summarize_mcc`, sorted by path.
+    """
+    paths = sorted(find_parquet_files(roots))
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        tables = list(executor.map(_read_mcc, paths))
+    found = [(path, table) for path, table in zip(paths, tables) if table is not None]
+    return summarize_mcc([table for _, table in found], [path for path, _ in found])
@@ -0,0 +1,176 @@
+"""
+Prometheus metrics of batch and watch runs.
+
+Worker processes do not collect anything themselves: every conversion already
+returns a record to the parent process, and the parent folds those records
+into a `Metrics` instance with `observe`. The hot path in the workers is
+therefore unchanged, and the only lock is taken once per finished file.
+
+The metrics are exposed in the Prometheus text format, either as a file for
+the node exporter's textfile collector or on a local `/metrics` endpoint.
+"""
+
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+from labetl.util import atomic_path
+
+# Upper bounds of the conversion latency histogram in seconds
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HELP = {
+    "labetl_files_total": ("counter", "Files processed by parser and status."),
+    "labetl_bytes_total": ("counter", "Bytes of source files converted by parser."),
+    "labetl_errors_total": (
+        "counter",
+        "Failed conversions by parser and exception type.",
+    ),
+    "labetl_cache_requests_total": (
+        "counter",
+        "Manifest lookups by result; a hit is a file skipped as unchanged.",
+    ),
+    "labetl_conversion_seconds": (
+        "histogram",
+        "Time to load and write one file by parser.",
+    ),
+}
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Metrics:
+    """Counters and latency histograms folded from conversion records.
+
+    Safe to update from the event loop or callback threads while another
+    thread renders the metrics.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[tuple[str, Labels], float] = {}
+        # labels -> (bucket counts, sum, count)
+        self._latency: dict[Labels, tuple[list[int], float, int]] = {}
+
+    def _inc(self, name: str, labels: Labels, value: float = 1) -> None:
+        key = (name, labels)
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, record: dict[str, Any], manifest: bool = False) -> None:
+        """Count a conversion record from `labetl.batch.convert_file`.
+
+        Args:
+            record (dict[str, Any]): The conversion record. Records with the
+                status "skipped" are counted as manifest cache hits.
+            manifest (bool): Whether the file was looked up in a manifest
+                before it was converted, making the conversion a cache miss.
+        """
+        parser = record.get("parser") or "unknown"
+        status = record.get("status", "ok")
+        with self._lock:
+            self._inc("labetl_files_total", (("parser", parser), ("status", status)))
+            if status == "skipped":
+                self._inc("labetl_cache_requests_total", (("result", "hit"),))
+                return
+            if manifest:
+                self._inc("labetl_cache_requests_total", (("result", "miss"),))
+            if status == "error":
+                exception = (record.get("error") or "").partition(":")[0] or "unknown"
+                self._inc(
+                    "labetl_errors_total",
+                    (("parser", parser), ("exception", exception)),
+                )
+            else:
+                self._inc("labetl_bytes_total", (("parser", parser),), record["size"])
+            duration = record.get("duration") or 0.0
+            labels = (("parser", parser),)
+            buckets, total, count = self._latency.get(
+                labels, ([0] * (len(LATENCY_BUCKETS) + 1), 0.0, 0)
+            )
+            buckets[bisect.bisect_left(LATENCY_BUCKETS, duration)] += 1
+            self._latency[labels] = (buckets, total + duration, count + 1)
+
+    def render(self) -> str:
+        """Render the metrics in the Prometheus text exposition format."""
+        with self._lock:
+            counters = dict(self._counters)
+            latency = {k: (list(b), s, c) for k, (b, s, c) in self._latency.items()}
+
+        lines = []
+        for name, (kind, text) in HELP.items():
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "histogram":
+                for labels, (buckets, total, count) in sorted(latency.items()):
+                    cumulative = 0
+                    for bound, n in zip((*LATENCY_BUCKETS, "+Inf"), buckets):
+                        cumulative += n
+                        le = labels + (("le", str(bound)),)
+                        lines.append(f"{name}_bucket{_labels(le)} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {total}")
+                    lines.append(f"{name}_count{_labels(labels)} {count}")
+            else:
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str) -> None:
+        """Atomically write the metrics for the node exporter textfile collector.
+
+        Args:
+            path (str): The `.prom` file to write.
+        """
+        with atomic_path(path) as tmp_path:
+            with open(tmp_path, "w") as f:
+                f.write(self.render())
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Serve the metrics at `/metrics` from a background thread.
+
+        Args:
+            port (int): The port to listen on, 0 for any free port.
+            host (str): The address to bind to.
+
+        Returns:
+            ThreadingHTTPServer: The running server; call `shutdown` to stop it.
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        return server
+
+
+def _labels(labels: Labels) -> str:
+    """Format label pairs, escaping the values as Prometheus requires."""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _escape(value: str) -> str:
+    """Escape backslashes, quotes and newlines in a label value."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    """Format a sample value without a trailing `.0` for integers."""
+    return str(int(value)) if float(value).is_integer() else repr(value)
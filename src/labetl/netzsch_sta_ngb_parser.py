@@ -1,13 +1,29 @@
+from __future__ import annotations
+
+import io
 import zipfile
 import struct
 from datetime import datetime, timezone
-import pyarrow as pa
-import pyarrow.parquet as pq
 import re
 from itertools import tee, zip_longest
-import polars as pl
-from polars.exceptions import ShapeError
-from labetl.util import get_hash, set_metadata
+from typing import TYPE_CHECKING
+from labetl.lazy import lazy_import
+from labetl.profiling import stage
+from labetl.util import (
+    add_column_stats,
+    check_backend,
+    get_hash,
+    read_source,
+    set_metadata,
+    source_name,
+)
+
+if TYPE_CHECKING:
+    from labetl.util import Source
+
+pa = lazy_import("pyarrow")
+pq = lazy_import("pyarrow.parquet")
+pl = lazy_import("polars")
 
 END_FIELD = rb"\x01\x00\x00\x00\x02\x00\x01\x00\x00"
 TYPE_PREFIX = rb"\x17\xfc\xff\xff"
@@ -32,30 +48,62 @@ column_map = {
     "37": "env_accel_y",
     "38": "env_accel_z",
 }
+# The units NETZSCH records the channels in, which the file does not store
+column_units = {
+    "time": "min",
+    "temperature": "°C",
+    "dsc": "µV",
+    "purge_flow": "ml/min",
+    "protective_flow": "ml/min",
+    "sample_mass": "mg",
+    "furnace_temperature": "°C",
+    "env_pressure": "mbar",
+}
 
 
-def load_ngb_data(path: str) -> pa.Table:
+def load_ngb_data(path: Source, backend: str = "arrow") -> pa.Table | pl.DataFrame:
     """Load a STA file and store metadata in the PyArrow table.
 
+    The channels are decoded into a Polars DataFrame, so the "polars" backend
+    returns that frame directly, without the metadata.
+
     Args:
-        path (str): The path to the STA file.
+        path (Source): The path to the STA file, or its bytes or a binary file
+            object, see `labetl.util.read_source`.
+        backend (str): "arrow" for a pyarrow.Table with metadata, or "polars"
+            for the Polars DataFrame the channels were decoded into.
 
     Returns:
         pyarrow.Table: The table with the data from the STA file and metadata.
     """
-    meta, data = get_sta_data(path)
+    check_backend(backend)
+    path = read_source(path)
+    meta, frame = get_sta_data(path)
+    if backend == "polars":
+        return frame
+    # Hand the Polars buffers over to a PyArrow Table without copying
+    data = frame.to_arrow()
     file_hash = get_hash(path)
     meta["file_hash"] = {
-        "file": path.split("/")[-1],
+        "file": source_name(path),
         "method": "BLAKE2b",
         "hash": file_hash,
     }
-    data = set_metadata(data, tbl_meta={"file_metadata": meta, "type": "STA"})
+    col_meta = {
+        col: {"unit": column_units[col]}
+        for col in data.column_names
+        if col in column_units
+    }
+    data = set_metadata(
+        data, col_meta=col_meta, tbl_meta={"file_metadata": meta, "type": "STA"}
+    )
 
-    return data
+    return add_column_stats(data)
 
 
-def get_sta_data(path: str) -> dict[str, str | float | dict[str, str | float]]:
+def get_sta_data(
+    path: str | bytes,
+) -> tuple[dict[str, str | float | dict[str, str | float]], pl.DataFrame]:
     def find_matches(table: bytes, patterns: dict[bytes, str]):
         for field_name, pos in patterns.items():
             category, field = pos
@@ -141,10 +189,25 @@ def get_sta_data(path: str) -> dict[str, str | float | dict[str, str | float]]:
         "material": (rb"\x30\x75", rb"\x62\x09"),
     }
 
-    with zipfile.ZipFile(path, "r") as z:
+    # Channels are collected first and the frame is built once at the end. A
+    # channel is only kept if it has as many values as the first one; the
+    # length of those dropped is recorded in the metadata.
+    columns: dict[str, list[float]] = {}
+    dropped: dict[str, int] = {}
+
+    def add_column(title: str, values: list[float]) -> bool:
+        if columns and len(values) != len(next(iter(columns.values()))):
+            dropped[title] = len(values)
+            return False
+        columns[title] = values
+        dropped.pop(title, None)
+        return True
+
+    archive = io.BytesIO(path) if isinstance(path, bytes) else path
+    with zipfile.ZipFile(archive, "r") as z:
         for file in z.filelist:
             if file.filename == "Streams/stream_1.table":
-                with z.open(file.filename) as stream:
+                with z.open(file.filename) as stream, stage("metadata_scan"):
                     stream_table = stream.read()
 
                     # Split into tables
@@ -205,7 +268,7 @@ def get_sta_data(path: str) -> dict[str, str | float | dict[str, str | float]]:
                                 )
 
             if file.filename == "Streams/stream_2.table":  # Primary data table
-                with z.open(file.filename) as stream:
+                with z.open(file.filename) as stream, stage("data_decode"):
                     stream_table = stream.read()
 
                     # Split into tables
@@ -219,18 +282,12 @@ def get_sta_data(path: str) -> dict[str, str | float | dict[str, str | float]]:
                         stream_table[i:j] for i, j in zip_longest(start, end)
                     ]
                     output = []
-                    output_polars = pl.DataFrame()
                     for table in stream_table:
                         if table[1:2] == b"\x17":  # header
                             title = table[0:1].hex()
                             title = column_map.get(title, title)
                             if len(output) > 1:
-                                try:
-                                    output_polars = output_polars.with_columns(
-                                        pl.Series(name=title, values=output)
-                                    )
-                                except ShapeError:
-                                    print("error")
+                                add_column(title, output)
                             output = []
 
                         if table[1:2] == b"\x75":  # data
@@ -257,7 +314,7 @@ def get_sta_data(path: str) -> dict[str, str | float | dict[str, str | float]]:
                                 output.extend(data_table)
 
             if file.filename == "Streams/stream_3.table":
-                with z.open(file.filename) as stream:
+                with z.open(file.filename) as stream, stage("data_decode"):
                     stream_table = stream.read()
 
                     # Split into tables
@@ -298,14 +355,10 @@ def get_sta_data(path: str) -> dict[str, str | float | dict[str, str | float]]:
                                     for i in range(0, len(data), n)
                                 ]
                                 output.extend(data_table)
-                            try:
-                                output_polars = output_polars.with_columns(
-                                    pl.Series(name=title, values=output)
-                                )
-                            except ShapeError:
-                                pass
-                    output_polars.write_csv("output.csv")
-    return metadata, output_polars.to_arrow()
+                            add_column(title, list(output))
+    if dropped:
+        metadata["dropped_channels"] = dropped
+    return metadata, pl.DataFrame(columns)
 
 
 if __name__ == "__main__":
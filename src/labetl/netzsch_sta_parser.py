@@ -1,13 +1,34 @@
+from __future__ import annotations
+
 import csv
 import json
 import re
+from typing import TYPE_CHECKING
+
+from labetl.lazy import lazy_import
+from labetl.profiling import profiled, stage
+from labetl.util import (
+    add_column_stats,
+    check_backend,
+    detect_encoding,
+    get_hash,
+    input_stream,
+    open_text,
+    read_source,
+    set_metadata,
+    source_name,
+    to_backend,
+)
+
+if TYPE_CHECKING:
+    import polars as pl
 
-import pyarrow as pa
-import pyarrow.parquet as pq
-from dateutil.parser import parse
-from pyarrow import csv as pacsv
+    from labetl.util import Source
 
-from labetl.util import detect_encoding, set_metadata, get_hash
+pa = lazy_import("pyarrow")
+pq = lazy_import("pyarrow.parquet")
+pacsv = lazy_import("pyarrow.csv")
+dateutil_parser = lazy_import("dateutil.parser")
 
 UNITS = (
     "/°C",
@@ -27,15 +48,20 @@ UNITS = (
 )
 
 
-def load_sta_data(path: str) -> pa.Table:
+def load_sta_data(path: Source, backend: str = "arrow") -> pa.Table | pl.DataFrame:
     """Load a STA file and store metadata in the PyArrow table.
 
     Args:
-        path (str): The path to the STA file.
+        path (Source): The path to the STA file, or its bytes or a binary file
+            object, see `labetl.util.read_source`.
+        backend (str): "arrow" for a pyarrow.Table with metadata, or "polars"
+            for a Polars DataFrame sharing its buffers, see `to_backend`.
 
     Returns:
         pyarrow.Table: The table with the data from the STA file and metadata.
     """
+    check_backend(backend)
+    path = read_source(path)
     try:
         # Determine file encoding
         encoding = detect_encoding(path)
@@ -54,7 +80,10 @@ def load_sta_data(path: str) -> pa.Table:
             encoding=encoding, column_names=cols, skip_rows=i + 1
         )
         parse_opts = pacsv.ParseOptions(delimiter=delimiter)
-        data = pacsv.read_csv(path, read_options=read_opts, parse_options=parse_opts)
+        with stage("read_data", path):
+            data = pacsv.read_csv(
+                input_stream(path), read_options=read_opts, parse_options=parse_opts
+            )
 
         # Store units in the column metadata
         col_meta = {col: {"unit": unit} for col, unit in zip(cols, units)}
@@ -64,15 +93,17 @@ def load_sta_data(path: str) -> pa.Table:
 
         # Store metadata in the table
         data_meta = set_metadata(data, col_meta=col_meta, tbl_meta=tbl_meta)
+        data_meta = add_column_stats(data_meta)
 
-        return data_meta
+        return to_backend(data_meta, backend)
 
     except Exception as e:
         raise RuntimeError(f"An error occurred while loading the STA data: {e}")
 
 
+@profiled("read_metadata")
 def get_sta_metadata(
-    path: str, encoding: str, header_end: int
+    path: str | bytes, encoding: str, header_end: int
 ) -> dict[str, str | float | dict[str, str | float]]:
     """
     Get the metadata of a STA file.
@@ -80,7 +111,7 @@ def get_sta_metadata(
     TODO: Need to deal with range. See validation files as well because it has a different format.
 
     Args:
-        path (str): The path to the STA file.
+        path (str | bytes): The path to the STA file, or its bytes.
         encoding (str): The encoding of the file.
         header_end (int): The index of the last line of the header in the file.
 
@@ -92,12 +123,12 @@ def get_sta_metadata(
     # Hash the original file to store in metadata
     file_hash = get_hash(path)
     metadata["file_hash"] = {
-        "file": path.split("/")[-1],
+        "file": source_name(path),
         "method": "BLAKE2b",
         "hash": file_hash,
     }
 
-    with open(path, "r", encoding=encoding) as file:
+    with open_text(path, encoding) as file:
         lines = file.readlines()
         for i, line in enumerate(lines):
             if i > header_end - 1:
@@ -287,15 +318,18 @@ def parse_date(value: str, key: str, fuzzy: bool = False) -> dict[str, str] | st
         dict[str, str] | str: A dictionary with the date value of the metadata.
     """
     if key:
-        return {key: parse(value, fuzzy=fuzzy).isoformat()}
-    return parse(value, fuzzy=fuzzy).isoformat()
+        return {key: dateutil_parser.parse(value, fuzzy=fuzzy).isoformat()}
+    return dateutil_parser.parse(value, fuzzy=fuzzy).isoformat()
 
 
-def find_sta_header(path: str, encoding: str = "utf-8") -> tuple[int, list[str], str]:
+@profiled("find_header")
+def find_sta_header(
+    path: str | bytes, encoding: str = "utf-8"
+) -> tuple[int, list[str], str]:
     """Find the header of the STA file.
 
     Args:
-        path (str): The path to the STA file.
+        path (str | bytes): The path to the STA file, or its bytes.
         encoding (str): The encoding of the file. Default is 'utf-8'.
 
     Returns:
@@ -303,7 +337,7 @@ def find_sta_header(path: str, encoding: str = "utf-8") -> tuple[int, list[str],
                the header itself, and the delimiter used in the file.
     """
     try:
-        with open(path, "r", encoding=encoding) as file:
+        with open_text(path, encoding) as file:
             sample = file.read()
             file.seek(0)
             delimiter = csv.Sniffer().sniff(sample).delimiter
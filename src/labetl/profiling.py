@@ -0,0 +1,208 @@
+"""
+Opt-in timing and memory instrumentation of the stages of each loader.
+
+Loaders wrap their steps in `stage` blocks. Outside of `profile` these are a
+single attribute lookup, so instrumented code runs at full speed unless a
+caller asks for a breakdown:
+
+    with profile(memory=True) as p:
+        table = load(path)
+    p.to_dict()  # {"stages": {"get_hash": {"calls": 1, "wall": ...}, ...}}
+"""
+
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from typing import Any, Callable, Iterable, Iterator, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# The profile collecting stages in the current thread, if any. Thread-local so
+# that concurrent conversions in a thread pool are profiled separately.
+_local = threading.local()
+_DISABLED = nullcontext()
+
+
+class Profile:
+    """Stage timings and memory peaks collected while profiling.
+
+    Each stage name is aggregated over all of its calls with the number of
+    calls, wall time, CPU time of the process, bytes read from disk and the
+    peak traced allocation above the allocation when the stage started.
+
+    Args:
+        memory (bool): Whether to measure peak allocations with `tracemalloc`,
+            which slows down allocation-heavy code considerably.
+    """
+
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.stages: dict[str, dict[str, float]] = {}
+        # Absolute peaks of the stages in progress, so that a nested stage
+        # resetting the tracemalloc peak does not hide it from its parent
+        self._peaks: list[int] = []
+
+    @contextmanager
+    def stage(self, name: str, path: str | bytes | None = None) -> Iterator[None]:
+        """Record a stage, see the module level `stage`."""
+        tracing = self.memory and tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], peak)
+            tracemalloc.reset_peak()
+            self._peaks.append(current)
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            record = self.stages.setdefault(
+                name, {"calls": 0, "wall": 0.0, "cpu": 0.0, "bytes": 0, "peak": 0}
+            )
+            record["calls"] += 1
+            record["wall"] += time.perf_counter() - wall
+            record["cpu"] += time.process_time() - cpu
+            if isinstance(path, bytes):
+                record["bytes"] += len(path)
+            elif path is not None:
+                record["bytes"] += os.path.getsize(path)
+            if tracing:
+                peak = max(tracemalloc.get_traced_memory()[1], self._peaks.pop())
+                record["peak"] = max(record["peak"], peak - current)
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Get the collected stages as a JSON-serializable record."""
+        return {"stages": {name: dict(r) for name, r in self.stages.items()}}
+
+
+def stage(name: str, path: str | bytes | None = None):
+    """Time a named stage of a loader if profiling is enabled in this thread.
+
+    Args:
+        name (str): The name of the stage. Repeated stages are aggregated.
+        path (str | bytes | None): A file the stage reads in full, or its
+            bytes, whose size is counted as the bytes read by the stage.
+
+    Returns:
+        A context manager recording the stage, or a no-op context manager when
+            profiling is disabled.
+    """
+    active = getattr(_local, "profile", None)
+    if active is None:
+        return _DISABLED
+    return active.stage(name, path)
+
+
+def profiled(name: str, reads_path: bool = False) -> Callable[[F], F]:
+    """Decorate a function so that each call is recorded as a stage.
+
+    Args:
+        name (str): The name of the stage.
+        reads_path (bool): Whether the function reads the whole file passed as
+            its first argument, which is then counted as the bytes read.
+
+    Returns:
+        Callable: The decorator.
+    """
+
+    def decorator(func: F) -> F:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            active = getattr(_local, "profile", None)
+            if active is None:
+                return func(*args, **kwargs)
+            with active.stage(name, args[0] if reads_path else None):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+@contextmanager
+def profile(memory: bool = False) -> Iterator[Profile]:
+    """Collect the stages run in the current thread.
+
+    Args:
+        memory (bool): Whether to measure peak allocations. Starts
+            `tracemalloc` for the duration of the block if it is not running.
+
+    Yields:
+        Profile: The profile the stages are recorded in.
+    """
+    result = Profile(memory)
+    previous = getattr(_local, "profile", None)
+    started = memory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    _local.profile = result
+    try:
+        yield result
+    finally:
+        _local.profile = previous
+        if started:
+            tracemalloc.stop()
+
+
+def hot_stages(records: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Aggregate the stages of many profiled files, slowest first.
+
+    Only files converted in this run count: the records of files skipped
+    because of the manifest carry the duration of an earlier run.
+
+    Args:
+        records (Iterable[dict[str, Any]]): Conversion records, each with an
+            optional "profile" entry as returned by `Profile.to_dict`.
+
+    Returns:
+        list[dict[str, Any]]: One entry per stage name with the number of
+            calls, total wall and CPU time, bytes read, the largest peak
+            allocation and the share of the total conversion time.
+    """
+    totals: dict[str, dict[str, Any]] = {}
+    duration = 0.0
+    for record in records:
+        if record.get("status") not in ("ok", "error"):
+            continue
+        duration += record.get("duration") or 0.0
+        stages = (record.get("profile") or {}).get("stages", {})
+        for name, s in stages.items():
+            total = totals.setdefault(
+                name,
+                {
+                    "stage": name,
+                    "calls": 0,
+                    "wall": 0.0,
+                    "cpu": 0.0,
+                    "bytes": 0,
+                    "peak": 0,
+                },
+            )
+            total["calls"] += s["calls"]
+            total["wall"] += s["wall"]
+            total["cpu"] += s["cpu"]
+            total["bytes"] += s["bytes"]
+            total["peak"] = max(total["peak"], s["peak"])
+    for total in totals.values():
+        total["share"] = total["wall"] / duration if duration else 0.0
+    return sorted(totals.values(), key=lambda t: t["wall"], reverse=True)
+
+
+def format_hot_stages(stages: list[dict[str, Any]]) -> str:
+    """Format the output of `hot_stages` as a plain text table."""
+    lines = [
+        f"{'stage':<20} {'calls':>7} {'wall s':>9} {'cpu s':>9} "
+        f"{'share':>6} {'MB read':>9} {'peak MB':>8}"
+    ]
+    for s in stages:
+        lines.append(
+            f"{s['stage']:<20} {s['calls']:>7} {s['wall']:>9.3f} {s['cpu']:>9.3f} "
+            f"{s['share']:>6.1%} {s['bytes'] / 1e6:>9.2f} {s['peak'] / 1e6:>8.2f}"
+        )
+    return "\n".join(lines)
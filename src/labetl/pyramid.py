@@ -0,0 +1,264 @@
+"""
+Downsampled levels of converted tables for fast plotting.
+
+A plot only needs about as many points as it has pixels, but a converted STA
+run can have tens of thousands of rows. Alongside each Parquet file a pyramid
+of coarser levels is written to a sidecar file (`run.parquet` ->
+`_pyramid/run.pyramid`, a Parquet file with one row group per level) and
+`read_pyramid` returns the coarsest level that still has the requested number
+of points in a window. Dataset readers skip paths starting with "_", so the
+sidecars of a hive-partitioned dataset are not read as data.
+
+Each level is downsampled by min/max per bucket: every bucket of `2 * factor`
+rows becomes the two rows holding the minimum and maximum of a key channel
+(`KEY_COLUMNS`), in the order they occur. Whole rows are kept, so the columns
+of a level stay aligned, and the peaks and steps of the key channel are kept
+at every level, unlike decimation, so its curve has the same shape at any
+level.
+"""
+
+import json
+import os
+from typing import Iterable
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from labetl.util import atomic_path
+
+DEFAULT_FACTORS = (4, 16, 64)
+
+# type -> the channel whose extremes each level keeps
+KEY_COLUMNS = {
+    "STA": "dsc",
+    "MCC": "hrr",
+    "Cone": "o2_meter",
+    "FTIR": "absorbance",
+}
+
+
+def pyramid_path(path: str) -> str:
+    """Get the path of the pyramid sidecar of a Parquet file."""
+    folder, name = os.path.split(path)
+    return os.path.join(folder, "_pyramid", os.path.splitext(name)[0] + ".pyramid")
+
+
+def key_column(table: pa.Table) -> str | None:
+    """Get the channel a table is downsampled by.
+
+    Args:
+        table (pyarrow.Table): A table returned by a loader.
+
+    Returns:
+        str | None: The key channel of the `type` of the table in
+            `KEY_COLUMNS`, else its first floating point column, or None if it
+            has none.
+    """
+    table_type = (table.schema.metadata or {}).get(b"type", b"").decode("utf-8")
+    key = KEY_COLUMNS.get(table_type)
+    if key in table.column_names:
+        return key
+    return next((f.name for f in table.schema if pa.types.is_floating(f.type)), None)
+
+
+def downsample(table: pa.Table, factor: int, key: str | None = None) -> pa.Table:
+    """Downsample a table by min/max per bucket.
+
+    The rows are split into buckets of `2 * factor` rows and each bucket is
+    reduced to the rows holding the minimum and maximum of the key column
+    (nulls are ignored), in the order they occur. All columns are taken from
+    those rows. Without a key column, the first and last row of each bucket
+    are kept.
+
+    Args:
+        table (pyarrow.Table): The table to downsample.
+        factor (int): The reduction of the number of rows.
+        key (str | None): The column whose extremes are kept. Defaults to
+            `key_column(table)`.
+
+    Returns:
+        pyarrow.Table: The downsampled table with the same schema.
+    """
+    size = 2 * factor
+    n = table.num_rows
+    buckets = -(-n // size)
+    starts = np.arange(buckets) * size
+    key = key or key_column(table)
+    if key is None or n == 0:
+        ends = np.minimum(starts + size, n) - 1
+        return table.take(np.column_stack([starts, ends]).ravel())
+
+    values = pc.cast(table.column(key), pa.float64()).to_numpy()
+    values = np.pad(values, (0, buckets * size - n), constant_values=np.nan)
+    values = values.reshape(buckets, size)
+    missing = np.isnan(values)
+    # A bucket of nulls, or the padding of the last one, yields its first row
+    lo = np.where(missing, np.inf, values).argmin(axis=1)
+    hi = np.where(missing, -np.inf, values).argmax(axis=1)
+    order = np.column_stack([np.minimum(lo, hi), np.maximum(lo, hi)])
+    return table.take((starts[:, None] + order).ravel())
+
+
+def build_pyramid(
+    table: pa.Table, factors: Iterable[int] = DEFAULT_FACTORS, key: str | None = None
+) -> list[tuple[int, pa.Table]]:
+    """Build the downsampled levels of a table.
+
+    Each level is downsampled from the previous one, so building all levels
+    costs little more than building the finest. Levels that would not reduce
+    the table (fewer rows than two buckets) are skipped.
+
+    Args:
+        table (pyarrow.Table): The full resolution table.
+        factors (Iterable[int]): The reduction of each level relative to the
+            full resolution table, e.g. (4, 16, 64).
+        key (str | None): The column whose extremes are kept, see
+            `downsample`.
+
+    Returns:
+        list[tuple[int, pyarrow.Table]]: The factor and table of each level,
+            from finest to coarsest.
+    """
+    key = key or key_column(table)
+    levels = []
+    level, current = table, 1
+    for factor in sorted(set(factors)):
+        if factor <= current or factor % current:
+            raise ValueError(
+                f"Factors must be increasing multiples of each other: {factors}"
+            )
+        step = factor // current
+        if level.num_rows < 4 * step:
+            break
+        level, current = downsample(level, step, key), factor
+        levels.append((factor, level))
+    return levels
+
+
+def write_pyramid(
+    table: pa.Table,
+    path: str,
+    factors: Iterable[int] = DEFAULT_FACTORS,
+    key: str | None = None,
+) -> str | None:
+    """Write the pyramid sidecar of a converted Parquet file.
+
+    Args:
+        table (pyarrow.Table): The full resolution table.
+        path (str): The path of the Parquet file of the table.
+        factors (Iterable[int]): See `build_pyramid`.
+        key (str | None): See `build_pyramid`.
+
+    Returns:
+        str | None: The path of the sidecar, or None if the table is too small
+            to be downsampled.
+    """
+    key = key or key_column(table)
+    levels = build_pyramid(table, factors, key)
+    if not levels:
+        return None
+    metadata = {
+        **(table.schema.metadata or {}),
+        b"pyramid": json.dumps(
+            {
+                "num_rows": table.num_rows,
+                "key": key,
+                "levels": [
+                    {"factor": factor, "row_group": i, "num_rows": level.num_rows}
+                    for i, (factor, level) in enumerate(levels)
+                ],
+            }
+        ).encode("utf-8"),
+    }
+    schema = table.schema.with_metadata(metadata)
+    sidecar = pyramid_path(path)
+    with atomic_path(sidecar) as tmp_path:
+        with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+            for _, level in levels:
+                writer.write_table(level, row_group_size=level.num_rows)
+    return sidecar
+
+
+def pyramid_levels(path: str) -> list[dict[str, int]]:
+    """Get the factor, row group and number of rows of each pyramid level.
+
+    Args:
+        path (str): The path of a converted Parquet file.
+
+    Returns:
+        list[dict[str, int]]: The levels from finest to coarsest, starting with
+            the full resolution file itself (factor 1, no row group), or just
+            the latter if the file has no pyramid.
+    """
+    num_rows = pq.read_metadata(path).num_rows
+    levels = [{"factor": 1, "row_group": None, "num_rows": num_rows}]
+    sidecar = pyramid_path(path)
+    if os.path.exists(sidecar):
+        metadata = pq.read_schema(sidecar).metadata or {}
+        levels += json.loads(metadata[b"pyramid"])["levels"]
+    return levels
+
+
+def _window(
+    table: pa.Table, column: str, start: float | None, end: float | None
+) -> pa.Table:
+    """Filter a table to the rows with `column` between `start` and `end`."""
+    mask = None
+    if start is not None:
+        mask = pc.greater_equal(table.column(column), start)
+    if end is not None:
+        below = pc.less_equal(table.column(column), end)
+        mask = below if mask is None else pc.and_(mask, below)
+    return table if mask is None else table.filter(mask)
+
+
+def read_pyramid(
+    path: str,
+    budget: int,
+    column: str = "time",
+    start: float | None = None,
+    end: float | None = None,
+    columns: list[str] | None = None,
+) -> pa.Table:
+    """Read the coarsest level of a file with at least `budget` points in a window.
+
+    The number of points of each level in the window is estimated from the
+    coarsest level, so at most two levels are read. If no level has enough
+    points, the full resolution file is read.
+
+    Args:
+        path (str): The path of a converted Parquet file.
+        budget (int): The number of points wanted in the window, e.g. the
+            width of the plot in pixels.
+        column (str): The column the window applies to, e.g. "time" or
+            "temperature".
+        start (float | None): The start of the window, inclusive.
+        end (float | None): The end of the window, inclusive.
+        columns (list[str] | None): The columns to read. Defaults to all.
+
+    Returns:
+        pyarrow.Table: The rows of the level within the window.
+    """
+    if columns is not None and column not in columns:
+        columns = [*columns, column]
+    levels = pyramid_levels(path)
+
+    def read(level: dict[str, int]) -> pa.Table:
+        if level["row_group"] is None:
+            table = pq.read_table(path, columns=columns)
+        else:
+            sidecar = pq.ParquetFile(pyramid_path(path))
+            table = sidecar.read_row_group(level["row_group"], columns=columns)
+        return _window(table, column, start, end)
+
+    coarsest = levels[-1]
+    if coarsest["factor"] == 1:
+        return read(coarsest)
+    table = read(coarsest)
+    for level in reversed(levels):
+        estimate = table.num_rows * coarsest["factor"] / level["factor"]
+        if estimate >= budget:
+            return table if level is coarsest else read(level)
+    return read(levels[0])
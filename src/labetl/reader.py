@@ -0,0 +1,171 @@
+"""
+Read converted files back, decoding the labetl metadata only when it is used.
+
+`read` reads a Parquet file, a directory of them (e.g. a hive-partitioned
+dataset) or an Arrow IPC file, pushing the column selection and the filters
+down to the reader so that only the needed columns, and for Parquet only the
+row groups that can match, are decoded.
+
+The metadata of the table and of its columns is stored as bytes, with
+dictionaries JSON encoded (see `labetl.util.set_metadata`). `metadata` and
+`column_metadata` wrap those bytes in a `LazyMetadata` mapping that decodes a
+value, and parses its JSON, only when the value is accessed, and caches it.
+Scanning many files for their data therefore never pays for decoding their
+metadata, and `units` reads the units of all columns without any JSON.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from collections.abc import Mapping
+from typing import Any, Iterator
+
+from labetl.ipc import IPC_SUFFIX, read_ipc
+from labetl.lazy import lazy_import
+
+pa = lazy_import("pyarrow")
+pc = lazy_import("pyarrow.compute")
+ipc = lazy_import("pyarrow.ipc")
+pq = lazy_import("pyarrow.parquet")
+
+
+def decode_value(value: bytes) -> Any:
+    """Decode a metadata value: JSON for objects, arrays and null, else text."""
+    if value[:1] in (b"{", b"[") or value == b"null":
+        return json.loads(value)
+    return value.decode("utf-8")
+
+
+class LazyMetadata(Mapping):
+    """A read-only mapping that decodes metadata values on first access.
+
+    Args:
+        raw (dict[bytes, bytes] | None): The metadata of a schema or field.
+    """
+
+    def __init__(self, raw: dict[bytes, bytes] | None):
+        self._raw = {key.decode("utf-8"): value for key, value in (raw or {}).items()}
+        self._decoded: dict[str, Any] = {}
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._decoded:
+            self._decoded[key] = decode_value(self._raw[key])
+        return self._decoded[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._raw)
+
+    def __len__(self) -> int:
+        return len(self._raw)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._raw
+
+    def raw(self, key: str) -> bytes:
+        """Get the undecoded bytes of a value."""
+        return self._raw[key]
+
+    def __repr__(self) -> str:
+        return f"LazyMetadata({list(self._raw)})"
+
+
+def _schema(source: pa.Table | pa.Schema) -> pa.Schema:
+    return source if isinstance(source, pa.Schema) else source.schema
+
+
+def metadata(source: pa.Table | pa.Schema) -> LazyMetadata:
+    """Get the table metadata, e.g. "file_metadata" and "type".
+
+    Args:
+        source (pyarrow.Table | pyarrow.Schema): A table returned by a loader
+            or `read`, or its schema, e.g. from `read_schema`.
+
+    Returns:
+        LazyMetadata: The metadata, decoded on access.
+    """
+    return LazyMetadata(_schema(source).metadata)
+
+
+def column_metadata(source: pa.Table | pa.Schema, column: str) -> LazyMetadata:
+    """Get the metadata of a column, e.g. its "unit" and "stats".
+
+    Args:
+        source (pyarrow.Table | pyarrow.Schema): A table or its schema.
+        column (str): The name of the column.
+
+    Returns:
+        LazyMetadata: The metadata, decoded on access.
+    """
+    return LazyMetadata(_schema(source).field(column).metadata)
+
+
+def units(source: pa.Table | pa.Schema) -> dict[str, str | None]:
+    """Get the unit of every column.
+
+    Args:
+        source (pyarrow.Table | pyarrow.Schema): A table or its schema.
+
+    Returns:
+        dict[str, str | None]: The unit of each column, None for columns
+            without one.
+    """
+    result = {}
+    for field in _schema(source):
+        meta = field.metadata or {}
+        # HFM tables converted by older versions store their units under "units"
+        unit = meta.get(b"unit", meta.get(b"units"))
+        result[field.name] = (
+            None if unit is None or unit == b"null" else unit.decode("utf-8")
+        )
+    return result
+
+
+def read_schema(path: str) -> pa.Schema:
+    """Read the schema and metadata of a converted file without its data.
+
+    Args:
+        path (str): The path of a Parquet or Arrow IPC file.
+
+    Returns:
+        pyarrow.Schema: The schema, with the table and column metadata.
+    """
+    if path.endswith(IPC_SUFFIX):
+        with pa.memory_map(path) as source:
+            return ipc.open_file(source).schema
+    return pq.read_schema(path)
+
+
+def read(
+    path: str,
+    columns: list[str] | None = None,
+    filters: list[tuple] | list[list[tuple]] | pc.Expression | None = None,
+) -> pa.Table:
+    """Read a converted file, or a directory of them, back into a table.
+
+    Args:
+        path (str): A Parquet file, a directory of Parquet files (hive
+            partition directories become columns) or an Arrow IPC file.
+        columns (list[str] | None): The columns to read. Defaults to all.
+        filters (list[tuple] | list[list[tuple]] | pyarrow.compute.Expression |
+            None): Rows to keep, as an expression or in the disjunctive normal
+            form of `pyarrow.parquet.read_table`, e.g.
+            `[("temperature", ">", 300)]`. They may refer to columns that are
+            not read.
+
+    Returns:
+        pyarrow.Table: The table, with its metadata undecoded, see `metadata`,
+            `column_metadata` and `units`.
+    """
+    if path.endswith(IPC_SUFFIX):
+        table = read_ipc(path)
+        if filters is not None:
+            if not isinstance(filters, pc.Expression):
+                filters = pq.filters_to_expression(filters)
+            table = table.filter(filters)
+        return table if columns is None else table.select(columns)
+    # Single files are read without inferring partitions from their directories
+    partitioning = "hive" if os.path.isdir(path) else None
+    return pq.read_table(
+        path, columns=columns, filters=filters, partitioning=partitioning
+    )
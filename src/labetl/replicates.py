@@ -0,0 +1,239 @@
+"""
+Aggregate replicate runs into mean, standard deviation and count curves.
+
+Runs are named `<sample>_<conditions>_<date>_R<n>`, e.g.
+`Hyundai_KM8K_Carpet_STA_N2_10K_240711_R3`, so replicates of the same sample
+and test conditions share their name once the date and replicate tokens are
+removed (`Hyundai_KM8K_Carpet_STA_N2_10K`).
+
+Replicates are sampled at different points, so each is interpolated onto a
+common grid of its group before averaging. Rather than looping over groups
+and runs, all runs of all groups are interpolated with a single `np.interp`
+call per column: each run is shifted onto its own interval of the x axis, so
+the concatenated runs form one increasing sequence, and the grids of all runs
+are queried at once as a 2-D stack. The statistics of each group are then
+reduced over its rows of the stack with `np.add.reduceat`.
+"""
+
+import json
+import os
+import re
+from typing import Iterable
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from labetl.loaders import find_loader_name
+
+# A six digit date (YYMMDD) and the replicate number, as separate name tokens
+DATE_TOKEN = re.compile(r"^\d{6}$")
+REPLICATE_TOKEN = re.compile(r"^R(\d+)$", re.IGNORECASE)
+
+
+def parse_run_name(path: str) -> tuple[str, int] | None:
+    """Split the name of a run into its replicate group and replicate number.
+
+    Converted files may keep the extension of their source, as in
+    `run_R1.ngb-ss3.parquet`, which is removed as well.
+
+    Args:
+        path (str): The path or name of a source or converted file.
+
+    Returns:
+        tuple[str, int] | None: The name without its date and replicate tokens
+            and the replicate number, or None if the name has no replicate
+            token.
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    if find_loader_name(name) is not None:
+        name = os.path.splitext(name)[0]
+    tokens = name.split("_")
+    replicate = None
+    group = []
+    for token in tokens:
+        match = REPLICATE_TOKEN.match(token)
+        if match and replicate is None:
+            replicate = int(match.group(1))
+        elif not DATE_TOKEN.match(token):
+            group.append(token)
+    if replicate is None:
+        return None
+    return "_".join(group), replicate
+
+
+def group_replicates(paths: Iterable[str]) -> dict[str, list[str]]:
+    """Group files by replicate group, ordered by replicate number.
+
+    Args:
+        paths (Iterable[str]): The files to group. Files without a replicate
+            token in their name are left out.
+
+    Returns:
+        dict[str, list[str]]: The files of each group, sorted by group name.
+    """
+    groups: dict[str, list[tuple[int, str]]] = {}
+    for path in paths:
+        parsed = parse_run_name(path)
+        if parsed is not None:
+            groups.setdefault(parsed[0], []).append((parsed[1], path))
+    return {group: [p for _, p in sorted(groups[group])] for group in sorted(groups)}
+
+
+def _numeric_columns(tables: list[pa.Table], x: str) -> list[str]:
+    """Get the floating point columns that all tables share, except x."""
+    first = tables[0].schema
+    return [
+        field.name
+        for field in first
+        if field.name != x
+        and pa.types.is_floating(field.type)
+        and all(field.name in table.column_names for table in tables[1:])
+    ]
+
+
+def _sorted_run(table: pa.Table, x: str, columns: list[str]) -> np.ndarray:
+    """Get the x and data columns of a run as rows, sorted by x without NaN x."""
+    data = np.stack(
+        [table.column(name).to_numpy().astype(np.float64) for name in [x, *columns]]
+    )
+    data = data[:, ~np.isnan(data[0])]
+    return data[:, np.argsort(data[0], kind="stable")]
+
+
+def aggregate_replicates(
+    groups: dict[str, list[pa.Table]],
+    x: str = "temperature",
+    columns: list[str] | None = None,
+    points: int = 500,
+) -> pa.Table:
+    """Interpolate the replicates of each group onto a grid and average them.
+
+    The grid of a group spans the union of the x ranges of its replicates,
+    so the count column shows how many replicates cover each point. The x
+    column should increase over a run, e.g. time, or the temperature of a
+    heating ramp; runs are sorted by x before they are interpolated.
+
+    Args:
+        groups (dict[str, list[pyarrow.Table]]): The replicate runs of each
+            group.
+        x (str): The column to interpolate on, e.g. "temperature" or "time".
+        columns (list[str] | None): The columns to aggregate. Defaults to the
+            floating point columns that all runs share.
+        points (int): The number of points of the grid of each group.
+
+    Returns:
+        pyarrow.Table: One row per group and grid point with the columns
+            "group", `x` and `<column>_mean`, `<column>_std` (sample standard
+            deviation, NaN for a single replicate) and `<column>_count` for
+            each column. The units of the first run are kept in the column
+            metadata, and the x column and number of points in the
+            "replicates" table metadata.
+    """
+    names = [name for name, runs in groups.items() if runs]
+    tables = [table for name in names for table in groups[name]]
+    if not tables:
+        raise ValueError("No runs to aggregate")
+    if columns is None:
+        columns = _numeric_columns(tables, x)
+    runs = [_sorted_run(table, x, columns) for table in tables]
+    sizes = np.array([len(groups[name]) for name in names])
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    run_group = np.repeat(np.arange(len(names)), sizes)
+
+    # The grid of each group spans the x range of all its replicates
+    lo = np.array([run[0, 0] if run.shape[1] else np.nan for run in runs])
+    hi = np.array([run[0, -1] if run.shape[1] else np.nan for run in runs])
+    group_lo = np.fmin.reduceat(lo, starts)
+    group_hi = np.fmax.reduceat(hi, starts)
+    steps = np.linspace(0.0, 1.0, points)
+    grids = group_lo[:, None] + (group_hi - group_lo)[:, None] * steps[None, :]
+
+    # Shift each run onto its own interval so all runs form one sequence
+    origin = np.nanmin(lo)
+    span = np.nanmax(hi) - origin + 1.0
+    offsets = np.arange(len(runs)) * span - origin
+    xp = np.concatenate([run[0] + offset for run, offset in zip(runs, offsets)])
+    queries = grids[run_group] + offsets[:, None]
+    outside = (grids[run_group] < lo[:, None]) | (grids[run_group] > hi[:, None])
+    outside |= np.isnan(lo)[:, None]
+
+    arrays = {
+        "group": pa.array(np.repeat(names, points)),
+        x: pa.array(grids.ravel()),
+    }
+    for i, name in enumerate(columns, start=1):
+        fp = np.concatenate([run[i] for run in runs])
+        valid = ~np.isnan(fp)
+        if valid.any():
+            values = np.interp(queries, xp[valid], fp[valid])
+        else:
+            values = np.full(queries.shape, np.nan)
+        values[outside] = np.nan
+        present = ~np.isnan(values)
+        count = np.add.reduceat(present, starts, axis=0)
+        total = np.add.reduceat(np.where(present, values, 0.0), starts, axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total / count
+            deviation = np.where(present, values - mean[run_group], 0.0)
+            squares = np.add.reduceat(deviation**2, starts, axis=0)
+            std = np.sqrt(squares / (count - 1))
+        arrays[f"{name}_mean"] = pa.array(mean.ravel())
+        arrays[f"{name}_std"] = pa.array(std.ravel())
+        arrays[f"{name}_count"] = pa.array(count.ravel().astype(np.int32))
+
+    fields = []
+    first = tables[0].schema
+    for column, array in arrays.items():
+        source = column if column == x else column.rsplit("_", 1)[0]
+        metadata = None
+        if source in first.names and not column.endswith("_count"):
+            metadata = first.field(source).metadata
+        fields.append(pa.field(column, array.type, metadata=metadata))
+    return pa.Table.from_arrays(
+        list(arrays.values()),
+        schema=pa.schema(
+            fields, metadata={"replicates": json.dumps({"x": x, "points": points})}
+        ),
+    )
+
+
+def aggregate_files(
+    paths: Iterable[str],
+    x: str = "temperature",
+    columns: list[str] | None = None,
+    points: int = 500,
+    min_replicates: int = 1,
+) -> pa.Table:
+    """Group converted Parquet files into replicates and aggregate them.
+
+    Args:
+        paths (Iterable[str]): The converted files.
+        x (str): See `aggregate_replicates`.
+        columns (list[str] | None): See `aggregate_replicates`.
+        points (int): See `aggregate_replicates`.
+        min_replicates (int): Leave out groups with fewer replicates.
+
+    Returns:
+        pyarrow.Table: See `aggregate_replicates`. Groups with a run without
+            the x column, e.g. FTIR spectra when aggregating on temperature,
+            are left out. The paths of the runs of each group are stored in
+            the "replicates" table metadata.
+    """
+    groups = {
+        group: files
+        for group, files in group_replicates(paths).items()
+        if len(files) >= min_replicates
+        and all(x in pq.read_schema(path).names for path in files)
+    }
+    read = None if columns is None else [x, *columns]
+    tables = {
+        group: [pq.read_table(path, columns=read) for path in files]
+        for group, files in groups.items()
+    }
+    table = aggregate_replicates(tables, x, columns, points)
+    replicates = json.loads(table.schema.metadata[b"replicates"])
+    replicates["groups"] = groups
+    return table.replace_schema_metadata(
+        {**table.schema.metadata, b"replicates": json.dumps(replicates)}
+    )
@@ -0,0 +1,191 @@
+"""
+Canonical column schemas of each instrument type.
+
+The loaders return the columns found in each file, named after its header and
+typed as inferred by Arrow or Polars, so two files from the same instrument
+can differ in their columns, their order and their types. `conform` maps a
+table onto the canonical schema of its `type` metadata:
+
+- Columns are renamed from their known aliases to their canonical name.
+- Canonical columns are put first and in a fixed order, and those missing from
+  the file are filled with nulls.
+- Each column is cast to the type of its kind. Sensor channels can be stored as
+  float32, which halves their size in memory and on disk, while the time (or
+  wavelength) and temperature channels keep their own precision.
+"""
+
+import pyarrow as pa
+
+# Bump whenever a schema changes, so readers can tell which tables conform to it
+SCHEMA_VERSION = 1
+
+# Kinds of column, which decide the type each column is cast to
+TIME = "time"  # The independent axis: time, or wavelength for FTIR spectra
+TEMPERATURE = "temperature"
+SENSOR = "sensor"
+INTEGER = "integer"
+
+# type -> canonical columns in order as (name, kind, aliases)
+SCHEMAS: dict[str, list[tuple[str, str, tuple[str, ...]]]] = {
+    "STA": [
+        ("time", TIME, ()),
+        ("temperature", TEMPERATURE, ("sample_temperature",)),
+        ("furnace_temperature", TEMPERATURE, ()),
+        ("mass", SENSOR, ("tg",)),
+        ("sample_mass", SENSOR, ()),
+        ("dsc", SENSOR, ("heat_flow",)),
+        ("dtg", SENSOR, ()),
+        ("sensitivity", SENSOR, ()),
+        ("purge_flow", SENSOR, ()),
+        ("protective_flow", SENSOR, ()),
+        ("furnace_power", SENSOR, ()),
+        ("h_foil_temp", TEMPERATURE, ()),
+        ("env_pressure", SENSOR, ()),
+        ("segment", INTEGER, ()),
+    ],
+    "MCC": [
+        ("time", TIME, ()),
+        ("temperature", TEMPERATURE, ("sample_temperature",)),
+        ("hrr", SENSOR, ("heat_release_rate",)),
+        ("heating_rate", SENSOR, ()),
+        ("oxygen", SENSOR, ("o2",)),
+        ("flow_rate", SENSOR, ()),
+        ("n2_flow_rate", SENSOR, ()),
+        ("o2_flow_rate", SENSOR, ()),
+    ],
+    "Cone": [
+        ("time", TIME, ()),
+        ("sample_mass", SENSOR, ("mass",)),
+        ("o2_meter", SENSOR, ()),
+        ("co2_meter", SENSOR, ()),
+        ("co_meter", SENSOR, ()),
+        ("stack_temperature", TEMPERATURE, ()),
+        ("smoke_temperature", TEMPERATURE, ()),
+        ("exhaust_pressure", SENSOR, ()),
+        ("smoke_laser_compensation", SENSOR, ()),
+        ("smoke_laser_measurement", SENSOR, ()),
+        ("extinction_coefficient", SENSOR, ()),
+        ("start_test", INTEGER, ()),
+        ("flame_verification", INTEGER, ()),
+    ],
+    "HFM": [
+        ("setpoint", INTEGER, ()),
+        ("upper_temperature", TEMPERATURE, ()),
+        ("lower_temperature", TEMPERATURE, ()),
+        ("average_temperature", TEMPERATURE, ()),
+        ("upper_thermal_conductivity", SENSOR, ()),
+        ("lower_thermal_conductivity", SENSOR, ()),
+        ("volumetric_heat_capacity", SENSOR, ()),
+    ],
+    "FTIR": [
+        ("wavelength", TIME, ()),
+        ("absorbance", SENSOR, ()),
+        ("transmittance", SENSOR, ()),
+        ("reflectance", SENSOR, ()),
+        ("reference_spectrum", SENSOR, ()),
+        ("sample_spectrum", SENSOR, ()),
+        ("sample_phase", SENSOR, ()),
+        ("reference_phase", SENSOR, ()),
+    ],
+}
+
+PRECISIONS = {"float32": pa.float32(), "float64": pa.float64()}
+
+
+def get_schema(type: str) -> list[tuple[str, str, tuple[str, ...]]]:
+    """Get the canonical columns of an instrument type.
+
+    Args:
+        type (str): The instrument type, e.g. "STA".
+
+    Returns:
+        list[tuple[str, str, tuple[str, ...]]]: The name, kind and aliases of
+            each canonical column, in order.
+    """
+    if type not in SCHEMAS:
+        raise ValueError(f"No schema for type: {type!r}")
+    return SCHEMAS[type]
+
+
+def _precision(precision: str) -> pa.DataType:
+    """Get the floating point type of a precision name."""
+    if precision not in PRECISIONS:
+        raise ValueError(
+            f"Unknown precision {precision!r}, expected one of {list(PRECISIONS)}"
+        )
+    return PRECISIONS[precision]
+
+
+def conform(
+    table: pa.Table,
+    precision: str = "float64",
+    time_precision: str = "float64",
+    temperature_precision: str = "float64",
+    drop_extra: bool = False,
+    type: str | None = None,
+) -> pa.Table:
+    """Conform a table to the canonical schema of its instrument type.
+
+    The column metadata (e.g. units) and table metadata are kept, and the
+    schema version is stored under the "schema_version" table metadata key.
+
+    Args:
+        table (pyarrow.Table): A table returned by one of the loaders.
+        precision (str): The type of the sensor channels, "float64" or
+            "float32".
+        time_precision (str): The type of the time (or wavelength) channel.
+        temperature_precision (str): The type of the temperature channels.
+        drop_extra (bool): Whether to drop the columns that are not part of
+            the schema. By default they are kept after the canonical columns,
+            with floating point columns stored at the sensor precision.
+        type (str | None): The instrument type. Defaults to the "type" table
+            metadata set by the loader.
+
+    Returns:
+        pyarrow.Table: The conformed table.
+    """
+    metadata = table.schema.metadata or {}
+    if type is None:
+        type = metadata.get(b"type", b"").decode("utf-8")
+    types = {
+        TIME: _precision(time_precision),
+        TEMPERATURE: _precision(temperature_precision),
+        SENSOR: _precision(precision),
+        INTEGER: pa.int64(),
+    }
+
+    # Source column of each canonical column, preferring the canonical name
+    schema = get_schema(type)
+    sources: dict[str, str] = {}
+    for name, _, aliases in schema:
+        for source in (name, *aliases):
+            if source in table.column_names:
+                sources[name] = source
+                break
+
+    fields = []
+    columns = []
+    for name, kind, _ in schema:
+        dtype = types[kind]
+        if name in sources:
+            field = table.field(sources[name])
+            columns.append(table.column(sources[name]).cast(dtype))
+            fields.append(pa.field(name, dtype, metadata=field.metadata))
+        else:
+            columns.append(pa.nulls(table.num_rows, dtype))
+            fields.append(pa.field(name, dtype))
+
+    if not drop_extra:
+        used = set(sources.values())
+        for field in table.schema:
+            if field.name in used:
+                continue
+            column = table.column(field.name)
+            if pa.types.is_floating(field.type):
+                column = column.cast(types[SENSOR])
+                field = field.with_type(types[SENSOR])
+            columns.append(column)
+            fields.append(field)
+
+    metadata = {**metadata, b"schema_version": str(SCHEMA_VERSION).encode("utf-8")}
+    return pa.Table.from_arrays(columns, schema=pa.schema(fields, metadata=metadata))
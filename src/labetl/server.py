@@ -0,0 +1,372 @@
+"""
+A small HTTP service converting uploaded instrument files to Parquet or Arrow.
+
+Lab PCs without the Python stack can convert files with any HTTP client:
+
+    curl --data-binary @run.csv "http://host:8080/convert?filename=run.csv"
+
+The request body is the instrument file. The loader is chosen from the
+extension of the `filename` query parameter, or, without one, from the
+contents of the file (see `detect_suffix`). The response is the table as
+Parquet (`format=parquet`, the default) or as an Arrow IPC file
+(`format=arrow`), with the metadata of the loader.
+
+The server runs on an asyncio event loop, which only reads requests and
+writes responses; parsing and serialization run in a bounded process pool,
+so CPU-heavy files such as NGB never block the loop or each other. At most
+`max_pending` conversions are queued or running at once: further uploads
+are answered with 503 and a Retry-After header rather than piling up in
+memory. Responses are written in chunks, waiting for the client to drain
+each one.
+
+`GET /health` returns the number of conversions in progress as JSON.
+If a worker dies, for instance killed for running out of memory, the pool
+is replaced and the conversions it was running are answered with 503.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+from urllib.parse import parse_qs, quote, urlsplit
+
+from labetl.lazy import lazy_import
+from labetl.loaders import find_loader_name
+from labetl.util import NamedBytes
+
+pa = lazy_import("pyarrow")
+pq = lazy_import("pyarrow.parquet")
+ipc = lazy_import("pyarrow.ipc")
+
+FORMATS = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+
+# Size of the pieces the response body is written in
+CHUNK_SIZE = 1 << 20
+
+
+def detect_suffix(data: bytes) -> str | None:
+    """Guess the file extension of an instrument file from its contents.
+
+    Args:
+        data (bytes): The contents of the file.
+
+    Returns:
+        str | None: An extension with a loader, or None if the contents are
+            not recognized.
+    """
+    if data.startswith(b"\n\n\xfe\xfe"):
+        return ".0"
+    if data.startswith(b"PK\x03\x04"):
+        if b"Streams/stream_1.table" in data:
+            return ".ngb-ss3"
+        if b"xl/" in data:
+            return ".xlsm"
+        return None
+    if "Wintherm".encode("utf-16-le") in data[:4096]:
+        return ".tst"
+    head = data[:65536]
+    if b"\n##" in head or head.startswith(b"##"):
+        return ".csv"
+    if b"\n*\r\n" in head or b"\n*\n" in head:
+        return ".txt"
+    return None
+
+
+def content_disposition(filename: str) -> str:
+    """Build the Content-Disposition header of a download.
+
+    Control characters, quotes and backslashes are dropped, so that an
+    uploaded file name cannot end the header or inject others. Names that are
+    not ASCII get an ASCII fallback and their UTF-8 form (RFC 6266).
+
+    Args:
+        filename (str): The name to save the download as.
+
+    Returns:
+        str: The value of the header.
+    """
+    name = "".join(c for c in filename if c.isprintable() and c not in '"\\')
+    fallback = "".join(c if c.isascii() else "_" for c in name)
+    header = f'attachment; filename="{fallback}"'
+    if fallback != name:
+        header += f"; filename*=UTF-8''{quote(name, safe='')}"
+    return header
+
+
+def convert_bytes(
+    data: bytes, name: str, output_format: str = "parquet", compression: str = "zstd"
+) -> bytes:
+    """Load an instrument file from its bytes and serialize the table.
+
+    Runs in the worker processes of the server.
+
+    Args:
+        data (bytes): The contents of the instrument file.
+        name (str): The file name, whose extension selects the loader.
+        output_format (str): "parquet" or "arrow" (an IPC file).
+        compression (str): The compression codec of the output, or "none".
+
+    Returns:
+        bytes: The serialized table.
+    """
+    from labetl.loaders import load
+
+    table = load(NamedBytes(data, name))
+    sink = pa.BufferOutputStream()
+    codec = None if compression == "none" else compression
+    if output_format == "arrow":
+        options = ipc.IpcWriteOptions(compression=codec)
+        with ipc.new_file(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+    else:
+        pq.write_table(table, sink, compression=codec or "none")
+    return sink.getvalue().to_pybytes()
+
+
+class HTTPError(Exception):
+    """An error answered with an HTTP status and a JSON body."""
+
+    def __init__(
+        self, status: HTTPStatus, message: str, headers: dict[str, str] | None = None
+    ):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class ConversionServer:
+    """Serve conversions of uploaded files from a bounded process pool.
+
+    Args:
+        host (str): The address to listen on.
+        port (int): The port to listen on, or 0 for any free port.
+        jobs (int | None): The number of worker processes. Defaults to the
+            number of CPUs.
+        max_pending (int | None): The number of conversions that may be queued
+            or running at once. Defaults to twice the number of workers.
+        max_upload (int): The largest accepted upload in bytes.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        jobs: int | None = None,
+        max_pending: int | None = None,
+        max_upload: int = 1 << 30,
+    ):
+        self.host = host
+        self.port = port
+        self.jobs = jobs or os.cpu_count() or 1
+        self.max_pending = 2 * self.jobs if max_pending is None else max_pending
+        self.max_upload = max_upload
+        self.pending = 0
+        self._executor: ProcessPoolExecutor | None = None
+        self._server: asyncio.Server | None = None
+
+    async def start(self) -> int:
+        """Start the worker pool and listen for requests.
+
+        Returns:
+            int: The port the server listens on.
+        """
+        self._executor = ProcessPoolExecutor(max_workers=self.jobs)
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def close(self) -> None:
+        """Stop listening, and shut the worker pool down."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._executor is not None:
+            await asyncio.to_thread(self._executor.shutdown, cancel_futures=True)
+
+    async def run(self) -> None:
+        """Serve requests until the task is cancelled."""
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Answer one request, then close the connection."""
+        try:
+            try:
+                status, body, headers = await self._dispatch(reader)
+            except HTTPError as e:
+                status, headers = e.status, e.headers
+                body = json.dumps({"error": str(e)}).encode()
+                headers.setdefault("Content-Type", "application/json")
+            except (ConnectionError, asyncio.IncompleteReadError):
+                raise
+            except Exception as e:
+                status, headers = (
+                    HTTPStatus.INTERNAL_SERVER_ERROR,
+                    {"Content-Type": "application/json"},
+                )
+                body = json.dumps({"error": f"{type(e).__name__}: {e}"}).encode()
+            await self._respond(writer, status, body, headers)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # the client went away
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _dispatch(
+        self, reader: asyncio.StreamReader
+    ) -> tuple[HTTPStatus, bytes, dict[str, str]]:
+        """Read a request and compute the status, body and headers to send."""
+        request_line = await reader.readline()
+        try:
+            method, target, _ = request_line.decode("latin-1").split()
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        if url.path == "/health" and method == "GET":
+            health = {"pending": self.pending, "max_pending": self.max_pending}
+            return (
+                HTTPStatus.OK,
+                json.dumps(health).encode(),
+                {"Content-Type": "application/json"},
+            )
+        if url.path != "/convert":
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No such endpoint: {url.path}")
+        if method != "POST":
+            raise HTTPError(
+                HTTPStatus.METHOD_NOT_ALLOWED,
+                "Upload the file with POST",
+                {"Allow": "POST"},
+            )
+        return await self._convert(reader, headers, query)
+
+    async def _convert(
+        self,
+        reader: asyncio.StreamReader,
+        headers: dict[str, str],
+        query: dict[str, str],
+    ) -> tuple[HTTPStatus, bytes, dict[str, str]]:
+        """Read an upload and convert it in the worker pool."""
+        output_format = query.get("format", "parquet")
+        if output_format not in FORMATS:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Unknown format: {output_format}")
+        compression = query.get("compression", "zstd")
+        try:
+            length = int(headers["content-length"])
+        except (KeyError, ValueError):
+            raise HTTPError(HTTPStatus.LENGTH_REQUIRED, "Content-Length is required")
+        if length > self.max_upload:
+            raise HTTPError(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                f"Uploads are limited to {self.max_upload} bytes",
+            )
+        if self.pending >= self.max_pending:
+            # Read the upload without keeping it, or closing the connection
+            # would reset it before the client reads the answer
+            await self._discard(reader, length)
+            raise HTTPError(
+                HTTPStatus.SERVICE_UNAVAILABLE,
+                "Too many conversions in progress",
+                {"Retry-After": "1"},
+            )
+
+        # Count the upload from now on, so that slow uploads hold their slot
+        self.pending += 1
+        try:
+            data = await reader.readexactly(length)
+            name = os.path.basename(query.get("filename", ""))
+            if not name or find_loader_name(name) is None:
+                suffix = detect_suffix(data)
+                if suffix is None:
+                    raise HTTPError(
+                        HTTPStatus.UNSUPPORTED_MEDIA_TYPE,
+                        "Unknown file type; pass its name as ?filename=",
+                    )
+                name = os.path.splitext(name or "upload")[0] + suffix
+            loop = asyncio.get_running_loop()
+            executor = self._executor
+            try:
+                body = await loop.run_in_executor(
+                    executor,
+                    convert_bytes,
+                    data,
+                    name,
+                    output_format,
+                    compression,
+                )
+            except BrokenProcessPool:
+                # A worker died, which leaves the pool unusable: replace it
+                # once, for all the conversions it failed
+                if self._executor is executor:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self._executor = ProcessPoolExecutor(max_workers=self.jobs)
+                raise HTTPError(
+                    HTTPStatus.SERVICE_UNAVAILABLE,
+                    "A worker process died during the conversion",
+                    {"Retry-After": "1"},
+                )
+            except Exception as e:
+                raise HTTPError(
+                    HTTPStatus.UNPROCESSABLE_ENTITY, f"{type(e).__name__}: {e}"
+                )
+        finally:
+            self.pending -= 1
+        stem = os.path.splitext(name)[0]
+        extension = "parquet" if output_format == "parquet" else "arrow"
+        return (
+            HTTPStatus.OK,
+            body,
+            {
+                "Content-Type": FORMATS[output_format],
+                "Content-Disposition": content_disposition(f"{stem}.{extension}"),
+            },
+        )
+
+    async def _discard(self, reader: asyncio.StreamReader, length: int) -> None:
+        """Read and drop a request body in chunks."""
+        while length > 0:
+            chunk = await reader.read(min(length, CHUNK_SIZE))
+            if not chunk:
+                break
+            length -= len(chunk)
+
+    async def _respond(
+        self,
+        writer: asyncio.StreamWriter,
+        status: HTTPStatus,
+        body: bytes,
+        headers: dict[str, str],
+    ) -> None:
+        """Write a response, waiting for the client to drain each chunk."""
+        lines = [f"HTTP/1.1 {status.value} {status.phrase}"]
+        headers = {**headers, "Content-Length": str(len(body)), "Connection": "close"}
+        lines.extend(f"{key}: {value}" for key, value in headers.items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        view = memoryview(body)
+        for start in range(0, len(view), CHUNK_SIZE):
+            writer.write(view[start : start + CHUNK_SIZE])
+            await writer.drain()
+        await writer.drain()
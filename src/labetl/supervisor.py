@@ -0,0 +1,236 @@
+"""
+Fault-isolated conversion with per-file timeouts, memory caps and quarantine.
+
+In the default batch mode a file that hangs a loader (e.g. a regular
+expression backtracking on a malformed NGB stream) or exhausts the memory of
+the machine stalls or kills the whole run. In supervised mode each file is
+converted by a worker process that the supervisor can kill:
+
+- The worker converts one file at a time and is reused across files, so the
+  imports of the parsers are only paid once per worker.
+- If a file is not converted within `timeout` seconds the worker is killed
+  and replaced, and the file is recorded as failed with a "timeout" error.
+- The address space of the worker is capped at `memory_limit` bytes, so a
+  runaway allocation fails with a MemoryError in the worker (or kills it)
+  instead of swapping the machine.
+
+Files that fail can be moved or symlinked to a quarantine folder, next to a
+JSON file with their conversion record, so they can be inspected and are not
+retried by every run.
+"""
+
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from multiprocessing.connection import Connection
+from typing import Any, Iterator
+
+from labetl.batch import _open_manifest, convert_file, new_record, set_error
+
+QUARANTINE_MODES = ("symlink", "move")
+
+
+def _serve(conn: Connection, memory_limit: int | None, options: dict[str, Any]):
+    """Convert the files received on a pipe until None is received."""
+    if memory_limit is not None:
+        import resource
+
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    conn.send("ready")
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        conn.send(convert_file(*task, **options))
+
+
+class SupervisedWorker:
+    """A worker process that converts one file at a time under supervision.
+
+    The process is started on first use and restarted after it was killed
+    because of a timeout or died, e.g. after hitting the memory cap.
+
+    Args:
+        options (dict[str, Any]): Keyword arguments of `convert_file`.
+        timeout (float | None): Seconds after which a conversion is aborted.
+        memory_limit (int | None): The maximum address space of the worker
+            process in bytes.
+    """
+
+    def __init__(
+        self,
+        options: dict[str, Any],
+        timeout: float | None = None,
+        memory_limit: int | None = None,
+    ):
+        self.options = options
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self._context = multiprocessing.get_context("spawn")
+        self._process: Any = None
+        self._conn: Connection | None = None
+
+    def _start(self) -> Connection:
+        """Start the worker process if it is not running.
+
+        Raises:
+            EOFError: If the worker died before it was ready.
+        """
+        if self._process is None or not self._process.is_alive():
+            self._conn, child = self._context.Pipe()
+            self._process = self._context.Process(
+                target=_serve,
+                args=(child, self.memory_limit, self.options),
+                daemon=True,
+            )
+            self._process.start()
+            child.close()
+            # Wait until the worker is up, so its startup does not count
+            # towards the timeout of the first file
+            self._conn.recv()
+        return self._conn  # type: ignore[return-value]
+
+    def _kill(self) -> int | None:
+        """Kill the worker process and get its exit code."""
+        self._process.kill()
+        self._process.join()
+        self._conn.close()  # type: ignore[union-attr]
+        exitcode = self._process.exitcode
+        self._process = self._conn = None
+        return exitcode
+
+    def convert(self, path: str, output: str) -> dict[str, Any]:
+        """Convert a file in the worker process, see `convert_file`.
+
+        Returns:
+            dict[str, Any]: The conversion record. If the worker timed out or
+                died, the record is marked as failed by the supervisor.
+        """
+        start = time.perf_counter()
+        try:
+            # The worker may also die while it starts, e.g. on hitting the
+            # memory cap during its imports
+            conn = self._start()
+            conn.send((path, output))
+            # Also true if the worker died, in which case recv raises EOFError
+            finished = conn.poll(self.timeout)
+            if finished:
+                return conn.recv()
+        except (EOFError, OSError):
+            finished = True
+        exitcode = self._kill()
+        record = new_record(path, output, self.options)
+        if finished:
+            set_error(
+                record,
+                "crashed",
+                ChildProcessError(f"Worker died with exit code {exitcode}"),
+                exitcode=exitcode,
+            )
+        else:
+            set_error(
+                record,
+                "timeout",
+                TimeoutError(f"Conversion did not finish within {self.timeout} s"),
+                timeout=self.timeout,
+            )
+        record["duration"] = time.perf_counter() - start
+        if self.options.get("manifest") is not None:
+            _open_manifest(self.options["manifest"]).record(record)
+        return record
+
+    def close(self) -> None:
+        """Stop the worker process."""
+        if self._process is None:
+            return
+        try:
+            self._conn.send(None)  # type: ignore[union-attr]
+            self._process.join(5)
+        except OSError:
+            pass
+        if self._process.is_alive():
+            self._kill()
+        self._process = self._conn = None
+
+
+def convert_supervised(
+    tasks: list[tuple[str, str]],
+    options: dict[str, Any],
+    jobs: int,
+    timeout: float | None = None,
+    memory_limit: int | None = None,
+) -> Iterator[dict[str, Any]]:
+    """Convert files in supervised worker processes.
+
+    Args:
+        tasks (list[tuple[str, str]]): Pairs of source path and output path.
+        options (dict[str, Any]): Keyword arguments of `convert_file`.
+        jobs (int): The number of worker processes.
+        timeout (float | None): Seconds after which a conversion is aborted.
+        memory_limit (int | None): The maximum address space of each worker
+            process in bytes.
+
+    Yields:
+        dict[str, Any]: The conversion record of each file, in the order the
+            conversions finish.
+    """
+    workers: queue.Queue[SupervisedWorker] = queue.Queue()
+    for _ in range(jobs):
+        workers.put(SupervisedWorker(options, timeout, memory_limit))
+
+    def convert(path: str, output: str) -> dict[str, Any]:
+        worker = workers.get()
+        try:
+            return worker.convert(path, output)
+        finally:
+            workers.put(worker)
+
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(convert, *task) for task in tasks]
+            for future in as_completed(futures):
+                yield future.result()
+    finally:
+        while not workers.empty():
+            workers.get().close()
+
+
+def quarantine_file(
+    record: dict[str, Any], folder: str, subdir: str = "", mode: str = "symlink"
+) -> str:
+    """Move or symlink a failed source file to a quarantine folder.
+
+    The conversion record of the file is written next to it, to the same path
+    with ".error.json" appended.
+
+    Args:
+        record (dict[str, Any]): The conversion record of the file.
+        folder (str): The quarantine folder.
+        subdir (str): The subdirectory of the quarantine folder to put the file
+            in, e.g. to mirror the directory structure of the sources.
+        mode (str): "symlink" to link to the file where it is, or "move" to
+            move it out of the sources.
+
+    Returns:
+        str: The path of the file in the quarantine folder.
+    """
+    if mode not in QUARANTINE_MODES:
+        raise ValueError(
+            f"Unknown quarantine mode {mode!r}, expected one of {QUARANTINE_MODES}"
+        )
+    path = record["path"]
+    target = os.path.normpath(os.path.join(folder, subdir, os.path.basename(path)))
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if os.path.lexists(target):
+        os.remove(target)
+    if mode == "move":
+        shutil.move(path, target)
+    else:
+        os.symlink(os.path.abspath(path), target)
+    with open(target + ".error.json", "w") as f:
+        json.dump({**record, "quarantine": target}, f, indent=2, default=str)
+    return target
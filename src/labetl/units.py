@@ -0,0 +1,413 @@
+"""
+Unit normalization of loaded tables.
+
+The loaders keep the units of the instrument files, so the same quantity comes
+in different units from different instruments: STA exports time in min and
+MCC in s, STA heat flow is in mW/mg and the MCC heat release rate in W/g.
+`normalize_units` rewrites every column with a known unit to the unit of its
+dimension in a unit system, e.g. SI, and updates the "unit" and "stats"
+metadata of the column to match.
+
+Units are resolved from one registry, `UNITS`, which gives the dimension of
+each unit and the scale and offset to the base unit of that dimension.
+Compound units such as "mW/mg" or "°C/s" are resolved part by part, so
+derived channels like "mW/mg/°C" need no entry of their own; offsets only
+apply to plain temperatures, as a rate in °C/s is the same rate in K/s. The
+factors between two units are computed once and cached, and each column is
+converted by one multiply and one add on its Arrow buffers, skipping either
+when it is the identity.
+
+`plan_units` works the conversions out from a schema alone, so that
+`normalize_file` streams a Parquet file batch by batch through one plan, and
+`normalize_dataset` a whole tree of converted files, without holding a full
+table in memory.
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Iterable
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from labetl.reader import units
+from labetl.util import atomic_path
+
+# Dimensions of the registered units
+TEMPERATURE = "temperature"
+TIME = "time"
+MASS = "mass"
+LENGTH = "length"
+VOLUME = "volume"
+POWER = "power"
+ENERGY = "energy"
+PRESSURE = "pressure"
+VOLTAGE = "voltage"
+FRACTION = "fraction"
+THERMAL_CONDUCTIVITY = "thermal_conductivity"
+VOLUMETRIC_HEAT_CAPACITY = "volumetric_heat_capacity"
+
+# unit -> (dimension, scale, offset), a value in the base unit of the
+# dimension being `value * scale + offset`
+UNITS: dict[str, tuple[str, float, float]] = {
+    "K": (TEMPERATURE, 1.0, 0.0),
+    "°C": (TEMPERATURE, 1.0, 273.15),
+    "°F": (TEMPERATURE, 5 / 9, 273.15 - 32 * 5 / 9),
+    "s": (TIME, 1.0, 0.0),
+    "ms": (TIME, 1e-3, 0.0),
+    "min": (TIME, 60.0, 0.0),
+    "h": (TIME, 3600.0, 0.0),
+    "kg": (MASS, 1.0, 0.0),
+    "g": (MASS, 1e-3, 0.0),
+    "mg": (MASS, 1e-6, 0.0),
+    "µg": (MASS, 1e-9, 0.0),
+    "ug": (MASS, 1e-9, 0.0),
+    "m": (LENGTH, 1.0, 0.0),
+    "cm": (LENGTH, 1e-2, 0.0),
+    "mm": (LENGTH, 1e-3, 0.0),
+    "µm": (LENGTH, 1e-6, 0.0),
+    "um": (LENGTH, 1e-6, 0.0),
+    "nm": (LENGTH, 1e-9, 0.0),
+    "m³": (VOLUME, 1.0, 0.0),
+    "l": (VOLUME, 1e-3, 0.0),
+    "L": (VOLUME, 1e-3, 0.0),
+    "ml": (VOLUME, 1e-6, 0.0),
+    "mL": (VOLUME, 1e-6, 0.0),
+    "cc": (VOLUME, 1e-6, 0.0),
+    "W": (POWER, 1.0, 0.0),
+    "kW": (POWER, 1e3, 0.0),
+    "mW": (POWER, 1e-3, 0.0),
+    "µW": (POWER, 1e-6, 0.0),
+    "uW": (POWER, 1e-6, 0.0),
+    "J": (ENERGY, 1.0, 0.0),
+    "kJ": (ENERGY, 1e3, 0.0),
+    "MJ": (ENERGY, 1e6, 0.0),
+    "mJ": (ENERGY, 1e-3, 0.0),
+    "Pa": (PRESSURE, 1.0, 0.0),
+    "hPa": (PRESSURE, 1e2, 0.0),
+    "kPa": (PRESSURE, 1e3, 0.0),
+    "mbar": (PRESSURE, 1e2, 0.0),
+    "bar": (PRESSURE, 1e5, 0.0),
+    "V": (VOLTAGE, 1.0, 0.0),
+    "mV": (VOLTAGE, 1e-3, 0.0),
+    "µV": (VOLTAGE, 1e-6, 0.0),
+    "uV": (VOLTAGE, 1e-6, 0.0),
+    "1": (FRACTION, 1.0, 0.0),
+    "%": (FRACTION, 1e-2, 0.0),
+    "ppm": (FRACTION, 1e-6, 0.0),
+    "W/(m·K)": (THERMAL_CONDUCTIVITY, 1.0, 0.0),
+    "W/mK": (THERMAL_CONDUCTIVITY, 1.0, 0.0),
+    "mW/(m·K)": (THERMAL_CONDUCTIVITY, 1e-3, 0.0),
+    "J/(m³·K)": (VOLUMETRIC_HEAT_CAPACITY, 1.0, 0.0),
+    "J/(m³K)": (VOLUMETRIC_HEAT_CAPACITY, 1.0, 0.0),
+}
+
+# name -> the unit of each dimension; dimensions left out are not converted
+SYSTEMS: dict[str, dict[str, str]] = {
+    "si": {
+        TEMPERATURE: "K",
+        TIME: "s",
+        MASS: "kg",
+        LENGTH: "m",
+        VOLUME: "m³",
+        POWER: "W",
+        ENERGY: "J",
+        PRESSURE: "Pa",
+        VOLTAGE: "V",
+        THERMAL_CONDUCTIVITY: "W/(m·K)",
+        VOLUMETRIC_HEAT_CAPACITY: "J/(m³·K)",
+    },
+    # The units most lab instruments report in, with a single time unit
+    "lab": {
+        TEMPERATURE: "°C",
+        TIME: "s",
+        MASS: "mg",
+        LENGTH: "µm",
+        VOLUME: "ml",
+        POWER: "mW",
+        ENERGY: "J",
+        PRESSURE: "Pa",
+        VOLTAGE: "µV",
+        THERMAL_CONDUCTIVITY: "W/(m·K)",
+        VOLUMETRIC_HEAT_CAPACITY: "J/(m³·K)",
+    },
+}
+
+
+def _system(system: str | dict[str, str]) -> dict[str, str]:
+    """Get the units of a unit system given by name or as a dictionary."""
+    if not isinstance(system, str):
+        return system
+    try:
+        return SYSTEMS[system]
+    except KeyError:
+        raise ValueError(
+            f"Unknown unit system {system!r}, expected one of {tuple(SYSTEMS)}"
+        )
+
+
+@lru_cache(maxsize=None)
+def _parts(unit: str) -> tuple[str, ...] | None:
+    """Split a unit into registered units, or None if it is not known."""
+    if unit in UNITS:
+        return (unit,)
+    parts = tuple(unit.split("/"))
+    if len(parts) > 1 and all(part in UNITS for part in parts):
+        return parts
+    return None
+
+
+@lru_cache(maxsize=None)
+def conversion(source: str, target: str) -> tuple[float, float]:
+    """Get the scale and offset converting values from one unit to another.
+
+    Args:
+        source (str): The unit of the values, e.g. "°C" or "mW/mg".
+        target (str): The unit to convert them to, e.g. "K" or "W/kg".
+
+    Returns:
+        tuple[float, float]: The scale and offset, the converted value being
+            `value * scale + offset`.
+
+    Raises:
+        ValueError: If a unit is unknown or the units have different
+            dimensions.
+    """
+    source_parts, target_parts = _parts(source), _parts(target)
+    if source_parts is None or target_parts is None:
+        unknown = source if source_parts is None else target
+        raise ValueError(f"Unknown unit {unknown!r}")
+    dimensions = [UNITS[part][0] for part in source_parts]
+    if dimensions != [UNITS[part][0] for part in target_parts]:
+        raise ValueError(f"Cannot convert {source!r} to {target!r}")
+    if len(source_parts) == 1:
+        _, source_scale, source_offset = UNITS[source]
+        _, target_scale, target_offset = UNITS[target]
+        scale = source_scale / target_scale
+        return scale, (source_offset - target_offset) / target_scale
+    # The first part is divided by all the others
+    ratios = [UNITS[a][1] / UNITS[b][1] for a, b in zip(source_parts, target_parts)]
+    scale = ratios[0]
+    for ratio in ratios[1:]:
+        scale /= ratio
+    return scale, 0.0
+
+
+def target_unit(unit: str, system: str | dict[str, str] = "si") -> str | None:
+    """Get the unit of a unit system for the dimension of a unit.
+
+    Args:
+        unit (str): A registered or compound unit, e.g. "mW/mg".
+        system (str | dict[str, str]): A name in `SYSTEMS`, or the unit of
+            each dimension.
+
+    Returns:
+        str | None: The unit in the system, e.g. "W/kg", or None if the unit
+            is not known.
+    """
+    parts = _parts(unit)
+    if parts is None:
+        return None
+    targets = _system(system)
+    return "/".join(targets.get(UNITS[part][0], part) for part in parts)
+
+
+def plan_units(
+    schema: pa.Schema,
+    system: str | dict[str, str] = "si",
+    columns: dict[str, str] | None = None,
+) -> dict[str, tuple[str, float, float]]:
+    """Work out the unit conversions of the columns of a schema.
+
+    Args:
+        schema (pyarrow.Schema): The schema of a loaded or converted table.
+        system (str | dict[str, str]): A name in `SYSTEMS`, or the unit of
+            each dimension.
+        columns (dict[str, str] | None): Units of specific columns, which
+            take precedence over the system.
+
+    Returns:
+        dict[str, tuple[str, float, float]]: The target unit, scale and
+            offset of each numeric column whose unit changes. Columns without
+            a unit, or with one that is not known, are left out.
+    """
+    targets = _system(system)
+    columns = columns or {}
+    plan = {}
+    for name, unit in units(schema).items():
+        field_type = schema.field(name).type
+        if unit is None or not (
+            pa.types.is_floating(field_type) or pa.types.is_integer(field_type)
+        ):
+            continue
+        target = columns.get(name) or target_unit(unit, targets)
+        if target is not None and target != unit:
+            plan[name] = (target, *conversion(unit, target))
+    return plan
+
+
+def _convert_stats(stats: dict, scale: float, offset: float) -> dict:
+    """Convert the value statistics of a column, see `labetl.util.column_stats`."""
+    return {
+        key: value * scale + offset
+        if key in ("min", "max", "mean") and value is not None
+        else value
+        for key, value in stats.items()
+    }
+
+
+def normalized_schema(
+    schema: pa.Schema, plan: dict[str, tuple[str, float, float]]
+) -> pa.Schema:
+    """Get the schema of a table once the conversions of a plan are applied.
+
+    Integer columns that are converted become float64, their "unit" and
+    "stats" metadata are converted, and the "units" key of older HFM tables
+    is renamed to "unit".
+
+    Args:
+        schema (pyarrow.Schema): The schema the plan was made for.
+        plan (dict[str, tuple[str, float, float]]): See `plan_units`.
+
+    Returns:
+        pyarrow.Schema: The converted schema, with the table metadata.
+    """
+    fields = []
+    for field in schema:
+        if field.metadata is None:
+            fields.append(field)
+            continue
+        metadata = dict(field.metadata)
+        if b"units" in metadata:
+            metadata.setdefault(b"unit", metadata.pop(b"units"))
+        if field.name in plan:
+            target, scale, offset = plan[field.name]
+            metadata[b"unit"] = target.encode("utf-8")
+            if b"stats" in metadata:
+                stats = _convert_stats(json.loads(metadata[b"stats"]), scale, offset)
+                metadata[b"stats"] = json.dumps(stats).encode("utf-8")
+            if pa.types.is_integer(field.type):
+                field = field.with_type(pa.float64())
+        fields.append(field.with_metadata(metadata))
+    return pa.schema(fields, metadata=schema.metadata)
+
+
+def _apply(
+    data: pa.Table | pa.RecordBatch,
+    plan: dict[str, tuple[str, float, float]],
+    schema: pa.Schema,
+) -> pa.Table | pa.RecordBatch:
+    """Convert the columns of a table or batch with a plan."""
+    columns = []
+    for field, values in zip(schema, data.columns):
+        if field.name in plan:
+            _, scale, offset = plan[field.name]
+            if values.type != field.type:
+                values = values.cast(field.type)
+            if scale != 1:
+                values = pc.multiply(values, pa.scalar(scale, field.type))
+            if offset != 0:
+                values = pc.add(values, pa.scalar(offset, field.type))
+        columns.append(values)
+    return type(data).from_arrays(columns, schema=schema)
+
+
+def normalize_units(
+    data: pa.Table | pa.RecordBatch,
+    system: str | dict[str, str] = "si",
+    columns: dict[str, str] | None = None,
+) -> pa.Table | pa.RecordBatch:
+    """Convert the columns of a table to the units of a unit system.
+
+    Args:
+        data (pyarrow.Table | pyarrow.RecordBatch): A loaded or converted
+            table, with the units in the column metadata.
+        system (str | dict[str, str]): A name in `SYSTEMS`, or the unit of
+            each dimension, e.g. `{"temperature": "K"}`.
+        columns (dict[str, str] | None): Units of specific columns, which
+            take precedence over the system.
+
+    Returns:
+        pyarrow.Table | pyarrow.RecordBatch: The converted table, with the
+            "unit" and "stats" metadata of the converted columns updated.
+    """
+    plan = plan_units(data.schema, system, columns)
+    return _apply(data, plan, normalized_schema(data.schema, plan))
+
+
+def normalize_file(
+    path: str,
+    output: str,
+    system: str | dict[str, str] = "si",
+    columns: dict[str, str] | None = None,
+    batch_size: int = 65536,
+) -> int:
+    """Convert the units of a Parquet file, one batch of rows at a time.
+
+    The output is written to a temporary file and renamed into place, so it
+    may be the input file itself.
+
+    Args:
+        path (str): The converted Parquet file.
+        output (str): The path of the Parquet file to write.
+        system (str | dict[str, str]): See `normalize_units`.
+        columns (dict[str, str] | None): See `normalize_units`.
+        batch_size (int): The number of rows read and converted at once.
+
+    Returns:
+        int: The number of rows written.
+    """
+    rows = 0
+    with pq.ParquetFile(path) as source:
+        plan = plan_units(source.schema_arrow, system, columns)
+        schema = normalized_schema(source.schema_arrow, plan)
+        with atomic_path(output) as tmp_path:
+            with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+                for batch in source.iter_batches(batch_size=batch_size):
+                    writer.write_batch(_apply(batch, plan, schema))
+                    rows += batch.num_rows
+    return rows
+
+
+def normalize_dataset(
+    roots: Iterable[str],
+    out_dir: str,
+    system: str | dict[str, str] = "si",
+    columns: dict[str, str] | None = None,
+    max_workers: int | None = None,
+) -> list[str]:
+    """Convert the units of all Parquet files under the roots.
+
+    The directory structure under each root, e.g. the partitions of a
+    dataset, is mirrored in `out_dir`.
+
+    Args:
+        roots (Iterable[str]): Parquet files or directories to search.
+        out_dir (str): The directory to write the converted files in.
+        system (str | dict[str, str]): See `normalize_units`.
+        columns (dict[str, str] | None): See `normalize_units`.
+        max_workers (int | None): The number of files converted at once.
+
+    Returns:
+        list[str]: The paths of the written files.
+    """
+    from labetl.catalog import find_parquet_files
+
+    tasks = []
+    for root in roots:
+        if os.path.isfile(root):
+            tasks.append((root, os.path.join(out_dir, os.path.basename(root))))
+            continue
+        for path in sorted(find_parquet_files([root])):
+            tasks.append((path, os.path.join(out_dir, os.path.relpath(path, root))))
+    with ThreadPoolExecutor(max_workers) as executor:
+        list(
+            executor.map(
+                lambda task: normalize_file(*task, system=system, columns=columns),
+                tasks,
+            )
+        )
+    return [output for _, output in tasks]
@@ -2,13 +2,92 @@
 General utilities for working with Parquet files and PyArrow tables.
 """
 
+from __future__ import annotations
+
 import hashlib
+import io
 import json
+import math
+import os
+import stat
+import tempfile
+from contextlib import contextmanager
+from typing import IO, Iterator, Union
+
+from labetl.lazy import lazy_import
+from labetl.profiling import profiled
+
+magic = lazy_import("magic")
+pa = lazy_import("pyarrow")
+pl = lazy_import("polars")
+
+BACKENDS = ("arrow", "polars")
+
+# What the loaders accept: a path, the bytes of a file, or a binary file object
+Source = Union[str, "os.PathLike[str]", bytes, IO[bytes]]
 
-import magic
-import pyarrow as pa
 
+class NamedBytes(bytes):
+    """The bytes of a file together with its name, e.g. an archive member.
+
+    Args:
+        data (bytes): The contents of the file.
+        name (str | None): The name or path of the file, which decides the
+            loader and is stored in the "file_hash" metadata.
+    """
+
+    name: str | None
 
+    def __new__(cls, data: bytes, name: str | None = None) -> NamedBytes:
+        obj = super().__new__(cls, data)
+        obj.name = name
+        return obj
+
+
+def read_source(source: Source) -> str | bytes:
+    """Resolve a loader source to a path or to the bytes of the file.
+
+    Paths are returned as strings and left to the loader to open. File objects
+    are read in full, keeping their name if they have one, see `NamedBytes`.
+
+    Args:
+        source (Source): A path, bytes or a binary file object.
+
+    Returns:
+        str | bytes: The path, or the bytes of the file.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    if isinstance(source, bytes):
+        return source
+    if isinstance(source, (bytearray, memoryview)):
+        return bytes(source)
+    return NamedBytes(source.read(), getattr(source, "name", None))
+
+
+def source_name(source: Source) -> str | None:
+    """Get the file name of a loader source, or None for anonymous bytes."""
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.basename(os.fspath(source))
+    name = getattr(source, "name", None)
+    return os.path.basename(name) if isinstance(name, str) else None
+
+
+def open_text(source: str | bytes, encoding: str) -> IO[str]:
+    """Open a path, or the bytes of a file, for reading text."""
+    if isinstance(source, bytes):
+        return io.TextIOWrapper(io.BytesIO(source), encoding=encoding)
+    return open(source, "r", encoding=encoding)
+
+
+def input_stream(source: str | bytes) -> str | pa.BufferReader:
+    """Get an input that pyarrow readers accept, without copying bytes."""
+    if isinstance(source, bytes):
+        return pa.BufferReader(source)
+    return source
+
+
+@profiled("set_metadata")
 def set_metadata(tbl, col_meta={}, tbl_meta={}) -> pa.Table:
     """Store table- and column-level metadata as json-encoded byte strings.
 
@@ -73,15 +152,110 @@ def set_metadata(tbl, col_meta={}, tbl_meta={}) -> pa.Table:
     return tbl
 
 
-def detect_encoding(path: str) -> str:
-    """Detect the encoding of a file using python-magic."""
+def _finite(value: float | int | None) -> float | int | None:
+    """Replace NaN and infinite values, which JSON cannot hold, with None."""
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+@profiled("column_stats")
+def column_stats(tbl: pa.Table) -> dict[str, dict[str, float | int | None]]:
+    """Compute the min, max, mean, count and null count of the numeric columns.
+
+    All columns are aggregated in a single pass over the table by one
+    ungrouped `group_by` aggregation.
+
+    Args:
+        tbl (pyarrow.Table): The table to describe.
+
+    Returns:
+        dict[str, dict[str, float | int | None]]: The statistics of each
+            integer or floating point column. NaN values are skipped by min
+            and max, but make the mean None.
+    """
+    numeric = [
+        field.name
+        for field in tbl.schema
+        if pa.types.is_integer(field.type) or pa.types.is_floating(field.type)
+    ]
+    if not numeric:
+        return {}
+    aggregations = [(name, kind) for name in numeric for kind in ("min_max", "mean")]
+    row = tbl.select(numeric).group_by([]).aggregate(aggregations).to_pylist()[0]
+    stats = {}
+    for name in numeric:
+        null_count = tbl.column(name).null_count
+        stats[name] = {
+            "min": _finite(row[f"{name}_min_max"]["min"]),
+            "max": _finite(row[f"{name}_min_max"]["max"]),
+            "mean": _finite(row[f"{name}_mean"]),
+            "count": tbl.num_rows - null_count,
+            "null_count": null_count,
+        }
+    return stats
+
+
+def add_column_stats(tbl: pa.Table) -> pa.Table:
+    """Store the statistics of `column_stats` under the "stats" column metadata.
+
+    The statistics end up in the Parquet footer next to the units, so readers
+    such as the catalog can prune files on value ranges without reading data.
+
+    Args:
+        tbl (pyarrow.Table): The table to describe.
+
+    Returns:
+        pyarrow.Table: The table with the "stats" metadata of each numeric
+            column.
+    """
+    stats = column_stats(tbl)
+    return set_metadata(tbl, col_meta={name: {"stats": s} for name, s in stats.items()})
+
+
+def check_backend(backend: str) -> None:
+    """Raise a ValueError if a loader backend is not supported."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+
+
+def to_backend(table: pa.Table, backend: str = "arrow") -> pa.Table | pl.DataFrame:
+    """Hand a table over to the dataframe library of a backend without copying.
+
+    Polars takes over the Arrow buffers of each column as they are, without
+    rechunking, so numeric columns share their memory with the table. Polars
+    frames have no schema metadata, so the metadata of the table is only kept
+    by the "arrow" backend.
+
+    Args:
+        table (pyarrow.Table): A table returned by one of the loaders.
+        backend (str): "arrow" to return the table itself, or "polars" to
+            return a Polars DataFrame.
+
+    Returns:
+        pyarrow.Table | polars.DataFrame: The table in the requested backend.
+    """
+    check_backend(backend)
+    if backend == "polars":
+        return pl.from_arrow(table, rechunk=False)
+    return table
+
+
+@profiled("detect_encoding")
+def detect_encoding(path: str | bytes) -> str:
+    """Detect the encoding of a file, or of its bytes, using python-magic."""
     f = magic.Magic(mime_encoding=True)
+    if isinstance(path, bytes):
+        return f.from_buffer(path)
     encoding = f.from_file(path)
     return encoding
 
 
-def get_hash(path: str) -> str | None:
-    """Generate file hash for metadata."""
+@profiled("get_hash", reads_path=True)
+def get_hash(path: str | bytes) -> str | None:
+    """Generate file hash for metadata, from a path or the bytes of a file."""
+    if isinstance(path, bytes):
+        return hashlib.blake2b(path).hexdigest()
     try:
         with open(path, "rb") as file:
             return hashlib.blake2b(file.read()).hexdigest()
@@ -91,3 +265,50 @@ def get_hash(path: str) -> str | None:
     except Exception as e:
         print(f"Error occurred while generating file hash: {e}")
         return None
+
+
+def _get_umask() -> int:
+    """Read the umask of the process, which can only be read by setting it."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# Read once, as setting the umask affects the files other threads create
+_UMASK = _get_umask()
+
+
+@contextmanager
+def atomic_path(path: str) -> Iterator[str]:
+    """Yield a temporary path that is renamed to `path` once writing succeeds.
+
+    The temporary file is created in the same directory as `path` so the final
+    rename is atomic and readers never observe a partially written file. It is
+    given the permissions of the file it replaces or, for a new file, those of
+    a file created with `open` (0666 minus the umask), rather than the
+    owner-only permissions of `tempfile.mkstemp`.
+
+    Args:
+        path (str): The final path of the file.
+
+    Yields:
+        str: The temporary path to write to.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp"
+    )
+    os.close(fd)
+    try:
+        yield tmp_path
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,269 @@
+"""
+Physical validation of loaded tables.
+
+The loaders convert whatever the instruments wrote, including runs that are
+physically implausible: time that jumps backwards when an export is spliced,
+temperatures outside any furnace's range, single-sample temperature spikes
+from a loose thermocouple, or NGB channels that are shorter than the others
+and were therefore left out of the table. `validate` checks a table against
+the rules of its `type` metadata and returns the violations, and
+`add_validation` stores them in the table metadata, so that suspicious runs
+can be found from the converted files without loading the raw data again.
+
+Rules are declared per instrument type as (column, kind, limits):
+
+- MONOTONIC: the column must be strictly increasing.
+- RANGE: the values must lie within the bounds for the unit of the column.
+- STEP: consecutive values may differ by at most the limit for the unit.
+
+Limits are keyed by unit, with None for columns without one (NGB files
+converted before their channels had units, which are always in °C, mg and
+min). Columns whose unit has no limits are not checked, as a bound only means
+something in a known unit.
+Columns are found by their canonical name or any alias of `labetl.schema`,
+so conformed and unconformed tables are checked alike.
+
+Each column is checked with Arrow compute kernels: one `min_max` over the
+values for the range rules, and one `pairwise_diff` with its `min_max` for the
+monotonic and step rules. Valid columns cost those passes only; the number
+and first index of the offending rows are computed for violated rules alone.
+"""
+
+import json
+from typing import Any
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from labetl.reader import units
+from labetl.schema import SCHEMAS
+
+# Bump whenever the rules change, so readers can tell which checks were run
+VALIDATION_VERSION = 1
+
+# Kinds of rule
+MONOTONIC = "monotonic"
+RANGE = "range"
+STEP = "step"
+# Reported for NGB channels that were dropped for having the wrong length
+CHANNEL_LENGTH = "channel_length"
+
+Limits = dict[str | None, Any]
+
+TEMPERATURE_RANGE: Limits = {
+    "°C": (-273.15, 2000.0),
+    "K": (0.0, 2273.15),
+    None: (-273.15, 2000.0),
+}
+# Largest plausible change of a temperature between consecutive samples
+TEMPERATURE_STEP: Limits = {"°C": 50.0, "K": 50.0, None: 50.0}
+PERCENT_RANGE: Limits = {"%": (0.0, 100.0)}
+
+# type -> rules as (column, kind, limits by unit)
+RULES: dict[str, list[tuple[str, str, Limits | None]]] = {
+    "STA": [
+        ("time", MONOTONIC, None),
+        ("temperature", RANGE, TEMPERATURE_RANGE),
+        ("temperature", STEP, TEMPERATURE_STEP),
+        ("furnace_temperature", RANGE, TEMPERATURE_RANGE),
+        # The relative mass in %, which can exceed 100 from buoyancy; the NGB
+        # sample_mass is a change of mass and is negative by design
+        ("mass", RANGE, {"%": (0.0, None)}),
+    ],
+    "MCC": [
+        ("time", MONOTONIC, None),
+        ("temperature", RANGE, TEMPERATURE_RANGE),
+        ("temperature", STEP, TEMPERATURE_STEP),
+        ("oxygen", RANGE, PERCENT_RANGE),
+    ],
+    "Cone": [
+        # The load cell is tared with the sample holder, so the sample mass
+        # can be negative and has no range
+        ("time", MONOTONIC, None),
+        ("stack_temperature", RANGE, TEMPERATURE_RANGE),
+        ("smoke_temperature", RANGE, TEMPERATURE_RANGE),
+        ("o2_meter", RANGE, PERCENT_RANGE),
+        ("co2_meter", RANGE, PERCENT_RANGE),
+        ("co_meter", RANGE, PERCENT_RANGE),
+    ],
+    "HFM": [
+        ("upper_temperature", RANGE, TEMPERATURE_RANGE),
+        ("lower_temperature", RANGE, TEMPERATURE_RANGE),
+        ("average_temperature", RANGE, TEMPERATURE_RANGE),
+    ],
+    "FTIR": [],
+}
+
+
+def _find_column(table: pa.Table, table_type: str, name: str) -> str | None:
+    """Find a column by its canonical name or one of its aliases."""
+    aliases = next(
+        (
+            aliases
+            for column, _, aliases in SCHEMAS.get(table_type, ())
+            if column == name
+        ),
+        (),
+    )
+    return next(
+        (column for column in (name, *aliases) if column in table.column_names),
+        None,
+    )
+
+
+def _violations(mask: pa.Array, offset: int = 0) -> tuple[int, int]:
+    """Count the rows of a mask and find the first one."""
+    return pc.sum(mask).as_py(), pc.index(mask, True).as_py() + offset
+
+
+def _check_column(
+    values: pa.Array, name: str, unit: str | None, rules: list[tuple[str, Limits]]
+) -> list[dict[str, Any]]:
+    """Check the rules of one column in as few passes as possible."""
+    violations = []
+    checks = []
+    for kind, limits in rules:
+        if kind == MONOTONIC:
+            checks.append((kind, None))
+        elif unit in limits:
+            checks.append((kind, limits[unit]))
+    if not checks or len(values) == 0:
+        return violations
+
+    if any(kind == RANGE for kind, _ in checks):
+        extent = pc.min_max(values).as_py()
+    if len(values) > 1 and any(kind != RANGE for kind, _ in checks):
+        diff = pc.pairwise_diff(values).slice(1)
+        steps = pc.min_max(diff).as_py()
+    else:
+        steps = {"min": None, "max": None}
+
+    for kind, limit in checks:
+        if kind == RANGE:
+            low, high = limit
+            below = (
+                low is not None and extent["min"] is not None and extent["min"] < low
+            )
+            above = (
+                high is not None and extent["max"] is not None and extent["max"] > high
+            )
+            if not (below or above):
+                continue
+            if below and above:
+                mask = pc.or_(pc.less(values, low), pc.greater(values, high))
+            else:
+                mask = pc.less(values, low) if below else pc.greater(values, high)
+            count, first = _violations(mask)
+            violations.append(
+                {
+                    "rule": kind,
+                    "column": name,
+                    "unit": unit,
+                    "bounds": [low, high],
+                    "min": extent["min"],
+                    "max": extent["max"],
+                    "count": count,
+                    "first": first,
+                }
+            )
+        elif steps["min"] is None:
+            continue
+        elif kind == MONOTONIC:
+            if steps["min"] > 0:
+                continue
+            # The index of a difference is that of the row before the offender
+            count, first = _violations(pc.less_equal(diff, 0), offset=1)
+            violations.append(
+                {"rule": kind, "column": name, "count": count, "first": first}
+            )
+        elif kind == STEP:
+            if max(-steps["min"], steps["max"]) <= limit:
+                continue
+            count, first = _violations(pc.greater(pc.abs(diff), limit), offset=1)
+            violations.append(
+                {
+                    "rule": kind,
+                    "column": name,
+                    "unit": unit,
+                    "limit": limit,
+                    "largest": max(-steps["min"], steps["max"]),
+                    "count": count,
+                    "first": first,
+                }
+            )
+    return violations
+
+
+def validate(
+    table: pa.Table, rules: list[tuple[str, str, Limits | None]] | None = None
+) -> list[dict[str, Any]]:
+    """Check a table against the physical rules of its instrument type.
+
+    Args:
+        table (pyarrow.Table): A table returned by a loader, conformed or not.
+        rules (list[tuple[str, str, dict | None]] | None): The rules as
+            (column, kind, limits by unit). Defaults to those of the `type`
+            metadata of the table in `RULES`.
+
+    Returns:
+        list[dict[str, Any]]: One record per violated rule, with the "rule",
+            the "column", the number of offending rows ("count") and the index
+            of the "first" one, and the limits and observed extremes. Empty if
+            the table is valid.
+    """
+    metadata = table.schema.metadata or {}
+    table_type = metadata.get(b"type", b"").decode("utf-8")
+    if rules is None:
+        rules = RULES.get(table_type, [])
+
+    violations = []
+    raw = metadata.get(b"file_metadata", b"")
+    # Only decode the file metadata when a loader dropped a channel
+    if b"dropped_channels" in raw:
+        dropped = json.loads(raw).get("dropped_channels", {})
+        for name, length in dropped.items():
+            violations.append(
+                {
+                    "rule": CHANNEL_LENGTH,
+                    "column": name,
+                    "count": length,
+                    "expected": table.num_rows,
+                }
+            )
+
+    by_column: dict[str, list[tuple[str, Limits]]] = {}
+    for name, kind, limits in rules:
+        column = _find_column(table, table_type, name)
+        if column is not None:
+            by_column.setdefault(column, []).append((kind, limits))
+    column_units = units(table.schema)
+    for column, column_rules in by_column.items():
+        values = table.column(column)
+        if not (pa.types.is_integer(values.type) or pa.types.is_floating(values.type)):
+            continue
+        # pairwise_diff needs a contiguous array
+        values = values.combine_chunks() if values.num_chunks != 1 else values.chunk(0)
+        violations.extend(
+            _check_column(values, column, column_units[column], column_rules)
+        )
+    return violations
+
+
+def add_validation(
+    table: pa.Table, rules: list[tuple[str, str, Limits | None]] | None = None
+) -> pa.Table:
+    """Validate a table and store the violations in its metadata.
+
+    Args:
+        table (pyarrow.Table): A table returned by a loader.
+        rules (list[tuple[str, str, dict | None]] | None): The rules, see
+            `validate`.
+
+    Returns:
+        pyarrow.Table: The table with a "validation" table metadata entry
+            holding the rules version and the "violations" of `validate`.
+    """
+    report = {"version": VALIDATION_VERSION, "violations": validate(table, rules)}
+    return table.replace_schema_metadata(
+        {**(table.schema.metadata or {}), b"validation": json.dumps(report)}
+    )
@@ -0,0 +1,195 @@
+"""
+Watch drop folders and convert instrument files as soon as they are complete.
+"""
+
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable
+
+from labetl.batch import convert_file, plan_outputs
+from labetl.loaders import find_loader_name
+
+
+def scan_folder(folder: str) -> dict[str, tuple[int, int]]:
+    """Recursively list the supported files in a folder.
+
+    Args:
+        folder (str): The folder to scan.
+
+    Returns:
+        dict[str, tuple[int, int]]: The size and modification time (ns) of each
+            file that has a loader, keyed by path.
+    """
+    found = {}
+    stack = [folder]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:  # folder removed or share temporarily unavailable
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file() and find_loader_name(entry.name):
+                    stat = entry.stat()
+                    found[entry.path] = (stat.st_size, stat.st_mtime_ns)
+            except OSError:  # file removed between listing and stat
+                continue
+    return found
+
+
+class FolderWatcher:
+    """Poll drop folders and hand settled files to a pool of workers.
+
+    A file is considered complete once its size and modification time have not
+    changed for `settle` seconds. Each completed file is converted once; it is
+    converted again only if it is later modified.
+
+    Args:
+        folders (list[str]): The folders to watch.
+        out_dir (str): The directory to write the Parquet files in.
+        jobs (int | None): The number of worker processes. Defaults to the
+            number of CPUs.
+        interval (float): Seconds between scans of the folders.
+        settle (float): Seconds a file must be unchanged before it is converted.
+        on_result (Callable | None): Called with each conversion record.
+    """
+
+    def __init__(
+        self,
+        folders: list[str],
+        out_dir: str,
+        jobs: int | None = None,
+        interval: float = 1.0,
+        settle: float = 2.0,
+        on_result: Callable[[dict[str, Any]], None] | None = None,
+    ):
+        self.folders = folders
+        self.out_dir = out_dir
+        self.jobs = jobs or os.cpu_count() or 1
+        self.interval = interval
+        self.settle = settle
+        self.on_result = on_result
+        # path -> (size, mtime_ns, monotonic time the state was first seen)
+        self._pending: dict[str, tuple[int, int, float]] = {}
+        # path -> (size, mtime_ns) of the last version that was converted
+        self._done: dict[str, tuple[int, int]] = {}
+        self._stop = asyncio.Event()
+
+    def stop(self) -> None:
+        """Ask the watcher to stop after the conversions in progress.
+
+        Must be called from the event loop running the watcher; use
+        `loop.call_soon_threadsafe(watcher.stop)` from other threads.
+        """
+        self._stop.set()
+
+    def _settled(self, found: dict[str, tuple[int, int]], now: float) -> list[str]:
+        """Update the pending states and return the files that have settled."""
+        ready = []
+        for path in list(self._pending):
+            if path not in found:
+                del self._pending[path]
+        for path, state in found.items():
+            if self._done.get(path) == state:
+                continue
+            previous = self._pending.get(path)
+            if previous is None or previous[:2] != state:
+                self._pending[path] = (*state, now)
+            elif now - previous[2] >= self.settle:
+                del self._pending[path]
+                self._done[path] = state
+                ready.append(path)
+        return ready
+
+    def _output(self, path: str) -> str:
+        """Get the output path of a file under one of the watched folders."""
+        root = os.path.dirname(path)
+        for folder in self.folders:
+            if os.path.abspath(path).startswith(os.path.abspath(folder) + os.sep):
+                root = folder
+                break
+        # Plan the output together with the supported files of the same stem
+        # next to it, so that e.g. an NGB file and its CSV export keep
+        # separate outputs as in batch mode
+        directory, name = os.path.split(path)
+        stem = os.path.splitext(name)[0]
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            names = []
+        siblings = [
+            os.path.join(directory, sibling)
+            for sibling in names
+            if sibling != name
+            and os.path.splitext(sibling)[0] == stem
+            and find_loader_name(sibling)
+        ]
+        planned = plan_outputs([(p, root) for p in [path, *siblings]], self.out_dir)
+        return planned[0][1]
+
+    async def _worker(self, queue: asyncio.Queue, executor: Executor) -> None:
+        """Convert files from the queue in the executor."""
+        loop = asyncio.get_running_loop()
+        while True:
+            path = await queue.get()
+            try:
+                try:
+                    result = await loop.run_in_executor(
+                        executor, convert_file, path, self._output(path)
+                    )
+                except Exception as e:  # e.g. the file was removed meanwhile
+                    result = {
+                        "path": path,
+                        "output": None,
+                        "size": 0,
+                        "status": "error",
+                        "error": f"{type(e).__name__}: {e}",
+                        "duration": 0.0,
+                    }
+                if self.on_result:
+                    self.on_result(result)
+            finally:
+                queue.task_done()
+
+    async def run(self) -> None:
+        """Watch the folders until `stop` is called."""
+        queue: asyncio.Queue = asyncio.Queue()
+        with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+            workers = [
+                asyncio.create_task(self._worker(queue, executor))
+                for _ in range(self.jobs)
+            ]
+            try:
+                while not self._stop.is_set():
+                    # Scanning a network share can block, so keep it off the loop
+                    found: dict[str, tuple[int, int]] = {}
+                    for folder in self.folders:
+                        found.update(await asyncio.to_thread(scan_folder, folder))
+                    for path in self._settled(found, time.monotonic()):
+                        queue.put_nowait(path)
+                    try:
+                        await asyncio.wait_for(self._stop.wait(), self.interval)
+                    except asyncio.TimeoutError:
+                        pass
+                await queue.join()
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+
+
+def print_result(result: dict[str, Any]) -> None:
+    """Print a one-line summary of a conversion record to stderr."""
+    if result["status"] == "ok":
+        print(
+            f"{result['path']} -> {result['output']} ({result['duration']:.2f} s)",
+            file=sys.stderr,
+        )
+    else:
+        print(f"{result['path']}: {result['error']}", file=sys.stderr)
@@ -0,0 +1,107 @@
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+
+from labetl import load
+from labetl.archive import is_archive, iter_archive, load_archive
+from labetl.faa_mcc_parser import load_mcc_data
+from labetl.util import NamedBytes
+
+
+def file_hash(table):
+    return json.loads(table.schema.metadata[b"file_metadata"])["file_hash"]
+
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.files = [
+            "tests/test_files/MCC/Hemp_Sheet_MCC_30K_min_220112_R1.txt",
+            "tests/test_files/STA/DF_FILED_VAL_STA_N2_10K_240211_R1.csv",
+            "tests/test_files/STA/PT_Deck_Board_3_1.ngb-ss3",
+        ]
+        self.zip_path = os.path.join(self.root, "exports.zip")
+        with zipfile.ZipFile(self.zip_path, "w") as z:
+            for path in self.files:
+                z.write(path, os.path.join("data", os.path.basename(path)))
+            z.writestr("data/notes.md", "not an instrument file")
+        # A tarball with the zip nested in it
+        self.tar_path = os.path.join(self.root, "exports.tar.gz")
+        with tarfile.open(self.tar_path, "w:gz") as tar:
+            tar.add(self.files[0], "MCC/run.txt")
+            tar.add(self.zip_path, "nested/exports.zip")
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_is_archive(self):
+        self.assertTrue(is_archive("runs.ZIP"))
+        self.assertTrue(is_archive("runs.tar.gz"))
+        self.assertFalse(is_archive("run.ngb-ss3"))
+
+    def test_iter_archive(self):
+        members = list(iter_archive(self.zip_path))
+        self.assertEqual(
+            [member.name for member in members],
+            [f"{self.zip_path}/data/{os.path.basename(path)}" for path in self.files],
+        )
+        for member, path in zip(members, self.files):
+            with open(path, "rb") as file:
+                self.assertEqual(member, file.read())
+
+        names = [member.name for member in iter_archive(self.tar_path)]
+        self.assertEqual(names[0], f"{self.tar_path}/MCC/run.txt")
+        self.assertEqual(
+            names[1:],
+            [
+                f"{self.tar_path}/nested/exports.zip/data/{os.path.basename(path)}"
+                for path in self.files
+            ],
+        )
+        self.assertEqual(len(list(iter_archive(self.tar_path, recursive=False))), 1)
+
+        # Tarballs are streamed from file objects that cannot seek
+        with open(self.tar_path, "rb") as file:
+            stream = io.BufferedReader(io.FileIO(os.dup(file.fileno())))
+            stream.seekable = lambda: False
+            self.assertEqual(len(list(iter_archive(stream))), 4)
+            stream.close()
+
+    def test_load_archive(self):
+        tables = dict(load_archive(self.tar_path))
+        self.assertEqual(len(tables), 4)
+        for path in self.files:
+            name = f"{self.tar_path}/nested/exports.zip/data/{os.path.basename(path)}"
+            expected = load(path)
+            self.assertTrue(tables[name].equals(expected))
+            self.assertEqual(file_hash(tables[name]), file_hash(expected))
+        # The name of the member, not the name in the archive
+        self.assertEqual(
+            file_hash(tables[f"{self.tar_path}/MCC/run.txt"])["file"], "run.txt"
+        )
+
+    def test_load_bytes(self):
+        path = self.files[0]
+        expected = load_mcc_data(path)
+        with open(path, "rb") as file:
+            data = file.read()
+            file.seek(0)
+            from_file = load(file)
+        self.assertTrue(from_file.equals(expected))
+        self.assertEqual(from_file.schema.metadata, expected.schema.metadata)
+        from_bytes = load_mcc_data(io.BytesIO(data))
+        self.assertTrue(from_bytes.equals(expected))
+        self.assertIsNone(file_hash(from_bytes)["file"])
+        self.assertEqual(file_hash(from_bytes)["hash"], file_hash(expected)["hash"])
+        self.assertTrue(load(NamedBytes(data, "run.txt")).equals(expected))
+        with self.assertRaises(ValueError):
+            load(data)
+
+
+if __name__ == "__main__":
+    unittest.main()
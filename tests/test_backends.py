@@ -0,0 +1,58 @@
+import unittest
+
+import polars as pl
+import pyarrow as pa
+from labetl.loaders import load
+from labetl.netzsch_sta_parser import load_sta_data
+from labetl.util import set_metadata, to_backend
+
+
+def data_address(column: pa.ChunkedArray | pa.Array) -> list[int]:
+    """Get the address of the data buffer of each chunk of a column."""
+    chunks = column.chunks if isinstance(column, pa.ChunkedArray) else [column]
+    return [chunk.buffers()[1].address for chunk in chunks]
+
+
+class TestBackends(unittest.TestCase):
+    def setUp(self):
+        self.csv_file_path = (
+            "tests/test_files/STA/DF_FILED_DES_STA_N2_10K_231028_R1.csv"
+        )
+        self.ngb_file_path = "tests/test_files/STA/PT_Deck_Board_3_1.ngb-ss3"
+
+    def test_set_metadata_shares_buffers(self):
+        table = pa.table({"time": [0.0, 1.0, 2.0], "mass": [100.0, 99.0, 98.0]})
+        with_meta = set_metadata(
+            table, col_meta={"mass": {"unit": "%"}}, tbl_meta={"type": "STA"}
+        )
+        for name in table.column_names:
+            self.assertEqual(
+                data_address(with_meta.column(name)), data_address(table.column(name))
+            )
+
+    def test_to_polars_shares_buffers(self):
+        table = load_sta_data(self.csv_file_path)
+        frame = to_backend(table, "polars")
+        self.assertIsInstance(frame, pl.DataFrame)
+        self.assertEqual(frame.columns, table.column_names)
+        for name in table.column_names:
+            column = table.column(name)
+            self.assertEqual(frame[name].n_chunks(), column.num_chunks)
+            self.assertEqual(data_address(frame[name].to_arrow()), data_address(column))
+        self.assertIs(to_backend(table, "arrow"), table)
+        with self.assertRaises(ValueError):
+            to_backend(table, "pandas")
+
+    def test_load_backends(self):
+        for path in (self.csv_file_path, self.ngb_file_path):
+            table = load(path)
+            frame = load(path, backend="polars")
+            self.assertIsInstance(table, pa.Table)
+            self.assertIsInstance(frame, pl.DataFrame)
+            self.assertTrue(frame.to_arrow().equals(table.replace_schema_metadata()))
+        with self.assertRaises(ValueError):
+            load(self.ngb_file_path, backend="pandas")
+
+
+if __name__ == "__main__":
+    unittest.main()
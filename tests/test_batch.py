@@ -0,0 +1,192 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import pyarrow.parquet as pq
+from labetl import loaders
+from labetl.batch import (
+    convert_file,
+    convert_paths,
+    find_files,
+    new_record,
+    plan_outputs,
+)
+from labetl.loaders import find_loader_name
+from labetl.manifest import Manifest
+from labetl.util import atomic_path
+
+
+class TestBatchConvert(unittest.TestCase):
+    def setUp(self):
+        self.test_files_dir = "tests/test_files"
+        self.out_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.out_dir, ignore_errors=True)
+
+    def test_find_loader_name(self):
+        self.assertEqual(
+            find_loader_name("a/b/run_R1.ngb-ss3"),
+            ("labetl.netzsch_sta_ngb_parser", "load_ngb_data"),
+        )
+        self.assertEqual(
+            find_loader_name("run_R2.12"),
+            ("labetl.bruker_ftir_parser", "load_ftir_data"),
+        )
+        self.assertEqual(
+            find_loader_name("run.XLSM"),
+            ("labetl.deatak_cone_parser", "load_cone_data"),
+        )
+        self.assertIsNone(find_loader_name("run.parquet"))
+
+    def test_plan_outputs(self):
+        files = [
+            ("src/STA/run_R1.ngb-ss3", "src"),
+            ("src/STA/run_R1.csv", "src"),
+            ("src/MCC/other_R1.txt", "src"),
+        ]
+        outputs = dict(plan_outputs(files, "out"))
+        self.assertEqual(
+            outputs["src/STA/run_R1.ngb-ss3"],
+            os.path.join("out", "STA", "run_R1.ngb-ss3.parquet"),
+        )
+        self.assertEqual(
+            outputs["src/STA/run_R1.csv"],
+            os.path.join("out", "STA", "run_R1.csv.parquet"),
+        )
+        self.assertEqual(
+            outputs["src/MCC/other_R1.txt"],
+            os.path.join("out", "MCC", "other_R1.parquet"),
+        )
+
+    def test_convert_paths(self):
+        sources = [
+            os.path.join(self.test_files_dir, "MCC"),
+            os.path.join(self.test_files_dir, "HFM"),
+        ]
+        expected = len(list(find_files(sources)))
+        results = convert_paths(
+            sources, self.out_dir, jobs=2, chunksize=1, progress=False
+        )
+        self.assertEqual(len(results), expected)
+        for result in results:
+            self.assertEqual(result["status"], "ok", result["error"])
+            self.assertTrue(os.path.exists(result["output"]))
+            self.assertIn(b"file_metadata", pq.read_schema(result["output"]).metadata)
+
+    def test_atomic_path_permissions(self):
+        # Outputs get the permissions of files created with open, not the
+        # owner-only permissions of mkstemp
+        path = os.path.join(self.out_dir, "run.parquet")
+        with atomic_path(path) as tmp_path:
+            with open(tmp_path, "w") as f:
+                f.write("data")
+        reference = os.path.join(self.out_dir, "reference")
+        open(reference, "w").close()
+        self.assertEqual(os.stat(path).st_mode, os.stat(reference).st_mode)
+        # A replaced file keeps its permissions
+        os.chmod(path, 0o640)
+        with atomic_path(path) as tmp_path:
+            with open(tmp_path, "w") as f:
+                f.write("new data")
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o640)
+
+    def test_convert_paths_records_errors(self):
+        path = os.path.join(self.out_dir, "broken_R1.txt")
+        with open(path, "w") as f:
+            f.write("not an MCC file\n")
+        results = convert_paths([path], self.out_dir, jobs=1, progress=False)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["status"], "error")
+        self.assertIsNotNone(results[0]["error"])
+
+    def test_convert_removed_file(self):
+        # Files can disappear between planning and conversion, e.g. on shares
+        path = os.path.join(self.out_dir, "gone_R1.txt")
+        output = os.path.join(self.out_dir, "gone_R1.parquet")
+        manifest = os.path.join(self.out_dir, "manifest.sqlite")
+        record = new_record(path, output)
+        self.assertEqual(record["status"], "error")
+        self.assertEqual((record["size"], record["mtime_ns"]), (None, None))
+        self.assertEqual(record["error_info"]["type"], "FileNotFoundError")
+
+        result = convert_file(path, output, manifest=manifest)
+        self.assertEqual(result["status"], "error")
+        self.assertTrue(result["error"].startswith("FileNotFoundError"))
+        with Manifest(manifest) as db:
+            self.assertIsNone(db.get(path))
+
+    def test_convert_paths_with_manifest(self):
+        source = os.path.join(self.out_dir, "src")
+        shutil.copytree(os.path.join(self.test_files_dir, "HFM"), source)
+        out = os.path.join(self.out_dir, "out")
+        manifest = os.path.join(self.out_dir, "manifest.sqlite")
+
+        first = convert_paths(
+            [source], out, jobs=2, chunksize=1, progress=False, manifest=manifest
+        )
+        self.assertEqual([r["status"] for r in first], ["ok", "ok"])
+        with Manifest(manifest) as db:
+            entry = db.get(first[0]["path"])
+        self.assertEqual(entry["parser"], "load_hfm_data")
+        self.assertEqual(entry["file_hash"], first[0]["file_hash"])
+        self.assertEqual(len(entry["file_hash"]), 128)
+
+        second = convert_paths([source], out, jobs=1, progress=False, manifest=manifest)
+        self.assertEqual([r["status"] for r in second], ["skipped", "skipped"])
+
+        # Modified files and files of a newer parser version are converted again
+        os.utime(first[0]["path"], ns=(0, 0))
+        third = convert_paths([source], out, jobs=1, progress=False, manifest=manifest)
+        self.assertEqual(sorted(r["status"] for r in third), ["ok", "skipped"])
+
+        versions = dict(loaders.PARSER_VERSIONS)
+        loaders.PARSER_VERSIONS["load_hfm_data"] += 1
+        try:
+            fourth = convert_paths(
+                [source], out, jobs=1, progress=False, manifest=manifest
+            )
+        finally:
+            loaders.PARSER_VERSIONS.update(versions)
+        self.assertEqual([r["status"] for r in fourth], ["ok", "ok"])
+
+    def test_manifest_output_and_options(self):
+        source = os.path.join(self.out_dir, "src")
+        shutil.copytree(os.path.join(self.test_files_dir, "HFM"), source)
+        manifest = os.path.join(self.out_dir, "manifest.sqlite")
+        out = os.path.join(self.out_dir, "out")
+        convert_paths([source], out, jobs=1, progress=False, manifest=manifest)
+
+        # Files are converted again to a new output directory
+        other = os.path.join(self.out_dir, "other")
+        moved = convert_paths(
+            [source], other, jobs=1, progress=False, manifest=manifest
+        )
+        self.assertEqual([r["status"] for r in moved], ["ok", "ok"])
+        self.assertEqual(len(os.listdir(other)), 2)
+
+        # and with options that change what is written
+        validated = convert_paths(
+            [source], other, jobs=1, progress=False, manifest=manifest, validate=True
+        )
+        self.assertEqual([r["status"] for r in validated], ["ok", "ok"])
+        again = convert_paths(
+            [source], other, jobs=1, progress=False, manifest=manifest, validate=True
+        )
+        self.assertEqual([r["status"] for r in again], ["skipped", "skipped"])
+        # but not with options that only affect the run
+        profiled = convert_paths(
+            [source],
+            other,
+            jobs=1,
+            progress=False,
+            manifest=manifest,
+            validate=True,
+            profile=True,
+        )
+        self.assertEqual([r["status"] for r in profiled], ["skipped", "skipped"])
+
+
+if __name__ == "__main__":
+    unittest.main()
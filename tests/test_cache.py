@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+from labetl import load
+from labetl.cache import TableCache, disable_cache, enable_cache, get_cache
+
+
+class CountingLoader:
+    def __init__(self, delay=0.0):
+        self.calls = 0
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def __call__(self, path, scale=1):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        with open(path, "rb") as file:
+            size = len(file.read())
+        return pa.table({"x": pa.array([float(scale)] * size)})
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.paths = []
+        for i in range(3):
+            path = os.path.join(self.root, f"run{i}.txt")
+            with open(path, "wb") as file:
+                file.write(b"0" * 100)
+            self.paths.append(path)
+
+    def tearDown(self):
+        disable_cache()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_hits_and_invalidation(self):
+        cache = TableCache()
+        loader = CountingLoader()
+        first = cache.load(self.paths[0], loader)
+        self.assertIs(cache.load(self.paths[0], loader), first)
+        self.assertEqual(loader.calls, 1)
+        # Other options are another entry
+        cache.load(self.paths[0], loader, scale=2)
+        self.assertEqual(loader.calls, 2)
+
+        # A rewritten file replaces its stale entry
+        with open(self.paths[0], "wb") as file:
+            file.write(b"0" * 50)
+        os.utime(self.paths[0], ns=(0, 0))
+        self.assertEqual(cache.load(self.paths[0], loader).num_rows, 50)
+        self.assertEqual(loader.calls, 3)
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 3))
+        self.assertEqual(stats["entries"], 2)
+        self.assertEqual(stats["nbytes"], 50 * 8 + 100 * 8)
+
+    def test_eviction(self):
+        # Room for two tables of 800 bytes
+        cache = TableCache(max_bytes=2000)
+        loader = CountingLoader()
+        for path in self.paths[:2]:
+            cache.load(path, loader)
+        cache.load(self.paths[0], loader)  # most recently used
+        cache.load(self.paths[2], loader)
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertLessEqual(cache.nbytes, 2000)
+        cache.load(self.paths[0], loader)
+        self.assertEqual(loader.calls, 3)
+        cache.load(self.paths[1], loader)
+        self.assertEqual(loader.calls, 4)
+
+        # Too large to cache at all
+        small = TableCache(max_bytes=10)
+        small.load(self.paths[0], loader)
+        self.assertEqual(small.stats()["entries"], 0)
+        self.assertEqual(small.nbytes, 0)
+
+    def test_single_flight(self):
+        cache = TableCache()
+        loader = CountingLoader(delay=0.2)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            tables = list(
+                executor.map(lambda _: cache.load(self.paths[0], loader), range(8))
+            )
+        self.assertEqual(loader.calls, 1)
+        self.assertTrue(all(table is tables[0] for table in tables))
+        stats = cache.stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["coalesced"] + stats["hits"], 7)
+
+        def failing(path):
+            raise ValueError("bad file")
+
+        with self.assertRaises(ValueError):
+            cache.load(self.paths[1], failing)
+        # Failures are not cached
+        self.assertEqual(cache.load(self.paths[1], loader).num_rows, 100)
+
+    def test_load(self):
+        path = "tests/test_files/MCC/Hemp_Sheet_MCC_30K_min_220112_R1.txt"
+        self.assertIsNone(get_cache())
+        self.assertIsNot(load(path), load(path))
+        cache = enable_cache()
+        table = load(path)
+        self.assertIs(load(path), table)
+        self.assertEqual(load(path, backend="polars").height, table.num_rows)
+        self.assertEqual(cache.stats()["misses"], 1)
+        disable_cache()
+        self.assertIsNot(load(path), table)
+
+
+if __name__ == "__main__":
+    unittest.main()
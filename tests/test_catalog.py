@@ -0,0 +1,127 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from labetl.catalog import find_runs, find_runs_in_range, read_catalog, update_catalog
+from labetl.faa_mcc_parser import load_mcc_data
+from labetl.netzsch_sta_parser import load_sta_data
+
+
+class TestCatalog(unittest.TestCase):
+    def setUp(self):
+        self.csv_file_path = (
+            "tests/test_files/STA/DF_FILED_VAL_STA_N2_10K_240211_R1.csv"
+        )
+        self.txt_file_path = "tests/test_files/MCC/Hemp_Sheet_MCC_30K_min_220112_R1.txt"
+        self.root = tempfile.mkdtemp()
+        self.data = os.path.join(self.root, "data")
+        self.catalog = os.path.join(self.root, "catalog.parquet")
+        os.makedirs(os.path.join(self.data, "STA"))
+        os.makedirs(os.path.join(self.data, "MCC"))
+        self.sta = os.path.join(self.data, "STA", "sta.parquet")
+        self.mcc = os.path.join(self.data, "MCC", "mcc.parquet")
+        pq.write_table(load_sta_data(self.csv_file_path), self.sta)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_catalog_row(self):
+        catalog = update_catalog(self.catalog, [self.data])
+        self.assertEqual(catalog.num_rows, 1)
+        row = catalog.to_pylist()[0]
+        self.assertEqual(row["path"], os.path.abspath(self.sta))
+        self.assertEqual(row["type"], "STA")
+        self.assertEqual(row["material"], "Douglas Fir")
+        self.assertEqual(row["operator"], "Grayson")
+        self.assertEqual(row["atmosphere"], "N2")
+        self.assertEqual(row["heating_rates"], [5.0, 10.0, 20.0, 40.0])
+        self.assertEqual(row["sample_mass"], 3.99)
+        self.assertEqual(len(row["file_hash"]), 128)
+        self.assertEqual(row["date_performed"].isoformat(), "2024-02-11T08:12:51+00:00")
+        self.assertEqual(row["num_rows"], pq.read_metadata(self.sta).num_rows)
+
+    def test_update_catalog(self):
+        update_catalog(self.catalog, [self.data])
+        pq.write_table(load_mcc_data(self.txt_file_path), self.mcc)
+        # Hidden files are writes in progress and are not cataloged
+        shutil.copy(self.mcc, os.path.join(self.data, "MCC", ".mcc.parquet.tmp"))
+
+        catalog = update_catalog(self.catalog, [self.data])
+        self.assertEqual(catalog["type"].to_pylist(), ["MCC", "STA"])
+        mcc = catalog.to_pylist()[0]
+        self.assertEqual(mcc["heating_rate"], 30.0)
+        self.assertEqual(mcc["sample_mass"], 4.64)
+
+        os.remove(self.sta)
+        catalog = update_catalog(self.catalog, [self.data])
+        self.assertEqual(catalog["type"].to_pylist(), ["MCC"])
+        self.assertEqual(read_catalog(self.catalog), catalog)
+
+    def test_find_runs(self):
+        pq.write_table(load_mcc_data(self.txt_file_path), self.mcc)
+        catalog = update_catalog(self.catalog, [self.data])
+        runs = find_runs(catalog, type="sta", atmosphere="N2", heating_rate=10)
+        self.assertEqual(runs["path"].to_pylist(), [os.path.abspath(self.sta)])
+        self.assertEqual(
+            find_runs(catalog, heating_rate=30)["type"].to_pylist(), ["MCC"]
+        )
+        self.assertEqual(find_runs(catalog, material="Oak").num_rows, 0)
+        with self.assertRaises(ValueError):
+            find_runs(catalog, color="red")
+
+    def test_column_stats(self):
+        table = load_sta_data(self.csv_file_path)
+        temperature = table.column("temperature").to_numpy()
+        stats = json.loads(table.schema.field("temperature").metadata[b"stats"])
+        self.assertEqual(stats["min"], temperature.min())
+        self.assertEqual(stats["max"], temperature.max())
+        self.assertAlmostEqual(stats["mean"], temperature.mean())
+        self.assertEqual(stats["count"], table.num_rows)
+        self.assertEqual(stats["null_count"], 0)
+        self.assertEqual(
+            table.schema.field("temperature").metadata[b"unit"], "°C".encode()
+        )
+
+        row = update_catalog(self.catalog, [self.data]).to_pylist()[0]
+        self.assertEqual(dict(row["column_stats"])["temperature"], stats)
+
+    def test_find_runs_in_range(self):
+        pq.write_table(load_mcc_data(self.txt_file_path), self.mcc)
+        # A file without statistics, e.g. written before they were added
+        plain = pa.table({"temperature": np.array([0.0, 1000.0])})
+        pq.write_table(plain, os.path.join(self.data, "plain.parquet"))
+        catalog = update_catalog(self.catalog, [self.data])
+
+        maxima = {
+            row["type"]: dict(row["column_stats"])["temperature"]["max"]
+            for row in catalog.to_pylist()
+            if row["type"]
+        }
+        # Files whose maximum is below the bound are pruned, on the bound kept
+        low = min(maxima.values())
+        self.assertEqual(
+            find_runs_in_range(catalog, "temperature", low=low)["type"].to_pylist(),
+            ["MCC", "STA"],
+        )
+        self.assertEqual(
+            find_runs_in_range(catalog, "temperature", low=low + 1)["type"].to_pylist(),
+            [max(maxima, key=maxima.get)],
+        )
+        self.assertEqual(
+            find_runs_in_range(catalog, "temperature", high=100)["type"].to_pylist(),
+            ["STA"],
+        )
+        self.assertEqual(
+            find_runs_in_range(catalog, "hrr", low=100)["type"].to_pylist(), ["MCC"]
+        )
+        self.assertEqual(find_runs_in_range(catalog, "hrr", low=1000).num_rows, 0)
+        self.assertEqual(find_runs_in_range(catalog, "nothing").num_rows, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
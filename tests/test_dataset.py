@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from labetl.batch import convert_paths
+from labetl.dataset import (
+    DEFAULT_PARTITION,
+    column_encodings,
+    open_dataset,
+    partition_values,
+    write_dataset_file,
+)
+from labetl.netzsch_sta_parser import load_sta_data
+from labetl.util import set_metadata
+
+
+class TestDataset(unittest.TestCase):
+    def setUp(self):
+        self.csv_file_path = (
+            "tests/test_files/STA/DF_FILED_VAL_STA_N2_10K_240211_R1.csv"
+        )
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_partition_values(self):
+        table = load_sta_data(self.csv_file_path)
+        values = partition_values(table)
+        self.assertEqual(
+            values,
+            {"type": "STA", "year": "2024", "month": "02", "material": "Douglas Fir"},
+        )
+
+    def test_partition_values_missing(self):
+        table = pa.table({"a": [1.0]})
+        values = partition_values(set_metadata(table, tbl_meta={"type": "MCC"}))
+        self.assertEqual(values["type"], "MCC")
+        self.assertEqual(values["year"], DEFAULT_PARTITION)
+        self.assertEqual(values["material"], DEFAULT_PARTITION)
+
+    def test_column_encodings(self):
+        table = pa.table(
+            {
+                "time": pa.array([0.0, 0.5, 1.0]),
+                "step": pa.array([1, 2, 3]),
+                "segment": pa.array([2, 1, 1]),
+                "gas": pa.array(["N2", "N2", "N2"]),
+            }
+        )
+        encodings, dictionary = column_encodings(table)
+        self.assertEqual(
+            encodings, {"time": "BYTE_STREAM_SPLIT", "step": "DELTA_BINARY_PACKED"}
+        )
+        self.assertEqual(dictionary, ["segment", "gas"])
+
+    def test_write_dataset_file(self):
+        table = load_sta_data(self.csv_file_path)
+        path = write_dataset_file(table, self.root, "run.parquet", row_group_size=500)
+        self.assertEqual(
+            os.path.relpath(path, self.root),
+            os.path.join(
+                "type=STA",
+                "year=2024",
+                "month=02",
+                "material=Douglas%20Fir",
+                "run.parquet",
+            ),
+        )
+        metadata = pq.read_metadata(path)
+        self.assertEqual(metadata.num_row_groups, 3)
+        self.assertEqual(
+            metadata.schema.to_arrow_schema().metadata, table.schema.metadata
+        )
+
+        result = open_dataset(self.root).to_table(
+            filter=(ds.field("material") == "Douglas Fir") & (ds.field("year") == 2024)
+        )
+        self.assertEqual(result.num_rows, table.num_rows)
+
+    def test_convert_paths_same_names(self):
+        # Files of the same name in different directories land in the same
+        # partition, so their directories are kept to tell them apart
+        sources = os.path.join(self.root, "sources")
+        for directory in ("a", "b"):
+            os.makedirs(os.path.join(sources, directory))
+            shutil.copy(self.csv_file_path, os.path.join(sources, directory))
+        out = os.path.join(self.root, "dataset")
+        results = convert_paths([sources], out, jobs=1, progress=False, dataset={})
+        outputs = sorted(result["output"] for result in results)
+        self.assertEqual(len(set(outputs)), 2)
+        partition = os.path.dirname(os.path.dirname(outputs[0]))
+        self.assertEqual(
+            [os.path.relpath(path, partition) for path in outputs],
+            [
+                os.path.join(directory, "DF_FILED_VAL_STA_N2_10K_240211_R1.parquet")
+                for directory in ("a", "b")
+            ],
+        )
+        table = open_dataset(out).to_table()
+        self.assertEqual(table.num_rows, 2 * load_sta_data(self.csv_file_path).num_rows)
+        self.assertEqual(set(table.column("type").to_pylist()), {"STA"})
+
+
+if __name__ == "__main__":
+    unittest.main()
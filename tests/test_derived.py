@@ -0,0 +1,97 @@
+import json
+import unittest
+
+import numpy as np
+from labetl.derived import add_derived, segment_ids, smooth_derivative
+from labetl.faa_mcc_parser import load_mcc_data
+from labetl.netzsch_sta_ngb_parser import load_ngb_data
+from labetl.netzsch_sta_parser import load_sta_data
+
+
+class TestDerived(unittest.TestCase):
+    def setUp(self):
+        self.csv_file_path = (
+            "tests/test_files/STA/DF_FILED_VAL_STA_N2_10K_240211_R1.csv"
+        )
+        self.ngb_file_path = "tests/test_files/STA/PT_Deck_Board_3_1.ngb-ss3"
+
+    def test_smooth_derivative(self):
+        rng = np.random.default_rng(0)
+        x = np.cumsum(rng.uniform(0.1, 1.0, 200))
+        segments = (x > x[100]).astype(float)
+        # Quadratics are fitted exactly, however uneven the sampling, and the
+        # kink between the segments does not leak into the fits
+        y = np.where(segments > 0, 3 * x**2, -x)
+        (dy,) = smooth_derivative(x, [y], window=7, segments=segments, chunk_size=16)
+        np.testing.assert_allclose(dy, np.where(segments > 0, 6 * x, -1.0), atol=1e-6)
+
+        # NaN points are left out of the fits of their neighbours
+        y_nan = 2 * x.copy()
+        y_nan[50] = np.nan
+        dy, dy_nan = smooth_derivative(x, [2 * x, y_nan], window=5)
+        np.testing.assert_allclose(dy, 2.0)
+        np.testing.assert_allclose(dy_nan, 2.0)
+
+        # Too few points for a quadratic
+        (dy,) = smooth_derivative(x[:2], [x[:2]])
+        self.assertTrue(np.isnan(dy).all())
+        with self.assertRaises(ValueError):
+            smooth_derivative(x, [y], window=4)
+
+    def test_segment_ids(self):
+        table = load_sta_data(self.csv_file_path)
+        np.testing.assert_array_equal(
+            segment_ids(table), table.column("segment").to_numpy()
+        )
+        # Three steps of the NGB temperature program: 10 min isothermal,
+        # a ramp to 750 °C and 5 min isothermal
+        segments = segment_ids(load_ngb_data(self.ngb_file_path))
+        self.assertEqual(sorted(set(segments)), [0.0, 1.0, 2.0])
+        self.assertTrue(np.all(np.diff(segments) >= 0))
+
+    def test_add_derived(self):
+        table = load_sta_data(self.csv_file_path)
+        derived = add_derived(table)
+        self.assertEqual(
+            derived.column_names, [*table.column_names, "dtg_smoothed", "ddsc_smoothed"]
+        )
+        dtg_meta = derived.schema.field("dtg_smoothed").metadata
+        self.assertEqual(dtg_meta[b"unit"], b"%/min")
+        ddsc_meta = derived.schema.field("ddsc_smoothed").metadata
+        self.assertEqual(ddsc_meta[b"unit"], "mW/mg/°C".encode())
+        # Statistics like those of the loader columns, NaN values skipped
+        dtg_stats = json.loads(dtg_meta[b"stats"])
+        self.assertEqual(dtg_stats["count"], table.num_rows)
+        self.assertAlmostEqual(
+            dtg_stats["min"], np.nanmin(derived.column("dtg_smoothed").to_numpy())
+        )
+        ddsc_stats = json.loads(ddsc_meta[b"stats"])
+        self.assertAlmostEqual(
+            ddsc_stats["max"], np.nanmax(derived.column("ddsc_smoothed").to_numpy())
+        )
+        self.assertEqual(
+            json.loads(derived.schema.metadata[b"derived"])["columns"],
+            ["dtg_smoothed", "ddsc_smoothed"],
+        )
+        self.assertEqual(
+            derived.schema.metadata[b"file_metadata"],
+            table.schema.metadata[b"file_metadata"],
+        )
+        # Close to the DTG computed by the instrument software
+        dtg = table.column("dtg").to_numpy()
+        smoothed = derived.column("dtg_smoothed").to_numpy()
+        self.assertLess(np.nanmedian(np.abs(smoothed - dtg)), 0.05)
+        # d(DSC)/dT is undefined in the isothermal segments, but not the ramps
+        ddsc = derived.column("ddsc_smoothed").to_numpy()
+        segments = table.column("segment").to_numpy()
+        self.assertTrue(np.isnan(ddsc[segments == 1]).all())
+        self.assertFalse(np.isnan(ddsc[np.isin(segments, [4, 6, 8])]).any())
+
+        ngb = add_derived(load_ngb_data(self.ngb_file_path))
+        self.assertIn("dtg_smoothed", ngb.column_names)
+        mcc = load_mcc_data("tests/test_files/MCC/Hemp_Sheet_MCC_30K_min_220112_R1.txt")
+        self.assertIs(add_derived(mcc), mcc)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from labetl.follow import FileFollower, follow, follow_to_parquet
+from labetl.loaders import load
+
+
+class TestFollow(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.files = [
+            "tests/test_files/MCC/Hemp_Sheet_MCC_30K_min_220112_R1.txt",
+            "tests/test_files/STA/DF_FILED_VAL_STA_N2_10K_240211_R1.csv",
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_poll(self):
+        for source in self.files:
+            with open(source, "rb") as file:
+                data = file.read()
+            path = os.path.join(self.root, os.path.basename(source))
+            open(path, "wb").close()
+            follower = FileFollower(path)
+            self.assertIsNone(follower.poll())
+
+            # Append the export in chunks that split lines
+            batches = []
+            for start in range(0, len(data), 5000):
+                with open(path, "ab") as file:
+                    file.write(data[start : start + 5000])
+                batch = follower.poll()
+                if batch is not None:
+                    batches.append(batch)
+                    # Each poll only reads from the end of the last full line
+                    self.assertLessEqual(follower.offset, start + 5000)
+            self.assertIsNone(follower.poll())
+            self.assertGreater(len(batches), 2)
+
+            expected = load(source)
+            table = pa.Table.from_batches(batches)
+            self.assertEqual(follower.num_rows, expected.num_rows)
+            self.assertEqual(table.column_names, expected.column_names)
+            self.assertTrue(table.equals(expected.select(table.column_names)))
+            self.assertEqual(
+                table.schema.field("time").metadata[b"unit"],
+                expected.schema.field("time").metadata[b"unit"],
+            )
+            self.assertEqual(
+                table.schema.metadata[b"type"], expected.schema.metadata[b"type"]
+            )
+
+        with open(path, "wb") as file:
+            file.write(data[:100])
+        with self.assertRaises(ValueError):
+            follower.poll()
+        with self.assertRaises(ValueError):
+            FileFollower(os.path.join(self.root, "run.ngb-ss3"))
+
+    def test_follow_to_parquet(self):
+        source = self.files[0]
+        path = os.path.join(self.root, "run.txt")
+        shutil.copy(source, path)
+        out = os.path.join(self.root, "run.parquet")
+        batches = []
+        rows = follow_to_parquet(
+            path, out, interval=0.01, idle_timeout=0.05, on_batch=batches.append
+        )
+        expected = load(source)
+        self.assertEqual(rows, expected.num_rows)
+        self.assertEqual(len(batches), 1)
+        self.assertTrue(pq.read_table(out).equals(expected))
+
+        # Stops as soon as the event is set
+        stop = threading.Event()
+        stop.set()
+        self.assertEqual(len(list(follow(path, interval=10, stop=stop))), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import subprocess
+import sys
+import unittest
+
+HEAVY = ("pyarrow", "polars", "numpy", "magic", "brukeropus", "dateutil")
+
+# Generous bound on the cumulative import time of `import labetl` in µs, well
+# above its cost without dependencies and well below any heavy dependency
+MAX_IMPORT_US = 100_000
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+    """Run a fresh interpreter with the package on its path."""
+    env = {**os.environ, "PYTHONPATH": os.path.abspath("src")}
+    return subprocess.run(
+        [sys.executable, *args], capture_output=True, text=True, env=env, check=True
+    )
+
+
+def import_times(statement: str) -> dict[str, int]:
+    """Run `python -X importtime` and get the cumulative time of each module."""
+    result = run_python("-X", "importtime", "-c", statement)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, module = line.split("|")
+        if cumulative.strip().isdigit():
+            times[module.strip()] = int(cumulative)
+    return times
+
+
+class TestImportTime(unittest.TestCase):
+    def imported(self, statement: str) -> set[str]:
+        """Get the top-level heavy dependencies imported by a statement.
+
+        `-X importtime` does not report modules imported through `importlib`,
+        which is how lazy modules are resolved, so check `sys.modules` instead.
+        """
+        result = run_python(
+            "-c", f"import sys; {statement}; print(' '.join(sys.modules))"
+        )
+        modules = result.stdout.splitlines()[-1].split()
+        return {m.split(".")[0] for m in modules} & set(HEAVY)
+
+    def test_import_labetl(self):
+        times = import_times("import labetl")
+        self.assertLess(times["labetl"], MAX_IMPORT_US)
+        self.assertEqual(self.imported("import labetl"), set())
+
+    def test_import_modules(self):
+        modules = [
+            "labetl.cli",
+            "labetl.loaders",
+            "labetl.batch",
+            "labetl.watch",
+            "labetl.ipc",
+            "labetl.netzsch_sta_parser",
+            "labetl.netzsch_sta_ngb_parser",
+            "labetl.faa_mcc_parser",
+            "labetl.deatak_cone_parser",
+            "labetl.fox_hfm_parser",
+            "labetl.bruker_ftir_parser",
+        ]
+        statement = "; ".join(f"import {m}" for m in modules)
+        self.assertEqual(self.imported(statement), set())
+
+    def test_first_use_imports(self):
+        imported = self.imported(
+            "import labetl; labetl.load('tests/test_files/MCC/"
+            "Hemp_Sheet_MCC_30K_min_220112_R1.txt')"
+        )
+        self.assertIn("pyarrow", imported)
+        self.assertNotIn("polars", imported)
+        self.assertNotIn("brukeropus", imported)
+
+
+if __name__ == "__main__":
+    unittest.main()
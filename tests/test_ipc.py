@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import pyarrow as pa
+from labetl.batch import convert_paths
+from labetl.faa_mcc_parser import load_mcc_data
+from labetl.ipc import read_ipc, write_ipc
+
+
+class TestIpc(unittest.TestCase):
+    def setUp(self):
+        self.txt_file_path = "tests/test_files/MCC/Hemp_Sheet_MCC_30K_min_220112_R1.txt"
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_round_trip(self):
+        table = load_mcc_data(self.txt_file_path)
+        for compression in ("none", "lz4", "zstd"):
+            path = os.path.join(self.root, f"{compression}.arrow")
+            self.assertEqual(write_ipc(table, path, compression), path)
+            read = read_ipc(path)
+            self.assertTrue(read.equals(table))
+            self.assertEqual(read.schema.metadata, table.schema.metadata)
+            self.assertEqual(read.schema.field("hrr").metadata[b"unit"], b"W/g")
+        with self.assertRaises(ValueError):
+            write_ipc(table, os.path.join(self.root, "x.arrow"), "gzip")
+
+    def test_memory_mapped_read(self):
+        table = load_mcc_data(self.txt_file_path)
+        path = write_ipc(table, os.path.join(self.root, "run.arrow"))
+        allocated = pa.total_allocated_bytes()
+        read = read_ipc(path, columns=["time", "hrr"])
+        # The buffers of an uncompressed file point into the memory map
+        self.assertEqual(pa.total_allocated_bytes(), allocated)
+        self.assertEqual(read.column_names, ["time", "hrr"])
+        self.assertEqual(read.column("hrr"), table.column("hrr"))
+
+    def test_convert_ipc(self):
+        results = convert_paths(
+            [self.txt_file_path],
+            self.root,
+            jobs=1,
+            progress=False,
+            ipc={"compression": "lz4"},
+        )
+        self.assertEqual(results[0]["status"], "ok")
+        self.assertTrue(results[0]["output"].endswith(".arrow"))
+        self.assertEqual(read_ipc(results[0]["output"]).num_rows, 2584)
+        with self.assertRaises(ValueError):
+            convert_paths([self.txt_file_path], self.root, dataset={}, ipc={})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from labetl.batch import convert_paths
+from labetl.faa_mcc_parser import load_mcc_data
+from labetl.mcc_summary import SUMMARY_SCHEMA, summarize_mcc, summarize_mcc_files
+from labetl.util import set_metadata
+
+
+class TestMCCSummary(unittest.TestCase):
+    def setUp(self):
+        self.txt_file_path = "tests/test_files/MCC/Hemp_Sheet_MCC_30K_min_220112_R1.txt"
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_summarize(self):
+        table = load_mcc_data(self.txt_file_path)
+        # The same run in W rather than W/g, normalized by its sample mass
+        absolute = set_metadata(
+            pa.table(
+                {
+                    "time": table.column("time"),
+                    "temperature": table.column("temperature"),
+                    "hrr": pc.multiply(table.column("hrr"), 2e-3),
+                }
+            ),
+            col_meta={"hrr": {"unit": "W"}},
+            tbl_meta={
+                "file_metadata": {"sample_mass": {"value": 2.0, "unit": "mg"}},
+                "type": "MCC",
+            },
+        )
+        summary = summarize_mcc([table, table.slice(0, 0), absolute])
+        self.assertEqual(summary.schema, SUMMARY_SCHEMA)
+        rows = summary.to_pylist()
+
+        hrr = table.column("hrr").to_numpy()
+        time = table.column("time").to_numpy()
+        peak = int(np.argmax(hrr))
+        run = rows[0]
+        self.assertEqual(run["run"], "Hemp_Sheet_MCC_30K_min_220112_R1")
+        self.assertEqual(run["sample_mass"], 4.64)
+        self.assertEqual(run["phrr"], hrr[peak])
+        self.assertEqual(run["peak_time"], time[peak])
+        self.assertEqual(
+            run["peak_temperature"], table.column("temperature")[peak].as_py()
+        )
+        self.assertAlmostEqual(run["thr"], np.trapezoid(hrr, time) / 1000)
+        self.assertAlmostEqual(run["hrc"], hrr[peak] / 0.5)
+        self.assertAlmostEqual(run["heat_release"], run["thr"] * 4.64)
+
+        self.assertEqual(rows[1]["num_rows"], 0)
+        self.assertIsNone(rows[1]["phrr"])
+        self.assertIsNone(rows[1]["thr"])
+
+        self.assertAlmostEqual(rows[2]["phrr"], run["phrr"])
+        self.assertAlmostEqual(rows[2]["thr"], run["thr"])
+        # No heating rate in the metadata or the columns
+        self.assertIsNone(rows[2]["hrc"])
+
+    def test_summarize_files(self):
+        sources = [
+            "tests/test_files/MCC",
+            "tests/test_files/STA/DF_FILED_VAL_STA_N2_10K_240211_R1.csv",
+        ]
+        convert_paths(sources, self.root, jobs=1, progress=False)
+        summary = summarize_mcc_files([self.root])
+        self.assertEqual(summary.num_rows, 1)
+        self.assertEqual(
+            summary.column("path")[0].as_py(),
+            os.path.join(self.root, "Hemp_Sheet_MCC_30K_min_220112_R1.parquet"),
+        )
+        self.assertEqual(summary.column("phrr")[0].as_py(), 139.58)
+
+
+if __name__ == "__main__":
+    unittest.main()
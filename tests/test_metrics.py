@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+import urllib.request
+
+from labetl.batch import convert_paths
+from labetl.metrics import Metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.out_dir, ignore_errors=True)
+
+    def test_observe(self):
+        metrics = Metrics()
+        metrics.observe(
+            {"parser": "load_mcc_data", "status": "ok", "size": 100, "duration": 0.2},
+            manifest=True,
+        )
+        metrics.observe(
+            {
+                "parser": "load_mcc_data",
+                "status": "error",
+                "size": 10,
+                "duration": 0.01,
+                "error": "ValueError: bad header",
+            },
+            manifest=True,
+        )
+        metrics.observe({"parser": "load_mcc_data", "status": "skipped"})
+        text = metrics.render()
+        self.assertIn('labetl_files_total{parser="load_mcc_data",status="ok"} 1', text)
+        self.assertIn('labetl_bytes_total{parser="load_mcc_data"} 100', text)
+        self.assertIn(
+            'labetl_errors_total{parser="load_mcc_data",exception="ValueError"} 1',
+            text,
+        )
+        self.assertIn('labetl_cache_requests_total{result="hit"} 1', text)
+        self.assertIn('labetl_cache_requests_total{result="miss"} 2', text)
+        self.assertIn(
+            'labetl_conversion_seconds_bucket{parser="load_mcc_data",le="0.01"} 1',
+            text,
+        )
+        self.assertIn(
+            'labetl_conversion_seconds_bucket{parser="load_mcc_data",le="0.25"} 2',
+            text,
+        )
+        self.assertIn('labetl_conversion_seconds_count{parser="load_mcc_data"} 2', text)
+
+    def test_convert_paths_textfile(self):
+        metrics = Metrics()
+        results = convert_paths(
+            ["tests/test_files/HFM"],
+            self.out_dir,
+            jobs=2,
+            chunksize=1,
+            progress=False,
+            metrics=metrics,
+        )
+        path = os.path.join(self.out_dir, "labetl.prom")
+        metrics.write_textfile(path)
+        with open(path) as f:
+            text = f.read()
+        self.assertIn(
+            f'labetl_files_total{{parser="load_hfm_data",status="ok"}} {len(results)}',
+            text,
+        )
+        self.assertFalse([f for f in os.listdir(self.out_dir) if f.endswith(".tmp")])
+
+    def test_serve(self):
+        metrics = Metrics()
+        metrics.observe({"parser": "load_sta_data", "status": "ok", "size": 1})
+        server = metrics.serve(0)
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+            with urllib.request.urlopen(url) as response:
+                body = response.read().decode("utf-8")
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(body, metrics.render())
+
+
+if __name__ == "__main__":
+    unittest.main()
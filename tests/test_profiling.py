@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+
+from labetl.batch import convert_file
+from labetl.faa_mcc_parser import load_mcc_data
+from labetl.profiling import hot_stages, profile, profiled, stage
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.txt_file_path = "tests/test_files/MCC/Hemp_Sheet_MCC_30K_min_220112_R1.txt"
+
+    def test_stage_disabled(self):
+        with stage("anything") as s:
+            self.assertIsNone(s)
+
+    def test_profile_loader(self):
+        with profile(memory=True) as p:
+            load_mcc_data(self.txt_file_path)
+        stages = p.to_dict()["stages"]
+        for name in ("detect_encoding", "find_header", "read_data", "get_hash"):
+            self.assertIn(name, stages)
+            self.assertEqual(stages[name]["calls"], 1)
+            self.assertGreaterEqual(stages[name]["wall"], 0.0)
+        self.assertGreater(stages["read_data"]["bytes"], 0)
+        self.assertEqual(stages["get_hash"]["bytes"], stages["read_data"]["bytes"])
+        self.assertGreater(stages["read_data"]["peak"], 0)
+
+    def test_convert_file_memory(self):
+        # Memory tracing slows the loaders down, so it is a separate opt-in
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "run.parquet")
+            timed = convert_file(self.txt_file_path, output, profile=True)
+            traced = convert_file(
+                self.txt_file_path, output, profile=True, profile_memory=True
+            )
+        self.assertEqual(timed["profile"]["stages"]["read_data"]["peak"], 0)
+        self.assertGreater(traced["profile"]["stages"]["read_data"]["peak"], 0)
+
+    def test_nested_peak(self):
+        @profiled("inner")
+        def allocate():
+            return bytearray(1_000_000)
+
+        with profile(memory=True) as p:
+            with stage("outer"):
+                allocate()
+                with stage("small"):
+                    pass
+        stages = p.stages
+        self.assertGreaterEqual(stages["inner"]["peak"], 1_000_000)
+        self.assertGreaterEqual(stages["outer"]["peak"], stages["inner"]["peak"])
+        self.assertLess(stages["small"]["peak"], 1_000_000)
+
+    def test_hot_stages(self):
+        records = [
+            {
+                "status": "ok",
+                "duration": 2.0,
+                "profile": {"stages": {"a": _stage(1.0), "b": _stage(0.5)}},
+            },
+            {
+                "status": "error",
+                "duration": 3.0,
+                "profile": {"stages": {"b": _stage(2.0)}},
+            },
+            # Skipped files keep the duration of the run that converted them
+            {"status": "skipped", "duration": 5.0},
+        ]
+        stages = hot_stages(records)
+        self.assertEqual([s["stage"] for s in stages], ["b", "a"])
+        self.assertEqual(stages[0]["calls"], 2)
+        self.assertAlmostEqual(stages[0]["share"], 0.5)
+        self.assertAlmostEqual(stages[1]["share"], 0.2)
+
+
+def _stage(wall):
+    return {"calls": 1, "wall": wall, "cpu": wall, "bytes": 0, "peak": 0}
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from labetl import read
+from labetl.batch import convert_paths
+from labetl.dataset import open_dataset
+from labetl.pyramid import (
+    build_pyramid,
+    downsample,
+    key_column,
+    pyramid_levels,
+    pyramid_path,
+    read_pyramid,
+    write_pyramid,
+)
+
+
+class TestPyramid(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        time = np.arange(10_000, dtype=np.float64)
+        signal = np.sin(time / 500)
+        signal[5_003] = 10.0  # A single sample spike must survive downsampling
+        self.table = pa.table(
+            {
+                "time": time,
+                "dsc": pa.array(signal, type=pa.float32()),
+                "segment": pa.array(time // 5_000, type=pa.int64()),
+            }
+        )
+        self.path = os.path.join(self.root, "run.parquet")
+        pq.write_table(self.table, self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_downsample(self):
+        table = pa.table(
+            {"x": [0.0, 1.0, 2.0, 3.0, 4.0], "y": [3.0, None, 1.0, 5.0, 2.0]}
+        )
+        # Whole rows are taken at the extremes of the key column
+        down = downsample(table, 2, key="y")
+        self.assertEqual(down.column("x").to_pylist(), [2.0, 3.0, 4.0, 4.0])
+        self.assertEqual(down.column("y").to_pylist(), [1.0, 5.0, 2.0, 2.0])
+        down = downsample(table, 2)
+        self.assertEqual(down.column("x").to_pylist(), [0.0, 3.0, 4.0, 4.0])
+        self.assertEqual(down.column("y").to_pylist(), [3.0, 5.0, 2.0, 2.0])
+
+        self.assertEqual(key_column(self.table), "time")
+        typed = self.table.replace_schema_metadata({"type": "STA"})
+        self.assertEqual(key_column(typed), "dsc")
+
+    def test_build_pyramid(self):
+        levels = build_pyramid(self.table, key="dsc")
+        self.assertEqual([f for f, _ in levels], [4, 16, 64])
+        for factor, level in levels:
+            self.assertEqual(level.schema, self.table.schema)
+            self.assertAlmostEqual(level.num_rows, 10_000 / factor, delta=2)
+            self.assertEqual(max(level.column("dsc").to_pylist()), 10.0)
+            # The spike keeps its time
+            spike = level.column("dsc").to_pylist().index(10.0)
+            self.assertEqual(level.column("time")[spike].as_py(), 5_003)
+        self.assertEqual(build_pyramid(self.table.slice(0, 10)), [])
+        with self.assertRaises(ValueError):
+            build_pyramid(self.table, (4, 6))
+
+    def test_read_pyramid(self):
+        sidecar = write_pyramid(self.table, self.path, key="dsc")
+        self.assertEqual(sidecar, os.path.join(self.root, "_pyramid", "run.pyramid"))
+        self.assertEqual(
+            [level["factor"] for level in pyramid_levels(self.path)], [1, 4, 16, 64]
+        )
+        # 2,000 rows in the window: about 31 at 1/64, 125 at 1/16, 500 at 1/4
+        window = {"start": 4_000, "end": 5_999}
+        for budget, rows in [(20, 31), (100, 125), (200, 500), (1_000, 2_000)]:
+            table = read_pyramid(self.path, budget, **window)
+            self.assertAlmostEqual(table.num_rows, rows, delta=2)
+        table = read_pyramid(self.path, 100, columns=["dsc"], **window)
+        self.assertEqual(table.column_names, ["dsc", "time"])
+        self.assertEqual(max(table.column("dsc").to_pylist()), 10.0)
+
+    def test_convert_pyramid(self):
+        results = convert_paths(
+            ["tests/test_files/MCC/Hemp_Sheet_MCC_30K_min_220112_R1.txt"],
+            self.root,
+            jobs=1,
+            progress=False,
+            pyramid=[4, 16],
+        )
+        self.assertEqual(results[0]["status"], "ok")
+        levels = pyramid_levels(results[0]["output"])
+        self.assertEqual([level["factor"] for level in levels], [1, 4, 16])
+        with self.assertRaises(ValueError):
+            convert_paths([], self.root, pyramid=[4], ipc={})
+
+    def test_dataset_pyramid(self):
+        out = os.path.join(self.root, "dataset")
+        results = convert_paths(
+            ["tests/test_files/MCC/Hemp_Sheet_MCC_30K_min_220112_R1.txt"],
+            out,
+            jobs=1,
+            progress=False,
+            dataset={},
+            pyramid=[4, 16],
+        )
+        self.assertEqual(results[0]["status"], "ok")
+        self.assertTrue(os.path.exists(pyramid_path(results[0]["output"])))
+        # The sidecars are not read as part of the dataset
+        self.assertEqual(open_dataset(out).count_rows(), 2584)
+        partition = os.path.dirname(results[0]["output"])
+        self.assertEqual(read(partition).num_rows, 2584)
+        table = read_pyramid(results[0]["output"], 100, column="time")
+        self.assertLess(table.num_rows, 2584)
+
+
+if __name__ == "__main__":
+    unittest.main()
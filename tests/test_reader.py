@@ -0,0 +1,83 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from labetl import load, read
+from labetl.ipc import write_ipc
+from labetl.reader import (
+    LazyMetadata,
+    column_metadata,
+    metadata,
+    read_schema,
+    units,
+)
+
+
+class TestReader(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.table = load("tests/test_files/MCC/Hemp_Sheet_MCC_30K_min_220112_R1.txt")
+        self.parquet_path = os.path.join(self.root, "run.parquet")
+        pq.write_table(self.table, self.parquet_path)
+        self.ipc_path = write_ipc(self.table, os.path.join(self.root, "run.arrow"))
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_read(self):
+        expected = self.table.filter(pc.field("temperature") > 500).select(
+            ["time", "hrr"]
+        )
+        for path in (self.parquet_path, self.ipc_path):
+            self.assertTrue(read(path).equals(self.table))
+            table = read(
+                path, columns=["time", "hrr"], filters=[("temperature", ">", 500)]
+            )
+            self.assertTrue(table.equals(expected))
+            self.assertEqual(table.schema.metadata, self.table.schema.metadata)
+            table = read(path, filters=pc.field("temperature") > 500)
+            self.assertEqual(table.num_rows, expected.num_rows)
+
+        # Directories are read as hive-partitioned datasets
+        partition = os.path.join(self.root, "dataset", "type=MCC")
+        os.makedirs(partition)
+        shutil.copy(self.parquet_path, partition)
+        table = read(os.path.join(self.root, "dataset"), columns=["time", "type"])
+        self.assertEqual(table.num_rows, self.table.num_rows)
+        self.assertEqual(table.column("type")[0].as_py(), "MCC")
+
+    def test_metadata(self):
+        meta = metadata(self.table)
+        self.assertIsInstance(meta, LazyMetadata)
+        self.assertEqual(set(meta), {"file_metadata", "type"})
+        self.assertEqual(meta._decoded, {})
+        self.assertEqual(meta["type"], "MCC")
+        file_metadata = meta["file_metadata"]
+        self.assertEqual(
+            file_metadata, json.loads(self.table.schema.metadata[b"file_metadata"])
+        )
+        # Decoded once and cached
+        self.assertIs(meta["file_metadata"], file_metadata)
+        self.assertNotIn("stats", meta)
+        self.assertEqual(meta.raw("type"), b"MCC")
+
+        hrr = column_metadata(read_schema(self.parquet_path), "hrr")
+        self.assertEqual(hrr["unit"], "W/g")
+        self.assertEqual(hrr["stats"]["count"], self.table.num_rows)
+        self.assertEqual(
+            dict(metadata(read_schema(self.ipc_path))),
+            {key: meta[key] for key in meta},
+        )
+
+        self.assertEqual(units(self.table)["temperature"], "°C")
+        self.assertEqual(list(units(self.table)), self.table.column_names)
+        hfm = load("tests/test_files/HFM/Black_PMMA_HFM_Dry_conductivity_211115_R1.tst")
+        self.assertTrue(any(unit is not None for unit in units(hfm).values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from labetl.replicates import (
+    aggregate_files,
+    aggregate_replicates,
+    group_replicates,
+    parse_run_name,
+)
+from labetl.util import set_metadata
+
+
+def make_run(start: float, stop: float, rows: int, slope: float) -> pa.Table:
+    """Make a run with a mass column linear in temperature."""
+    temperature = np.linspace(start, stop, rows)
+    table = pa.table({"temperature": temperature, "mass": slope * temperature})
+    return set_metadata(
+        table,
+        col_meta={"temperature": {"unit": "C"}, "mass": {"unit": "%"}},
+        tbl_meta={"type": "STA"},
+    )
+
+
+class TestReplicates(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_parse_run_name(self):
+        self.assertEqual(
+            parse_run_name("data/Hyundai_KM8K_Carpet_STA_N2_10K_240711_R3.parquet"),
+            ("Hyundai_KM8K_Carpet_STA_N2_10K", 3),
+        )
+        self.assertEqual(
+            parse_run_name("Hemp_Sheet_MCC_30K_min_220112_R1.txt"),
+            ("Hemp_Sheet_MCC_30K_min", 1),
+        )
+        self.assertEqual(
+            parse_run_name("Birch_0.125_Cone_50kW_230101_r2.csv"),
+            ("Birch_0.125_Cone_50kW", 2),
+        )
+        self.assertIsNone(parse_run_name("PT_Deck_Board_3_1.ngb-ss3"))
+        # Outputs that kept the extension of their source
+        self.assertEqual(parse_run_name("out/run_R1.ngb-ss3.parquet"), ("run", 1))
+        self.assertEqual(
+            parse_run_name("Jacket_ATR_240517_R2.0.arrow"), ("Jacket_ATR", 2)
+        )
+        self.assertEqual(
+            group_replicates(["B_240101_R2.csv", "B_240102_R1.csv", "A_R1.csv", "C"]),
+            {"A": ["A_R1.csv"], "B": ["B_240102_R1.csv", "B_240101_R2.csv"]},
+        )
+
+    def test_aggregate(self):
+        groups = {
+            "a": [make_run(0, 100, 50, 1.0), make_run(0, 100, 80, 3.0)],
+            "b": [make_run(50, 150, 30, 2.0)],
+            "c": [make_run(0, 10, 20, 1.0), make_run(5, 20, 20, 1.0)],
+        }
+        table = aggregate_replicates(groups, points=11)
+        self.assertEqual(
+            table.column_names,
+            ["group", "temperature", "mass_mean", "mass_std", "mass_count"],
+        )
+        self.assertEqual(table.num_rows, 33)
+        self.assertEqual(table.schema.field("mass_mean").metadata, {b"unit": b"%"})
+        self.assertEqual(
+            json.loads(table.schema.metadata[b"replicates"]),
+            {"x": "temperature", "points": 11},
+        )
+        data = table.to_pydict()
+        a = slice(0, 11)
+        np.testing.assert_allclose(data["temperature"][a], np.linspace(0, 100, 11))
+        np.testing.assert_allclose(data["mass_mean"][a], np.linspace(0, 200, 11))
+        # The sample std of x and 3x is sqrt(2) x
+        np.testing.assert_allclose(
+            data["mass_std"][a], np.sqrt(2) * np.linspace(0, 100, 11)
+        )
+        self.assertEqual(data["mass_count"][a], [2] * 11)
+
+        b = slice(11, 22)
+        np.testing.assert_allclose(data["mass_mean"][b], np.linspace(100, 300, 11))
+        self.assertTrue(all(np.isnan(data["mass_std"][b])))
+        self.assertEqual(data["mass_count"][b], [1] * 11)
+
+        # The grid spans both runs, so only the overlap has two replicates
+        c = slice(22, 33)
+        np.testing.assert_allclose(data["temperature"][c], np.linspace(0, 20, 11))
+        self.assertEqual(data["mass_count"][c], [1, 1, 1, 2, 2, 2, 1, 1, 1, 1, 1])
+        np.testing.assert_allclose(data["mass_mean"][c], np.linspace(0, 20, 11))
+
+        with self.assertRaises(ValueError):
+            aggregate_replicates({})
+
+    def test_aggregate_files(self):
+        paths = []
+        for i, slope in enumerate((1.0, 2.0, 3.0), start=1):
+            path = os.path.join(self.root, f"Pine_STA_N2_10K_240101_R{i}.parquet")
+            pq.write_table(make_run(20, 600, 100 + i, slope), path)
+            paths.append(path)
+        single = os.path.join(self.root, "Oak_STA_N2_10K_240101_R1.parquet")
+        pq.write_table(make_run(20, 600, 100, 1.0), single)
+
+        table = aggregate_files(
+            [single, *paths], columns=["mass"], points=50, min_replicates=2
+        )
+        self.assertEqual(
+            table.column("group").unique().to_pylist(), ["Pine_STA_N2_10K"]
+        )
+        np.testing.assert_allclose(
+            table.column("mass_mean").to_numpy(), 2 * np.linspace(20, 600, 50)
+        )
+        replicates = json.loads(table.schema.metadata[b"replicates"])
+        self.assertEqual(replicates["groups"], {"Pine_STA_N2_10K": paths})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from labetl.batch import convert_paths
+from labetl.netzsch_sta_parser import load_sta_data
+from labetl.schema import SCHEMAS, conform
+from labetl.util import set_metadata
+
+
+class TestSchema(unittest.TestCase):
+    def setUp(self):
+        self.csv_file_path = (
+            "tests/test_files/STA/DF_FILED_VAL_STA_N2_10K_240211_R1.csv"
+        )
+
+    def test_conform(self):
+        table = load_sta_data(self.csv_file_path)
+        conformed = conform(table, precision="float32")
+        names = [name for name, _, _ in SCHEMAS["STA"]]
+        self.assertEqual(conformed.column_names, names)
+        self.assertEqual(conformed.num_rows, table.num_rows)
+        self.assertEqual(conformed.schema.field("time").type, pa.float64())
+        self.assertEqual(conformed.schema.field("temperature").type, pa.float64())
+        self.assertEqual(conformed.schema.field("mass").type, pa.float32())
+        self.assertEqual(conformed.schema.field("segment").type, pa.int64())
+        self.assertEqual(conformed.schema.field("mass").metadata[b"unit"], b"%")
+        self.assertEqual(conformed.column("sample_mass").null_count, table.num_rows)
+        self.assertEqual(conformed.schema.metadata[b"type"], b"STA")
+        self.assertEqual(conformed.schema.metadata[b"schema_version"], b"1")
+
+    def test_conform_aliases_and_extra(self):
+        table = pa.table(
+            {
+                "extra": pa.array([1.0, 2.0]),
+                "heat_release_rate": pa.array([3.0, 4.0]),
+                "time": pa.array([0, 1]),
+            }
+        )
+        table = set_metadata(table, tbl_meta={"type": "MCC"})
+        conformed = conform(table, precision="float32", time_precision="float32")
+        self.assertEqual(conformed.column_names[:3], ["time", "temperature", "hrr"])
+        self.assertEqual(conformed.column_names[-1], "extra")
+        self.assertEqual(conformed.schema.field("time").type, pa.float32())
+        self.assertEqual(conformed.schema.field("extra").type, pa.float32())
+        self.assertEqual(conformed.column("hrr").to_pylist(), [3.0, 4.0])
+        self.assertNotIn("extra", conform(table, drop_extra=True).column_names)
+
+    def test_conform_errors(self):
+        table = set_metadata(pa.table({"a": [1.0]}), tbl_meta={"type": "XRD"})
+        with self.assertRaises(ValueError):
+            conform(table)
+        with self.assertRaises(ValueError):
+            conform(table, type="STA", precision="float16")
+
+    def test_convert_conformed(self):
+        out_dir = tempfile.mkdtemp()
+        try:
+            results = convert_paths(
+                [self.csv_file_path],
+                out_dir,
+                jobs=1,
+                progress=False,
+                schema={"precision": "float32"},
+            )
+            self.assertEqual(results[0]["status"], "ok")
+            schema = pq.read_schema(results[0]["output"])
+            self.assertEqual(schema.field("dsc").type, pa.float32())
+            self.assertEqual(schema.names[0], "time")
+            self.assertTrue(os.path.getsize(results[0]["output"]) > 0)
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
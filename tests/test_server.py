@@ -0,0 +1,145 @@
+import asyncio
+import http.client
+import json
+import unittest
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from labetl.loaders import load
+from labetl.server import ConversionServer, content_disposition, detect_suffix
+
+
+def request(port, method, target, body=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    try:
+        connection.request(method, target, body=body)
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        connection.close()
+
+
+class TestConversionServer(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.files = [
+            "tests/test_files/MCC/Hemp_Sheet_MCC_30K_min_220112_R1.txt",
+            "tests/test_files/STA/DF_FILED_VAL_STA_N2_10K_240211_R1.csv",
+            "tests/test_files/STA/PT_Deck_Board_3_1.ngb-ss3",
+            "tests/test_files/Cone/Asphalt_Shingle_Cone_HF25_220415_R1.XLSM",
+            "tests/test_files/HFM/Black_PMMA_HFM_Dry_conductivity_211115_R1.tst",
+            "tests/test_files/FTIR/Bmore_Jacket_CSTM_Stripe_ATR_240517_R2.0",
+        ]
+
+    async def asyncSetUp(self):
+        self.server = ConversionServer(port=0, jobs=2, max_upload=1 << 24)
+        self.port = await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def post(self, path, target):
+        with open(path, "rb") as file:
+            data = file.read()
+        return await asyncio.to_thread(request, self.port, "POST", target, data)
+
+    def test_detect_suffix(self):
+        for path in self.files:
+            with open(path, "rb") as file:
+                data = file.read()
+            suffix = path.rsplit(".", 1)[1].lower()
+            self.assertEqual(detect_suffix(data), f".{suffix}")
+        self.assertIsNone(detect_suffix(b"hello"))
+
+    async def test_convert(self):
+        path = self.files[0]
+        expected = load(path)
+        status, headers, body = await self.post(path, "/convert?filename=Hemp_R1.txt")
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["Content-Type"], "application/vnd.apache.parquet")
+        self.assertIn('filename="Hemp_R1.parquet"', headers["Content-Disposition"])
+        table = pq.read_table(pa.BufferReader(body))
+        self.assertTrue(table.equals(expected))
+        meta = json.loads(table.schema.metadata[b"file_metadata"])
+        self.assertEqual(meta["file_hash"]["file"], "Hemp_R1.txt")
+
+        # Detected from the contents, as an Arrow IPC file
+        status, headers, body = await self.post(self.files[2], "/convert?format=arrow")
+        self.assertEqual(status, 200)
+        table = ipc.open_file(pa.BufferReader(body)).read_all()
+        self.assertTrue(table.equals(load(self.files[2])))
+
+    async def test_content_disposition(self):
+        self.assertEqual(
+            content_disposition("run.parquet"), 'attachment; filename="run.parquet"'
+        )
+        self.assertEqual(
+            content_disposition('a"b\\c\r\nd.parquet'),
+            'attachment; filename="abcd.parquet"',
+        )
+        status, headers, _ = await self.post(
+            self.files[0], "/convert?filename=Probe_%CE%B1%0d%0aX-Injected:%201.txt"
+        )
+        self.assertEqual(status, 200)
+        self.assertNotIn("X-Injected", headers)
+        self.assertEqual(
+            headers["Content-Disposition"],
+            'attachment; filename="Probe__X-Injected: 1.parquet"; '
+            "filename*=UTF-8''Probe_%CE%B1X-Injected%3A%201.parquet",
+        )
+
+    async def test_broken_pool(self):
+        status, _, _ = await self.post(self.files[0], "/convert")
+        self.assertEqual(status, 200)
+        for process in list(self.server._executor._processes.values()):
+            process.kill()
+            process.join()
+        # The conversion that finds the pool broken is refused, and the pool
+        # is replaced for the next ones
+        status, headers, _ = await self.post(self.files[0], "/convert")
+        self.assertEqual(status, 503)
+        self.assertEqual(headers["Retry-After"], "1")
+        status, _, _ = await self.post(self.files[0], "/convert")
+        self.assertEqual(status, 200)
+
+    async def test_errors(self):
+        status, _, body = await asyncio.to_thread(
+            request, self.port, "POST", "/convert", b"not an instrument file"
+        )
+        self.assertEqual(status, 415)
+        self.assertIn("error", json.loads(body))
+        status, _, _ = await asyncio.to_thread(
+            request, self.port, "POST", "/convert?filename=run.txt", b"garbage\n"
+        )
+        self.assertEqual(status, 422)
+        status, _, _ = await self.post(self.files[0], "/convert?format=csv")
+        self.assertEqual(status, 400)
+        status, _, _ = await asyncio.to_thread(request, self.port, "GET", "/convert")
+        self.assertEqual(status, 405)
+        status, _, _ = await asyncio.to_thread(request, self.port, "GET", "/nope")
+        self.assertEqual(status, 404)
+
+        self.server.max_upload = 10
+        status, _, _ = await self.post(self.files[0], "/convert")
+        self.assertEqual(status, 413)
+
+    async def test_backpressure(self):
+        status, _, body = await asyncio.to_thread(request, self.port, "GET", "/health")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body), {"pending": 0, "max_pending": 4})
+
+        # Uploads beyond the queue limit are refused, not queued
+        self.server.max_pending = 1
+        results = await asyncio.gather(
+            *(self.post(self.files[2], "/convert") for _ in range(6))
+        )
+        statuses = sorted(status for status, _, _ in results)
+        self.assertIn(200, statuses)
+        self.assertIn(503, statuses)
+        refused = next(headers for status, headers, _ in results if status == 503)
+        self.assertEqual(refused["Retry-After"], "1")
+        self.assertEqual(self.server.pending, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
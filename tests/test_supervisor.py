@@ -0,0 +1,112 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from labetl.batch import convert_paths
+from labetl.supervisor import SupervisedWorker, quarantine_file
+
+
+class Exit:
+    """Kills the worker process when it unpickles its options."""
+
+    def __reduce__(self):
+        return os._exit, (3,)
+
+
+class TestSupervisor(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.src = os.path.join(self.root, "src")
+        self.out = os.path.join(self.root, "out")
+        self.quarantine = os.path.join(self.root, "quarantine")
+        os.makedirs(os.path.join(self.src, "MCC"))
+        shutil.copy(
+            "tests/test_files/MCC/Hemp_Sheet_MCC_30K_min_220112_R1.txt",
+            os.path.join(self.src, "MCC"),
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_timeout(self):
+        # Reading a FIFO without a writer blocks forever, like a hung parser
+        os.mkfifo(os.path.join(self.src, "MCC", "hang.txt"))
+        start = time.perf_counter()
+        results = convert_paths(
+            [self.src],
+            self.out,
+            jobs=2,
+            progress=False,
+            timeout=2,
+            quarantine=self.quarantine,
+        )
+        self.assertLess(time.perf_counter() - start, 30)
+        results = {os.path.basename(r["path"]): r for r in results}
+        self.assertEqual(
+            results["Hemp_Sheet_MCC_30K_min_220112_R1.txt"]["status"], "ok"
+        )
+        hung = results["hang.txt"]
+        self.assertEqual(hung["status"], "error")
+        self.assertEqual(hung["error_info"]["kind"], "timeout")
+        self.assertTrue(hung["error"].startswith("TimeoutError"))
+        self.assertEqual(
+            hung["quarantine"], os.path.join(self.quarantine, "MCC", "hang.txt")
+        )
+
+    def test_memory_limit(self):
+        worker = SupervisedWorker({}, timeout=60, memory_limit=150 * 2**20)
+        try:
+            result = worker.convert(
+                "tests/test_files/STA/PT_Deck_Board_3_1.ngb-ss3",
+                os.path.join(self.out, "run.parquet"),
+            )
+        finally:
+            worker.close()
+        self.assertEqual(result["status"], "error")
+        self.assertIn(result["error_info"]["kind"], ("memory", "crashed"))
+
+    def test_startup_crash(self):
+        # Run-only options are not hashed into the record
+        worker = SupervisedWorker({"profile": Exit()}, timeout=60)
+        path = "tests/test_files/MCC/Hemp_Sheet_MCC_30K_min_220112_R1.txt"
+        output = os.path.join(self.out, "run.parquet")
+        try:
+            result = worker.convert(path, output)
+            self.assertEqual(result["status"], "error")
+            self.assertEqual(result["error_info"]["kind"], "crashed")
+            self.assertEqual(result["error_info"]["exitcode"], 3)
+            # The worker is started again for the next file
+            worker.options = {}
+            self.assertEqual(worker.convert(path, output)["status"], "ok")
+        finally:
+            worker.close()
+
+    def test_quarantine(self):
+        bad = os.path.join(self.src, "MCC", "bad.txt")
+        with open(bad, "w") as f:
+            f.write("not an MCC file\n")
+        results = convert_paths(
+            [self.src], self.out, jobs=1, progress=False, quarantine=self.quarantine
+        )
+        failed = [r for r in results if r["status"] == "error"]
+        self.assertEqual([r["path"] for r in failed], [bad])
+        target = os.path.join(self.quarantine, "MCC", "bad.txt")
+        self.assertEqual(os.readlink(target), os.path.abspath(bad))
+        with open(target + ".error.json") as f:
+            record = json.load(f)
+        self.assertEqual(record["error_info"]["kind"], "exception")
+        self.assertIn("Traceback", record["error_info"]["traceback"])
+
+        moved = quarantine_file(failed[0], self.quarantine, "MCC", mode="move")
+        self.assertEqual(moved, target)
+        self.assertFalse(os.path.exists(bad))
+        self.assertFalse(os.path.islink(target))
+        with self.assertRaises(ValueError):
+            quarantine_file(failed[0], self.quarantine, mode="copy")
+
+
+if __name__ == "__main__":
+    unittest.main()
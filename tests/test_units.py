@@ -0,0 +1,169 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from labetl.batch import convert_file
+from labetl.faa_mcc_parser import load_mcc_data
+from labetl.fox_hfm_parser import load_hfm_data
+from labetl.netzsch_sta_ngb_parser import load_ngb_data
+from labetl.netzsch_sta_parser import load_sta_data
+from labetl.reader import units
+from labetl.units import (
+    conversion,
+    normalize_dataset,
+    normalize_file,
+    normalize_units,
+    plan_units,
+    target_unit,
+)
+
+
+class TestUnits(unittest.TestCase):
+    def setUp(self):
+        self.mcc_file_path = "tests/test_files/MCC/Hemp_Sheet_MCC_30K_min_220112_R1.txt"
+        self.csv_file_path = (
+            "tests/test_files/STA/DF_FILED_VAL_STA_N2_10K_240211_R1.csv"
+        )
+        self.hfm_file_path = (
+            "tests/test_files/HFM/Black_PMMA_HFM_Dry_conductivity_211115_R1.tst"
+        )
+        self.ngb_file_path = "tests/test_files/STA/PT_Deck_Board_3_1.ngb-ss3"
+
+    def test_conversion(self):
+        self.assertEqual(conversion("°C", "K"), (1.0, 273.15))
+        scale, offset = conversion("°F", "°C")
+        self.assertAlmostEqual(212 * scale + offset, 100)
+        self.assertAlmostEqual(conversion("mW/mg", "W/kg")[0], 1000)
+        self.assertAlmostEqual(conversion("W/g", "mW/mg")[0], 1)
+        # Rates of temperature have no offset
+        self.assertEqual(conversion("°C/s", "K/s"), (1.0, 0.0))
+        self.assertAlmostEqual(conversion("%/min", "%/s")[0], 1 / 60)
+        with self.assertRaises(ValueError):
+            conversion("°C", "kg")
+        with self.assertRaises(ValueError):
+            conversion("a.u.", "1")
+
+        self.assertEqual(target_unit("mW/mg/°C"), "W/kg/K")
+        self.assertEqual(target_unit("min", "lab"), "s")
+        self.assertEqual(target_unit("W/mK"), "W/(m·K)")
+        self.assertIsNone(target_unit("a.u."))
+        with self.assertRaises(ValueError):
+            target_unit("K", "imperial")
+
+    def test_normalize_units(self):
+        table = load_sta_data(self.csv_file_path)
+        normalized = normalize_units(table)
+        self.assertEqual(normalized.column_names, table.column_names)
+        self.assertEqual(normalized.schema.metadata, table.schema.metadata)
+        normalized_units = units(normalized)
+        self.assertEqual(normalized_units["temperature"], "K")
+        self.assertEqual(normalized_units["time"], "s")
+        self.assertEqual(normalized_units["dsc"], "W/kg")
+        self.assertEqual(normalized_units["mass"], "%")
+        np.testing.assert_allclose(
+            normalized.column("temperature").to_numpy(),
+            table.column("temperature").to_numpy() + 273.15,
+        )
+        np.testing.assert_allclose(
+            normalized.column("time").to_numpy(), table.column("time").to_numpy() * 60
+        )
+        self.assertTrue(normalized.column("mass").equals(table.column("mass")))
+        stats = json.loads(normalized.schema.field("time").metadata[b"stats"])
+        self.assertAlmostEqual(stats["max"], pc.max(normalized["time"]).as_py())
+
+        # Back to the units of the instruments, per dimension and per column
+        lab = normalize_units(normalized, {"temperature": "°C", "time": "min"})
+        np.testing.assert_allclose(
+            lab.column("temperature").to_numpy(),
+            table.column("temperature").to_numpy(),
+        )
+        mcc = load_mcc_data(self.mcc_file_path)
+        plan = plan_units(mcc.schema, "lab", columns={"hrr": "kW/kg"})
+        self.assertEqual(
+            set(plan), {"hrr", "flow_rate", "n2_flow_rate", "o2_flow_rate"}
+        )
+        self.assertEqual(plan["flow_rate"][0], "ml/s")
+        target, scale, offset = plan["hrr"]
+        self.assertEqual((target, offset), ("kW/kg", 0.0))
+        self.assertAlmostEqual(scale, 1)
+
+    def test_normalize_ngb(self):
+        # NGB files store no units, the parser records those of the channels
+        table = load_ngb_data(self.ngb_file_path)
+        normalized = normalize_units(table)
+        normalized_units = units(normalized)
+        self.assertEqual(normalized_units["temperature"], "K")
+        self.assertEqual(normalized_units["time"], "s")
+        self.assertEqual(normalized_units["sample_mass"], "kg")
+        self.assertEqual(normalized_units["purge_flow"], "m³/s")
+        np.testing.assert_allclose(
+            normalized.column("time").to_numpy(), table.column("time").to_numpy() * 60
+        )
+        np.testing.assert_allclose(
+            normalized.column("furnace_temperature").to_numpy(),
+            table.column("furnace_temperature").to_numpy() + 273.15,
+        )
+        # Channels of unknown unit are left as they are
+        self.assertIsNone(normalized_units["env_accel_x"])
+        self.assertTrue(
+            normalized.column("env_accel_x").equals(table.column("env_accel_x"))
+        )
+
+        # so that STA tables from CSV and NGB files end up in the same units
+        csv = units(normalize_units(load_sta_data(self.csv_file_path)))
+        self.assertEqual(
+            (csv["temperature"], csv["time"]),
+            (normalized_units["temperature"], normalized_units["time"]),
+        )
+
+    def test_legacy_units_key(self):
+        table = load_hfm_data(self.hfm_file_path)
+        self.assertIn(b"unit", table.schema.field("upper_temperature").metadata)
+        # Files converted by older versions store the unit under "units"
+        fields = [
+            field.with_metadata({b"units": field.metadata[b"unit"]})
+            if field.metadata and b"unit" in field.metadata
+            else field
+            for field in table.schema
+        ]
+        legacy = table.cast(pa.schema(fields, metadata=table.schema.metadata))
+        normalized = normalize_units(legacy, {})
+        metadata = normalized.schema.field("upper_thermal_conductivity").metadata
+        self.assertEqual(metadata, {b"unit": b"W/mK"})
+        self.assertTrue(normalized.column("setpoint").equals(table.column("setpoint")))
+
+    def test_normalize_file(self):
+        table = load_mcc_data(self.mcc_file_path)
+        expected = normalize_units(table)
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, "runs", "MCC", "run.parquet")
+            os.makedirs(os.path.dirname(source))
+            pq.write_table(table, source)
+            output = os.path.join(tmp, "run.parquet")
+            self.assertEqual(
+                normalize_file(source, output, batch_size=500), table.num_rows
+            )
+            self.assertEqual(pq.ParquetFile(output).metadata.num_row_groups, 6)
+            self.assertTrue(pq.read_table(output).equals(expected))
+            self.assertEqual(pq.read_schema(output), expected.schema)
+
+            outputs = normalize_dataset(
+                [os.path.join(tmp, "runs")], os.path.join(tmp, "si")
+            )
+            self.assertEqual(outputs, [os.path.join(tmp, "si", "MCC", "run.parquet")])
+            self.assertTrue(pq.read_table(outputs[0]).equals(expected))
+
+            result = convert_file(
+                self.mcc_file_path, output, units={"system": "si"}, schema={}
+            )
+            self.assertEqual(result["status"], "ok")
+            self.assertEqual(units(pq.read_schema(output))["temperature"], "K")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from labetl.batch import convert_file
+from labetl.faa_mcc_parser import load_mcc_data
+from labetl.netzsch_sta_ngb_parser import load_ngb_data
+from labetl.netzsch_sta_parser import load_sta_data
+from labetl.schema import conform
+from labetl.validation import (
+    CHANNEL_LENGTH,
+    MONOTONIC,
+    RANGE,
+    STEP,
+    add_validation,
+    validate,
+)
+
+
+def replace(table, name, values):
+    index = table.column_names.index(name)
+    return table.set_column(index, table.field(name), pa.array(values))
+
+
+class TestValidation(unittest.TestCase):
+    def setUp(self):
+        self.mcc_file_path = "tests/test_files/MCC/Hemp_Sheet_MCC_30K_min_220112_R1.txt"
+        self.csv_file_path = (
+            "tests/test_files/STA/DF_FILED_VAL_STA_N2_10K_240211_R1.csv"
+        )
+        self.ngb_file_path = "tests/test_files/STA/PT_Deck_Board_3_1.ngb-ss3"
+
+    def test_valid_files(self):
+        for table in (
+            load_mcc_data(self.mcc_file_path),
+            load_sta_data(self.csv_file_path),
+            load_ngb_data(self.ngb_file_path),
+        ):
+            self.assertEqual(validate(table), [])
+            self.assertEqual(validate(conform(table)), [])
+
+    def test_violations(self):
+        table = load_mcc_data(self.mcc_file_path)
+        time = table.column("time").to_numpy().copy()
+        time[100] = time[99]
+        time[200] = time[198]
+        temperature = table.column("temperature").to_numpy().copy()
+        temperature[300] += 200
+        oxygen = table.column("oxygen").to_numpy().copy()
+        oxygen[[5, 6]] = [-1, 120]
+        table = replace(table, "time", time)
+        table = replace(table, "temperature", temperature)
+        table = replace(table, "oxygen", oxygen)
+
+        violations = {v["rule"] + ":" + v["column"]: v for v in validate(table)}
+        self.assertEqual(
+            set(violations), {"monotonic:time", "step:temperature", "range:oxygen"}
+        )
+        self.assertEqual(violations["monotonic:time"]["count"], 2)
+        self.assertEqual(violations["monotonic:time"]["first"], 100)
+        # The spike is a step up and a step down
+        step = violations["step:temperature"]
+        self.assertEqual((step["count"], step["first"]), (2, 300))
+        self.assertGreater(step["largest"], 150)
+        oxygen = violations["range:oxygen"]
+        self.assertEqual((oxygen["count"], oxygen["first"]), (2, 5))
+        self.assertEqual((oxygen["min"], oxygen["max"]), (-1, 120))
+        self.assertEqual(oxygen["bounds"], [0.0, 100.0])
+
+        # Aliases are checked like their canonical column, and limits only
+        # apply in the unit they are given for
+        index = table.column_names.index("oxygen")
+        renamed = table.set_column(
+            index, table.field(index).with_name("o2"), table.column(index)
+        )
+        self.assertEqual(len(validate(renamed)), 3)
+        self.assertEqual(
+            validate(table, rules=[("oxygen", RANGE, {"ppm": (0.0, 1.0)})]), []
+        )
+        rules = [("temperature", STEP, {"°C": 1000.0}), ("hrr", MONOTONIC, None)]
+        self.assertEqual([v["column"] for v in validate(table, rules)], ["hrr"])
+
+    def test_dropped_channels(self):
+        table = load_ngb_data(self.ngb_file_path)
+        metadata = json.loads(table.schema.metadata[b"file_metadata"])
+        self.assertNotIn("dropped_channels", metadata)
+        metadata["dropped_channels"] = {"dsc": 100}
+        table = table.replace_schema_metadata(
+            {**table.schema.metadata, b"file_metadata": json.dumps(metadata)}
+        )
+        (violation,) = validate(table)
+        self.assertEqual(violation["rule"], CHANNEL_LENGTH)
+        self.assertEqual(violation["count"], 100)
+        self.assertEqual(violation["expected"], table.num_rows)
+
+    def test_add_validation(self):
+        table = load_sta_data(self.csv_file_path)
+        mass = table.column("mass").to_numpy().copy()
+        mass[np.arange(10)] = -5.0
+        table = add_validation(replace(table, "mass", mass))
+        report = json.loads(table.schema.metadata[b"validation"])
+        self.assertEqual(report["version"], 1)
+        (violation,) = report["violations"]
+        self.assertEqual(violation["rule"], RANGE)
+        self.assertEqual(violation["count"], 10)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "run.parquet")
+            result = convert_file(self.csv_file_path, output, validate=True)
+            self.assertEqual(result["violations"], 0)
+            metadata = pq.read_schema(output).metadata
+            self.assertEqual(json.loads(metadata[b"validation"])["violations"], [])
+
+    def test_validate_normalized_units(self):
+        # A temperature reading of 2500 °C, out of range in any unit
+        with open(self.mcc_file_path) as f:
+            lines = f.read().split("\n")
+        row = lines[400].split("\t")
+        row[1] = "2500"
+        lines[400] = "\t".join(row)
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, "spike_R1.txt")
+            with open(source, "w") as f:
+                f.write("\n".join(lines))
+            output = os.path.join(tmp, "spike_R1.parquet")
+            result = convert_file(source, output, validate=True, units={"system": "si"})
+            self.assertEqual(result["status"], "ok", result["error"])
+            table = pq.read_table(output)
+        # The report is in the units of the columns it is stored with
+        report = json.loads(table.schema.metadata[b"validation"])
+        violations = {v["rule"]: v for v in report["violations"]}
+        self.assertEqual(set(violations), {RANGE, STEP})
+        self.assertEqual(violations[RANGE]["unit"], "K")
+        self.assertEqual(violations[RANGE]["bounds"], [0.0, 2273.15])
+        self.assertAlmostEqual(
+            violations[RANGE]["max"], max(table.column("temperature").to_pylist())
+        )
+        self.assertAlmostEqual(violations[RANGE]["max"], 2773.15)
+
+
+if __name__ == "__main__":
+    unittest.main()
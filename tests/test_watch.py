@@ -0,0 +1,105 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+import pyarrow.parquet as pq
+from labetl.watch import FolderWatcher, scan_folder
+
+
+class TestFolderWatcher(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.mcc_file_path = "tests/test_files/MCC/Hemp_Sheet_MCC_30K_min_220112_R1.txt"
+        self.csv_file_path = (
+            "tests/test_files/STA/DF_FILED_VAL_STA_N2_10K_240211_R1.csv"
+        )
+        self.ngb_file_path = "tests/test_files/STA/PT_Deck_Board_3_1.ngb-ss3"
+        self.drop_dir = tempfile.mkdtemp()
+        self.out_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.drop_dir, ignore_errors=True)
+        shutil.rmtree(self.out_dir, ignore_errors=True)
+
+    def test_scan_folder(self):
+        os.makedirs(os.path.join(self.drop_dir, "MCC"))
+        shutil.copy(self.mcc_file_path, os.path.join(self.drop_dir, "MCC"))
+        with open(os.path.join(self.drop_dir, "notes.md"), "w") as f:
+            f.write("ignored")
+        found = scan_folder(self.drop_dir)
+        self.assertEqual(
+            list(found),
+            [
+                os.path.join(
+                    self.drop_dir, "MCC", "Hemp_Sheet_MCC_30K_min_220112_R1.txt"
+                )
+            ],
+        )
+
+    def test_settle(self):
+        watcher = FolderWatcher([self.drop_dir], self.out_dir, settle=1.0)
+        path = os.path.join(self.drop_dir, "run_R1.txt")
+        self.assertEqual(watcher._settled({path: (10, 1)}, 0.0), [])
+        # Still being written: size changed, so the settle timer restarts
+        self.assertEqual(watcher._settled({path: (20, 2)}, 0.8), [])
+        self.assertEqual(watcher._settled({path: (20, 2)}, 1.5), [])
+        self.assertEqual(watcher._settled({path: (20, 2)}, 1.8), [path])
+        # Converted files are not picked up again until they change
+        self.assertEqual(watcher._settled({path: (20, 2)}, 5.0), [])
+
+    async def test_run(self):
+        results = []
+
+        def on_result(result):
+            results.append(result)
+            watcher.stop()
+
+        watcher = FolderWatcher(
+            [self.drop_dir],
+            self.out_dir,
+            jobs=1,
+            interval=0.05,
+            settle=0.1,
+            on_result=on_result,
+        )
+        shutil.copy(self.mcc_file_path, self.drop_dir)
+        await asyncio.wait_for(watcher.run(), timeout=60)
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["status"], "ok", results[0]["error"])
+        output = os.path.join(self.out_dir, "Hemp_Sheet_MCC_30K_min_220112_R1.parquet")
+        self.assertEqual(results[0]["output"], output)
+        self.assertEqual(pq.read_metadata(output).num_rows, 2584)
+        self.assertEqual(os.listdir(self.out_dir), [os.path.basename(output)])
+
+    async def test_same_stem(self):
+        results = []
+
+        def on_result(result):
+            results.append(result)
+            if len(results) == 2:
+                watcher.stop()
+
+        watcher = FolderWatcher(
+            [self.drop_dir],
+            self.out_dir,
+            jobs=1,
+            interval=0.05,
+            settle=0.1,
+            on_result=on_result,
+        )
+        # An NGB run and its CSV export must not overwrite each other
+        shutil.copy(self.ngb_file_path, os.path.join(self.drop_dir, "run.ngb-ss3"))
+        shutil.copy(self.csv_file_path, os.path.join(self.drop_dir, "run.csv"))
+        await asyncio.wait_for(watcher.run(), timeout=60)
+
+        self.assertEqual([r["status"] for r in results], ["ok", "ok"])
+        self.assertEqual(
+            sorted(os.listdir(self.out_dir)),
+            ["run.csv.parquet", "run.ngb-ss3.parquet"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()